@@ -0,0 +1,56 @@
+"""
+Actions ``async def`` em viewsets do DRF.
+
+O DRF só despacha de forma síncrona. ``AsyncActionsMixin`` marca como
+coroutine as rotas cujas actions são ``async def`` e as despacha com
+``adispatch``: autenticação, permissões e throttling (que podem ler a sessão
+no banco) rodam numa thread com ``sync_to_async`` e a action roda no event
+loop. Rotas com actions síncronas seguem o ``dispatch`` normal.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.decorators import classonlymethod
+
+
+class AsyncActionsMixin:
+    async_route = False
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        is_async = bool(actions) and any(
+            iscoroutinefunction(getattr(cls, name, None)) for name in actions.values()
+        )
+        view = super().as_view(actions, async_route=is_async, **initkwargs)
+        if is_async:
+            markcoroutinefunction(view)
+        return view
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.async_route:
+            return self.adispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """``APIView.dispatch`` com a action aguardada no event loop"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -0,0 +1,37 @@
+"""
+Autenticação da API por token (``Authorization: Token <chave>`` ou ``Bearer``).
+
+Diferente da sessão, não passa pelo CSRF nem carrega a sessão do banco; um
+token verificado há pouco autentica sem nenhuma consulta (ver ``core.tokens``).
+
+Por ser a primeira classe de ``DEFAULT_AUTHENTICATION_CLASSES``, o seu
+``authenticate_header`` faz requests sem credenciais receberem ``401`` com
+``WWW-Authenticate: Token`` (antes, só com a sessão, eram ``403``).
+"""
+from rest_framework import authentication, exceptions
+
+from core import tokens
+
+
+class TokenAuthentication(authentication.BaseAuthentication):
+    keywords = (b'token', b'bearer')
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() not in self.keywords:
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Cabeçalho de token inválido.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Cabeçalho de token inválido.')
+
+        verified = tokens.verify(key)
+        if verified is None:
+            raise exceptions.AuthenticationFailed('Token inválido, expirado ou revogado.')
+        user, token_id = verified
+        return user, token_id
+
+    def authenticate_header(self, request):
+        return 'Token'
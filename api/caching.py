@@ -0,0 +1,93 @@
+"""
+Cache de respostas do catálogo com ETag e 304.
+
+``catalog_cache`` decora actions de viewsets somente-leitura cujas respostas
+dependem apenas do catálogo. A chave combina a versão do catálogo
+(``core.catalog``), o caminho com a query string normalizada e o formato de
+saída; o ETag é derivado da mesma chave. Um ``If-None-Match`` igual ao ETag
+atual é respondido com 304 usando só a versão, sem consultar o banco.
+
+Respostas que variam por cliente declaram ``@catalog_cache(vary=func)``;
+``func(request)`` devolve um texto (por exemplo a região do cliente) que
+entra na chave. As que expõem ``load`` e ``active_connections`` declaram
+``counters=True``: o carimbo dos contadores (``catalog.get_counters``) também
+entra na chave e no ``Last-Modified``.
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+from core import catalog
+
+
+DEFAULT_TIMEOUT = 300
+
+
+def _etag(request, version, variant=''):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    media_type = request.accepted_renderer.media_type
+    raw = f'{version}|{request.path}|{query}|{media_type}|{variant}'
+    return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def _finish(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def catalog_cache(view=None, vary=None, counters=False):
+    """Cacheia a resposta renderizada por versão do catálogo"""
+    if view is None:
+        return lambda view: catalog_cache(view, vary, counters)
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        # Só o JSON é cacheado; a API navegável inclui dados do usuário
+        if request.accepted_renderer.format != 'json':
+            return view(self, request, *args, **kwargs)
+
+        version, changed_at = catalog.get_version()
+        if counters:
+            stamp, counted_at = catalog.get_counters()
+            version, changed_at = f'{version}.{stamp}', max(changed_at, counted_at)
+        last_modified = int(changed_at)
+        etag = _etag(request, version, vary(request) if vary else '')
+
+        if _matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+            return _finish(HttpResponseNotModified(), etag, last_modified)
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if 'HTTP_IF_NONE_MATCH' not in request.META and if_modified_since and if_modified_since >= last_modified:
+            return _finish(HttpResponseNotModified(), etag, last_modified)
+
+        key = f'catalog:response:{etag.strip(chr(34))}'
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return _finish(HttpResponse(content, content_type=content_type), etag, last_modified)
+
+        response = view(self, request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        timeout = getattr(settings, 'CATALOG_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+        cache.set(key, (response.content, response['Content-Type']), timeout)
+        return _finish(response, etag, last_modified)
+    return wrapper
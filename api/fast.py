@@ -0,0 +1,150 @@
+"""
+Serialização rápida, somente leitura, para listas quentes da API.
+
+``FastSerializerMixin`` compila uma vez por classe a lista de campos de um
+``ModelSerializer`` em um plano: as colunas a pedir com ``values()`` e, para
+cada campo de saída, a coluna e o conversor a aplicar. Cada linha vira um
+dict sem instanciar serializers, campos ou objetos de modelo, e a saída é
+idêntica à do caminho padrão do DRF.
+
+Campos suportados: campos concretos do modelo (inclusive ``choices``,
+arquivos e datas), serializers aninhados por ``ForeignKey`` e propriedades do
+modelo declaradas em ``Meta.fast_properties`` com as colunas de que dependem.
+Qualquer outro campo faz a compilação falhar com ``ImproperlyConfigured``.
+"""
+from types import SimpleNamespace
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import models
+from rest_framework import serializers
+
+
+# Campos cuja representação é o próprio valor vindo do banco
+IDENTITY_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ReadOnlyField,
+)
+
+
+def _property_converter(model, source, columns):
+    getter = getattr(model, source).fget
+
+    def convert(row, prefix):
+        return getter(SimpleNamespace(**{column: row[prefix + column] for column in columns}))
+    return convert
+
+
+class FastPlan:
+    """Plano compilado: colunas para ``values()`` e conversão linha -> dict"""
+
+    def __init__(self, serializer_class, prefix=''):
+        self.prefix = prefix
+        self.columns = []
+        self.steps = []
+
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        properties = getattr(serializer.Meta, 'fast_properties', {})
+
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            self._compile_field(model, field, properties)
+
+    def _column(self, name):
+        column = self.prefix + name
+        if column not in self.columns:
+            self.columns.append(column)
+        return column
+
+    def _compile_field(self, model, field, properties):
+        name = field.field_name
+        source = field.source
+
+        if source in properties:
+            for column in properties[source]:
+                self._column(column)
+            self.steps.append(('property', name, _property_converter(model, source, properties[source])))
+            return
+
+        try:
+            model_field = model._meta.get_field(source)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(
+                f'{type(field.parent).__name__}.{name}: fonte "{source}" não é um campo de '
+                f'{model.__name__}; declare-a em Meta.fast_properties'
+            )
+
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer) or not model_field.many_to_one:
+                raise ImproperlyConfigured(f'{name}: só relações ForeignKey podem ser aninhadas')
+            nested = FastPlan(type(field), prefix=f'{self.prefix}{source}__')
+            self.columns.extend(column for column in nested.columns if column not in self.columns)
+            self.steps.append(('nested', name, (self._column(model_field.attname), nested)))
+            return
+
+        if model_field.is_relation and not model_field.many_to_one:
+            raise ImproperlyConfigured(f'{name}: relações múltiplas não são suportadas')
+
+        column = self._column(model_field.attname if model_field.is_relation else source)
+        if isinstance(model_field, models.FileField) and isinstance(field, serializers.FileField) \
+                and getattr(field, 'use_url', True):
+            self.steps.append(('file', name, (column, model_field.storage)))
+            return
+        if isinstance(field, IDENTITY_FIELDS) and not isinstance(field, serializers.ChoiceField):
+            converter = None
+        else:
+            converter = field.to_representation
+        self.steps.append(('value', name, (column, converter)))
+
+    def convert(self, row, request=None):
+        data = {}
+        for kind, name, step in self.steps:
+            if kind == 'value':
+                column, converter = step
+                value = row[column]
+                data[name] = value if value is None or converter is None else converter(value)
+            elif kind == 'nested':
+                fk_column, nested = step
+                data[name] = None if row[fk_column] is None else nested.convert(row, request)
+            elif kind == 'file':
+                column, storage = step
+                value = row[column]
+                if not value:
+                    data[name] = None
+                    continue
+                url = storage.url(value)
+                data[name] = request.build_absolute_uri(url) if request is not None else url
+            else:
+                data[name] = step(row, self.prefix)
+        return data
+
+
+class FastSerializerMixin:
+    """Habilita ``fast_data(queryset)`` em um ModelSerializer somente leitura"""
+
+    @classmethod
+    def fast_plan(cls):
+        plan = cls.__dict__.get('_fast_plan')
+        if plan is None:
+            plan = FastPlan(cls)
+            cls._fast_plan = plan
+        return plan
+
+    @classmethod
+    def fast_rows(cls, queryset):
+        """``values()`` com as colunas do plano, para filtrar ou paginar antes de converter"""
+        return queryset.values(*cls.fast_plan().columns)
+
+    @classmethod
+    def fast_convert(cls, rows, context=None):
+        plan = cls.fast_plan()
+        request = (context or {}).get('request')
+        return [plan.convert(row, request) for row in rows]
+
+    @classmethod
+    def fast_data(cls, queryset, context=None):
+        """Lista de dicts equivalente a ``cls(queryset, many=True, context=context).data``"""
+        return cls.fast_convert(cls.fast_rows(queryset), context)
@@ -0,0 +1,91 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+from api.serializers import VPNServerSerializer, GameSerializer, ConnectionSerializer
+from core.models import VPNServer, Game, Connection
+from core.startup import local_host
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the fast serializer path against the stock DRF serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000,
+                            help='Linhas sintéticas por modelo')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Repetições por medição (vale a melhor)')
+
+    def handle(self, *args, **options):
+        # Os dados sintéticos são criados numa transação desfeita no final
+        try:
+            with transaction.atomic():
+                self.populate(options['rows'])
+                self.run(options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def populate(self, rows):
+        now = timezone.now()
+        user = User.objects.create(username=f'bench-{time.time_ns()}')
+        servers = VPNServer.objects.bulk_create(
+            VPNServer(name=f'Bench {i}', country='Brasil', city='São Paulo',
+                      ip_address='127.0.0.1', ping=i % 200, load=i % 100, flag_icon='🇧🇷')
+            for i in range(rows)
+        )
+        games = Game.objects.bulk_create(
+            Game(name=f'Bench {i}', slug=f'bench-{time.time_ns()}-{i}', category='FPS',
+                 icon=f'games/bench-{i}.png' if i % 2 else '')
+            for i in range(rows)
+        )
+        Connection.objects.bulk_create(
+            Connection(user=user, server=servers[i % len(servers)],
+                       game=games[i % len(games)] if i % 3 else None,
+                       status='disconnected', connected_at=now - timezone.timedelta(minutes=i),
+                       disconnected_at=now, ping_before=80, ping_after=40)
+            for i in range(rows)
+        )
+        self.user = user
+
+    def run(self, repeat):
+        host = local_host()
+        request = Request(APIRequestFactory().get('/api/', HTTP_HOST=host, SERVER_NAME=host))
+        cases = [
+            ('VPNServerSerializer', VPNServerSerializer, VPNServer.objects.filter(name__startswith='Bench ')),
+            ('GameSerializer', GameSerializer, Game.objects.filter(name__startswith='Bench ')),
+            ('ConnectionSerializer', ConnectionSerializer,
+             Connection.objects.filter(user=self.user).select_related('server', 'game')),
+        ]
+        for label, serializer_class, queryset in cases:
+            context = {'request': request}
+            stock, stock_data = self.measure(
+                lambda: serializer_class(queryset.all(), many=True, context=context).data, repeat)
+            fast, fast_data = self.measure(
+                lambda: serializer_class.fast_data(queryset.all(), context), repeat)
+            rows = len(stock_data)
+            identical = [dict(item) for item in stock_data] == fast_data
+            self.stdout.write(
+                f'{label:22} {rows:>7} linhas  '
+                f'padrão {rows / stock:>10.0f} linhas/s  '
+                f'rápido {rows / fast:>10.0f} linhas/s  '
+                f'{stock / fast:>5.1f}x  '
+                + (self.style.SUCCESS('saída idêntica') if identical else self.style.ERROR('SAÍDA DIFERENTE'))
+            )
+
+    def measure(self, func, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -1,20 +1,21 @@
 from rest_framework import serializers
-from core.models import VPNServer, Game, Connection, UserProfile
+from core.models import VPNServer, Game, Connection, UserProfile, APIToken
+from .fast import FastSerializerMixin
 
 
-class VPNServerSerializer(serializers.ModelSerializer):
+class VPNServerSerializer(FastSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = VPNServer
-        fields = ['id', 'name', 'country', 'city', 'ping', 'load', 'flag_icon']
+        fields = ['id', 'name', 'country', 'city', 'ping', 'load', 'capacity', 'active_connections', 'flag_icon']
 
 
-class GameSerializer(serializers.ModelSerializer):
+class GameSerializer(FastSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Game
         fields = ['id', 'name', 'slug', 'icon', 'category', 'description']
 
 
-class ConnectionSerializer(serializers.ModelSerializer):
+class ConnectionSerializer(FastSerializerMixin, serializers.ModelSerializer):
     server = VPNServerSerializer(read_only=True)
     game = GameSerializer(read_only=True)
     
@@ -22,6 +23,7 @@ class ConnectionSerializer(serializers.ModelSerializer):
         model = Connection
         fields = ['id', 'server', 'game', 'status', 'connected_at', 
                  'ping_before', 'ping_after', 'duration']
+        fast_properties = {'duration': ['connected_at', 'disconnected_at']}
 
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -30,4 +32,10 @@ class UserProfileSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = UserProfile
-        fields = ['preferred_server', 'favorite_games', 'created_at']
\ No newline at end of file
+        fields = ['preferred_server', 'favorite_games', 'created_at']
+
+
+class APITokenSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = APIToken
+        fields = ['id', 'name', 'prefix', 'created_at', 'expires_at', 'last_used_at', 'revoked_at', 'is_valid']
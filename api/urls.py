@@ -1,12 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import VPNServerViewSet, GameViewSet, ConnectionViewSet, UserProfileViewSet
+from .views import (VPNServerViewSet, GameViewSet, ConnectionViewSet, UserProfileViewSet, UsageStatsViewSet,
+                    SearchViewSet, APITokenViewSet)
 
 router = DefaultRouter()
 router.register(r'servers', VPNServerViewSet)
 router.register(r'games', GameViewSet)
 router.register(r'connections', ConnectionViewSet, basename='connection')
 router.register(r'profile', UserProfileViewSet, basename='profile')
+router.register(r'stats', UsageStatsViewSet, basename='stats')
+router.register(r'search', SearchViewSet, basename='search')
+router.register(r'tokens', APITokenViewSet, basename='token')
 
 urlpatterns = [
     path('', include(router.urls)),
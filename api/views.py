@@ -1,78 +1,181 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.throttling import ScopedRateThrottle
+from django.contrib.auth import authenticate
 from django.shortcuts import get_object_or_404
-from core.models import VPNServer, Game, Connection, UserProfile
-from .serializers import VPNServerSerializer, GameSerializer, ConnectionSerializer, UserProfileSerializer
+from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timedelta
+from core import history as server_history
+from core import geoip
+from core.ranking import ranking_index
+from core.search import search_index, MAX_RESULTS as SEARCH_MAX_RESULTS
+from core import capacity
+from core import sessions
+from core import tokens
+from core.models import VPNServer, Game, Connection, UserProfile, DailyUsage, APIToken
+from django.db.models import Sum
+from .serializers import (VPNServerSerializer, GameSerializer, ConnectionSerializer, UserProfileSerializer,
+                          APITokenSerializer)
+from .caching import catalog_cache
+from .pagination import KeysetPagination
+from .async_views import AsyncActionsMixin
+from core.query_budget import query_budget
+from core.routers import ReplicaReadsMixin
 
 
-class VPNServerViewSet(viewsets.ReadOnlyModelViewSet):
+class VPNServerViewSet(ReplicaReadsMixin, viewsets.ReadOnlyModelViewSet):
     """API para servidores VPN"""
     queryset = VPNServer.objects.filter(is_active=True)
     serializer_class = VPNServerSerializer
     permission_classes = [IsAuthenticated]
     
+    @query_budget(3)
+    @catalog_cache(counters=True)
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(self.serializer_class.fast_data(queryset, self.get_serializer_context()))
+    
     @action(detail=False, methods=['get'])
+    @query_budget(3)
+    @catalog_cache(counters=True)
     def by_country(self, request):
         """Agrupa servidores por país"""
-        servers = self.get_queryset()
+        servers = VPNServerSerializer.fast_data(self.get_queryset())
         countries = {}
         
         for server in servers:
-            if server.country not in countries:
-                countries[server.country] = []
-            countries[server.country].append(VPNServerSerializer(server).data)
+            if server['country'] not in countries:
+                countries[server['country']] = []
+            countries[server['country']].append(server)
         
         return Response(countries)
     
     @action(detail=False, methods=['get'])
+    @query_budget(7)
+    @catalog_cache(vary=lambda request: str(geoip.origin(request) or ''), counters=True)
     def recommended(self, request):
-        """Servidores recomendados baseado no ping"""
-        servers = self.get_queryset().order_by('ping', 'load')[:5]
+        """Servidores recomendados pelo score (ping, carga, conexões, perfil do jogo e distância)"""
+        game_param = request.query_params.get('game')
+        game_id = None
+        if game_param:
+            lookup = {'id': game_param} if game_param.isdigit() else {'slug': game_param}
+            game_id = get_object_or_404(Game, **lookup).id
+        
+        try:
+            limit = min(max(int(request.query_params.get('limit', 5)), 1), 50)
+        except ValueError:
+            return Response({'error': 'Limite inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        servers = ranking_index.recommended(
+            game_id=game_id,
+            country=request.query_params.get('country'),
+            limit=limit,
+            origin=geoip.origin(request),
+        )
         serializer = self.get_serializer(servers, many=True)
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    @query_budget(4)
+    def history(self, request, pk=None):
+        """Histórico de ping/carga com percentis"""
+        server = self.get_object()
+        try:
+            end = _parse_bound(request.query_params.get('end')) or timezone.now()
+            start = _parse_bound(request.query_params.get('start')) or end - timedelta(hours=24)
+        except ValueError:
+            return Response({'error': 'Data inválida, use o formato ISO 8601 (ex.: 2024-01-01T00:00:00)'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        resolution = request.query_params.get('resolution')
+        
+        if resolution and resolution not in server_history.TIERS:
+            return Response({'error': f'Resolução inválida, use uma de: {", ".join(server_history.TIERS)}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if start >= end:
+            return Response({'error': 'O início deve ser anterior ao fim'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            percentiles = [float(q) for q in request.query_params.get('percentiles', '50,95,99').split(',')]
+        except ValueError:
+            percentiles = []
+        if not percentiles or not all(0 < q <= 100 for q in percentiles):
+            return Response({'error': 'Percentis devem estar entre 0 e 100'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(server_history.query(server.id, start, end, resolution, percentiles))
+
 
+def _parse_bound(value):
+    """Data de ``start``/``end``; sem fuso é interpretada no fuso do projeto"""
+    moment = parse_datetime(value or '')
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
 
-class GameViewSet(viewsets.ReadOnlyModelViewSet):
+
+class GameViewSet(ReplicaReadsMixin, viewsets.ReadOnlyModelViewSet):
     """API para jogos"""
     queryset = Game.objects.filter(is_optimized=True)
     serializer_class = GameSerializer
     permission_classes = [IsAuthenticated]
     
+    @query_budget(3)
+    @catalog_cache
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(self.serializer_class.fast_data(queryset, self.get_serializer_context()))
+    
     @action(detail=False, methods=['get'])
+    @query_budget(3)
+    @catalog_cache
     def by_category(self, request):
         """Agrupa jogos por categoria"""
-        games = self.get_queryset()
+        games = GameSerializer.fast_data(self.get_queryset())
         categories = {}
         
         for game in games:
-            if game.category not in categories:
-                categories[game.category] = []
-            categories[game.category].append(GameSerializer(game).data)
+            if game['category'] not in categories:
+                categories[game['category']] = []
+            categories[game['category']].append(game)
         
         return Response(categories)
 
 
-class ConnectionViewSet(viewsets.ReadOnlyModelViewSet):
-    """API para conexões do usuário"""
+class ConnectionViewSet(AsyncActionsMixin, viewsets.ReadOnlyModelViewSet):
+    """API para conexões do usuário (``active``, ``connect`` e ``disconnect`` são async)"""
     serializer_class = ConnectionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         return Connection.objects.filter(user=self.request.user)
     
+    @query_budget(4)
+    def list(self, request, *args, **kwargs):
+        """Histórico paginado por cursor (``?cursor=``, ``?page_size=``)"""
+        queryset = ConnectionSerializer.fast_rows(self.filter_queryset(self.get_queryset()))
+        rows = self.paginate_queryset(queryset)
+        data = ConnectionSerializer.fast_convert(rows, self.get_serializer_context())
+        return self.get_paginated_response(data)
+    
     @action(detail=False, methods=['get'])
-    def active(self, request):
+    @query_budget(3)
+    async def active(self, request):
         """Conexão ativa do usuário"""
-        connection = self.get_queryset().filter(status='connected').first()
+        connection = await sessions.aget_active(request.user)
         if connection:
             serializer = self.get_serializer(connection)
             return Response(serializer.data)
         return Response({'message': 'Nenhuma conexão ativa'}, status=status.HTTP_404_NOT_FOUND)
     
     @action(detail=False, methods=['post'])
-    def connect(self, request):
+    @query_budget(13)
+    async def connect(self, request):
         """Conectar a um servidor"""
         server_id = request.data.get('server_id')
         game_id = request.data.get('game_id')
@@ -81,32 +184,36 @@ class ConnectionViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'error': 'ID do servidor é obrigatório'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        server = get_object_or_404(VPNServer, id=server_id, is_active=True)
-        game = None
-        if game_id:
-            game = get_object_or_404(Game, id=game_id)
-        
-        # Desconectar conexões ativas
-        self.get_queryset().filter(status='connected').update(status='disconnected')
-        
-        # Criar nova conexão
-        connection = Connection.objects.create(
-            user=request.user,
-            server=server,
-            game=game,
-            status='connected',
-            ping_before=request.data.get('ping_before', 0),
-            ping_after=max(10, server.ping - 20)
-        )
+        try:
+            server = await VPNServer.objects.aget(id=server_id, is_active=True)
+            game = await Game.objects.aget(id=game_id) if game_id else None
+        except (VPNServer.DoesNotExist, Game.DoesNotExist):
+            raise Http404
         
+        try:
+            connection = await sessions.aconnect(
+                request.user,
+                server,
+                game=game,
+                ping_before=request.data.get('ping_before', 0)
+            )
+        except capacity.ServerFull:
+            alternatives = await capacity.aalternatives(server)
+            return Response({
+                'error': f'O servidor {server.name} está lotado',
+                'alternatives': VPNServerSerializer(alternatives, many=True).data,
+            }, status=status.HTTP_409_CONFLICT)
+        
+        # O servidor foi lido antes de a sessão ocupar a vaga
+        await server.arefresh_from_db(fields=['active_connections', 'load'])
         serializer = self.get_serializer(connection)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     @action(detail=False, methods=['post'])
-    def disconnect(self, request):
+    @query_budget(10)
+    async def disconnect(self, request):
         """Desconectar do servidor"""
-        connections = self.get_queryset().filter(status='connected')
-        connections.update(status='disconnected')
+        await sessions.aclose_all(request.user)
         
         return Response({'message': 'Desconectado com sucesso'})
 
@@ -118,4 +225,141 @@ class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
     
     def get_queryset(self):
         profile, created = UserProfile.objects.get_or_create(user=self.request.user)
-        return UserProfile.objects.filter(user=self.request.user)
\ No newline at end of file
+        return UserProfile.objects.filter(user=self.request.user) \
+            .select_related('preferred_server').prefetch_related('favorite_games')
+    
+    @query_budget(5)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+
+class UsageStatsViewSet(viewsets.ViewSet):
+    """Estatísticas de uso a partir dos agregados diários"""
+    permission_classes = [IsAuthenticated]
+    
+    GROUPS = {
+        'server': ['server_id', 'server__name', 'server__country'],
+        'game': ['game_id', 'game__name'],
+        'day': ['day'],
+    }
+    
+    @query_budget(3)
+    def list(self, request):
+        group = request.query_params.get('group', 'server')
+        if group not in self.GROUPS:
+            return Response({'error': f'Agrupamento inválido, use um de: {", ".join(self.GROUPS)}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 365)
+        except ValueError:
+            return Response({'error': 'Número de dias inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        since = timezone.localdate() - timedelta(days=days - 1)
+        rows = (
+            DailyUsage.objects.filter(day__gte=since)
+            .values(*self.GROUPS[group])
+            .annotate(
+                total_sessions=Sum('sessions'),
+                seconds=Sum('total_seconds'),
+                ping_before=Sum('ping_before_sum'),
+                ping_after=Sum('ping_after_sum'),
+            )
+            .order_by('-total_sessions')
+        )
+        
+        results = []
+        for row in rows:
+            sessions = row.pop('total_sessions')
+            seconds = row.pop('seconds')
+            improvement = row.pop('ping_before') - row.pop('ping_after')
+            row.update({
+                'sessions': sessions,
+                'total_hours': round(seconds / 3600, 2),
+                'avg_ping_improvement': round(improvement / sessions, 1) if sessions else 0,
+            })
+            results.append(row)
+        
+        return Response({'since': since, 'group': group, 'results': results})
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """Autocomplete de servidores e jogos (``?q=``, ``?type=server|game``, ``?limit=``)"""
+    permission_classes = [IsAuthenticated]
+    
+    TYPES = ('server', 'game')
+    
+    @query_budget(4)
+    def list(self, request):
+        query = request.query_params.get('q', '').strip()
+        kind = request.query_params.get('type')
+        if kind and kind not in self.TYPES:
+            return Response({'error': f'Tipo inválido, use um de: {", ".join(self.TYPES)}'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), SEARCH_MAX_RESULTS)
+        except ValueError:
+            return Response({'error': 'Limite inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = search_index.search(query, kinds=(kind,) if kind else self.TYPES, limit=limit)
+        return Response({'query': query, 'results': results})
+
+
+class APITokenViewSet(viewsets.ReadOnlyModelViewSet):
+    """Tokens da API do usuário.
+
+    ``POST /api/tokens/`` cria um token (``name``, ``days``); sem sessão, aceita
+    ``username`` e ``password`` no corpo, para launchers. A chave só aparece
+    nessa resposta. Como a criação é um login, ela é limitada por cliente
+    (escopo ``token_login``, ``API_TOKEN_LOGIN_RATE``) contra força bruta.
+    """
+    serializer_class = APITokenSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_scope = 'token_login'
+    
+    MAX_DAYS = 365
+    
+    def get_permissions(self):
+        if self.action == 'create':
+            return [AllowAny()]
+        return super().get_permissions()
+    
+    def get_throttles(self):
+        if self.action == 'create':
+            return [ScopedRateThrottle()]
+        return super().get_throttles()
+    
+    def get_queryset(self):
+        return APIToken.objects.filter(user=self.request.user)
+    
+    @query_budget(3)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    def create(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            user = authenticate(request._request, username=request.data.get('username', ''),
+                                password=request.data.get('password', ''))
+            if user is None:
+                return Response({'error': 'Usuário ou senha inválidos'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            days = int(request.data.get('days', tokens.DEFAULT_LIFETIME_DAYS))
+        except (TypeError, ValueError):
+            days = -1
+        if not 1 <= days <= self.MAX_DAYS:
+            return Response({'error': f'Validade deve ser de 1 a {self.MAX_DAYS} dias'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        token, key = tokens.issue(user, name=str(request.data.get('name', ''))[:100], days=days)
+        data = self.get_serializer(token).data
+        data['key'] = key
+        return Response(data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    @query_budget(4)
+    def revoke(self, request, pk=None):
+        """Revoga o token (também pode ser o próprio token do request)"""
+        token = self.get_object()
+        tokens.revoke(APIToken.objects.filter(pk=token.pk))
+        return Response({'message': 'Token revogado'})
@@ -1,15 +1,26 @@
 from django.contrib import admin
-from .models import VPNServer, Game, UserProfile, Connection, OptimizationProfile
+from . import capacity, tokens
+from .models import VPNServer, Game, UserProfile, Connection, OptimizationProfile, DailyUsage, APIToken
 
 
 @admin.register(VPNServer)
 class VPNServerAdmin(admin.ModelAdmin):
-    list_display = ['name', 'country', 'city', 'ping', 'load', 'is_active']
+    list_display = ['name', 'country', 'city', 'ping', 'load', 'active_connections', 'capacity', 'is_active']
     list_filter = ['country', 'is_active']
     search_fields = ['name', 'city', 'country']
-    list_editable = ['ping', 'load', 'is_active']
+    list_editable = ['ping', 'capacity', 'is_active']
+    readonly_fields = ['load', 'active_connections']
     ordering = ['ping', 'load']
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Só os campos alterados: o contador de conexões muda a todo momento
+        # (core.capacity) e não pode ser sobrescrito pelo valor do formulário
+        obj.save(update_fields=form.changed_data)
+        if 'capacity' in form.changed_data:
+            capacity.refresh_load([obj.pk])
+
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
@@ -22,6 +33,7 @@ class GameAdmin(admin.ModelAdmin):
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'preferred_server', 'created_at']
+    list_select_related = ['user', 'preferred_server']
     list_filter = ['created_at', 'preferred_server__country']
     search_fields = ['user__username', 'user__email']
 
@@ -29,6 +41,7 @@ class UserProfileAdmin(admin.ModelAdmin):
 @admin.register(Connection)
 class ConnectionAdmin(admin.ModelAdmin):
     list_display = ['user', 'server', 'game', 'status', 'connected_at', 'ping_before', 'ping_after']
+    list_select_related = ['user', 'server', 'game']
     list_filter = ['status', 'server__country', 'connected_at']
     search_fields = ['user__username', 'server__name', 'game__name']
     readonly_fields = ['connected_at', 'disconnected_at']
@@ -37,6 +50,47 @@ class ConnectionAdmin(admin.ModelAdmin):
 @admin.register(OptimizationProfile)
 class OptimizationProfileAdmin(admin.ModelAdmin):
     list_display = ['name', 'game', 'ping_threshold', 'is_default']
+    list_select_related = ['game']
     list_filter = ['game', 'is_default']
     search_fields = ['name', 'game__name']
-    filter_horizontal = ['recommended_servers']
\ No newline at end of file
+    filter_horizontal = ['recommended_servers']
+
+
+@admin.register(DailyUsage)
+class DailyUsageAdmin(admin.ModelAdmin):
+    list_display = ['day', 'server', 'game', 'sessions', 'total_hours', 'avg_ping_improvement']
+    list_filter = ['day', 'server__country', 'server']
+    search_fields = ['server__name', 'game__name']
+    list_select_related = ['server', 'game']
+    date_hierarchy = 'day'
+    readonly_fields = ['day', 'server', 'game', 'sessions', 'total_seconds',
+                       'ping_before_sum', 'ping_after_sum']
+
+    @admin.display(description='Horas')
+    def total_hours(self, obj):
+        return round(obj.total_seconds / 3600, 1)
+
+    @admin.display(description='Melhoria Média (ms)')
+    def avg_ping_improvement(self, obj):
+        return obj.avg_ping_improvement
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(APIToken)
+class APITokenAdmin(admin.ModelAdmin):
+    list_display = ['user', 'name', 'prefix', 'created_at', 'expires_at', 'last_used_at', 'revoked_at']
+    list_select_related = ['user']
+    list_filter = ['created_at', 'revoked_at']
+    search_fields = ['user__username', 'name', 'prefix']
+    readonly_fields = ['user', 'prefix', 'key_hash', 'created_at', 'last_used_at', 'revoked_at']
+    actions = ['revoke_tokens']
+
+    @admin.action(description='Revogar tokens selecionados')
+    def revoke_tokens(self, request, queryset):
+        count = tokens.revoke(queryset)
+        self.message_user(request, f'{count} token(s) revogado(s).')
+
+    def has_add_permission(self, request):
+        return False
@@ -4,4 +4,11 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
-    verbose_name = 'ExitLag Free - Core'
\ No newline at end of file
+    verbose_name = 'ExitLag Free - Core'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals  # noqa: F401
+        from .search import ensure_trigram_indexes
+
+        post_migrate.connect(ensure_trigram_indexes, sender=self)
@@ -0,0 +1,419 @@
+"""
+Arquivos estáticos: serviço pelo próprio processo (WhiteNoise) e build.
+
+``build`` (comando ``build_assets``) junta e minifica os arquivos de cada
+bundle (``ASSET_BUNDLES``) em ``ASSET_BUILD_DIR/bundles``, que está em
+``STATICFILES_DIRS``; o ``collectstatic`` seguinte dá nome com hash e gera as
+versões gzip e Brotli de cada arquivo. Também extrai o CSS crítico: as regras
+cujos seletores só usam classes, ids e tags presentes em ``base.html``, que
+são embutidas no ``<head>`` (depois das folhas do CDN, para não serem
+sobrescritas pelo reboot do Bootstrap) enquanto o resto carrega sem
+bloquear. As regras embutidas saem do bundle: cada byte é baixado uma vez só.
+Sem build, as tags de ``bundles`` voltam a apontar para os arquivos-fonte.
+
+Arquivos com hash no nome são servidos com ``Cache-Control: immutable`` por
+``STATIC_IMMUTABLE_MAX_AGE`` segundos (um ano).
+"""
+import gzip
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings as django_settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """``WhiteNoiseMiddleware`` que também roda em modo async.
+
+    O WhiteNoise só é síncrono, e um único middleware síncrono faz o Django
+    executar toda a pilha de cada request ASGI numa thread. A busca do arquivo
+    é um dicionário em memória, então não há o que esperar no modo async.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=django_settings):
+        # Validade dos arquivos com hash no nome (o WhiteNoise usa 10 anos);
+        # antes do super(): os cabeçalhos são calculados ao indexar os arquivos
+        self.FOREVER = getattr(settings, 'STATIC_IMMUTABLE_MAX_AGE', 365 * 24 * 60 * 60)
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+# Pipeline de build (comando ``build_assets``)
+
+DEFAULT_BUNDLES = {
+    'app.css': ['css/style.css'],
+    'app.js': ['js/main.js'],
+}
+BUNDLE_DIR = 'bundles'
+CRITICAL_NAME = 'critical.css'
+
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)', re.S)
+CSS_SPACE_AROUND = re.compile(r'\s*([{};,>])\s*')
+CSS_SPACE_AFTER = re.compile(r'([:(])\s+')
+CSS_SPACE_BEFORE = re.compile(r'\s+(\))')
+
+# Depois destes caracteres (ou palavras), ``/`` abre uma regex e não é divisão
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw', 'case', 'do', 'else'}
+
+
+def get_bundles():
+    return getattr(django_settings, 'ASSET_BUNDLES', DEFAULT_BUNDLES)
+
+
+def build_dir():
+    return os.fspath(getattr(django_settings, 'ASSET_BUILD_DIR', ''))
+
+
+def minify_css(text):
+    """Remove comentários (menos ``/*! ... */``) e espaços desnecessários"""
+    parts, code = [], []
+    position = 0
+    for match in CSS_TOKENS.finditer(text):
+        code.append(text[position:match.start()])
+        string, comment = match.groups()
+        if string or comment.startswith('/*!'):
+            parts.append(_squeeze_css(''.join(code)))
+            parts.append(string or comment)
+            code = []
+        position = match.end()
+    code.append(text[position:])
+    parts.append(_squeeze_css(''.join(code)))
+    return ''.join(parts).replace(';}', '}').strip()
+
+
+def _squeeze_css(code):
+    code = re.sub(r'\s+', ' ', code)
+    code = CSS_SPACE_AROUND.sub(r'\1', code)
+    code = CSS_SPACE_AFTER.sub(r'\1', code)
+    return CSS_SPACE_BEFORE.sub(r'\1', code)
+
+
+def _skip_literal(text, start):
+    """Fim (exclusivo) da string, template ou regex que começa em ``start``"""
+    quote = text[start]
+    position = start + 1
+    in_class = False
+    while position < len(text):
+        char = text[position]
+        if char == '\\':
+            position += 2
+            continue
+        if quote == '`' and text.startswith('${', position):
+            # Expressão dentro do template: copiada como está, até a chave que fecha
+            depth, position = 1, position + 2
+            while position < len(text) and depth:
+                char = text[position]
+                if char in '\'"`':
+                    position = _skip_literal(text, position)
+                    continue
+                depth += {'{': 1, '}': -1}.get(char, 0)
+                position += 1
+            continue
+        if quote == '/':
+            if char == '[':
+                in_class = True
+            elif char == ']':
+                in_class = False
+            elif char == '/' and not in_class:
+                position += 1
+                while position < len(text) and (text[position].isalnum() or text[position] == '_'):
+                    position += 1  # flags
+                return position
+            elif char == '\n':
+                return position
+        elif char == quote:
+            return position + 1
+        elif char == '\n' and quote != '`':
+            return position
+        position += 1
+    return position
+
+
+def minify_js(text):
+    """Remove comentários, indentação e linhas em branco.
+
+    Conservador: as quebras de linha ficam (a inserção automática de ``;``
+    continua valendo) e strings, templates e regexes são copiados intactos.
+    """
+    output, code = [], []
+    position = 0
+
+    def last_significant():
+        for chunk in reversed(output + [''.join(code)]):
+            stripped = chunk.rstrip()
+            if stripped:
+                return stripped
+        return ''
+
+    def flush():
+        if code:
+            chunk = re.sub(r'[ \t]*\n\s*', '\n', ''.join(code))
+            output.append(re.sub(r'[ \t]+', ' ', chunk))
+            code.clear()
+
+    while position < len(text):
+        char = text[position]
+        if text.startswith('//', position):
+            end = text.find('\n', position)
+            position = len(text) if end < 0 else end
+            continue
+        if text.startswith('/*', position):
+            end = text.find('*/', position + 2)
+            end = len(text) if end < 0 else end + 2
+            if text.startswith('/*!', position):
+                flush()
+                output.append(text[position:end])
+            position = end
+            continue
+        if char in '\'"`' or char == '/' and _regex_allowed(last_significant()):
+            end = _skip_literal(text, position)
+            flush()
+            output.append(text[position:end])
+            position = end
+            continue
+        code.append(char)
+        position += 1
+    flush()
+    return ''.join(output).strip() + '\n'
+
+
+def _regex_allowed(previous):
+    if not previous:
+        return True
+    if previous[-1] in REGEX_PRECEDERS:
+        return True
+    word = re.search(r'[A-Za-z_$]+$', previous)
+    return bool(word) and word.group() in REGEX_KEYWORDS
+
+
+def _split_rules(css):
+    """``(prelúdio, corpo)`` de cada regra de primeiro nível de um CSS minificado"""
+    rules, depth, start, prelude_end = [], 0, 0, None
+    position = 0
+    while position < len(css):
+        char = css[position]
+        if char in '"\'':
+            position = _skip_literal(css, position)
+            continue
+        if char == '{':
+            if depth == 0:
+                prelude_end = position
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                rules.append((css[start:prelude_end].strip(), css[prelude_end + 1:position]))
+                start = position + 1
+        elif char == ';' and depth == 0:
+            rules.append((css[start:position].strip(), None))  # @import, @charset
+            start = position + 1
+        position += 1
+    return rules
+
+
+SELECTOR_CLASSES = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+SELECTOR_IDS = re.compile(r'#(-?[_a-zA-Z][\w-]*)')
+SELECTOR_TAGS = re.compile(r'(?:^|[\s>+~(])([a-z][a-z0-9]*)(?![\w-])')
+PSEUDO = re.compile(r'::?[\w-]+(\([^)]*\))?|\[[^\]]*\]')
+
+
+def used_selectors(html):
+    """Classes, ids e tags presentes num template (ignorando as tags do Django)"""
+    html = re.sub(r'{%.*?%}|{{.*?}}', ' ', html, flags=re.S)
+    classes = set()
+    for value in re.findall(r'class="([^"]*)"', html):
+        classes.update(value.split())
+    return {
+        'classes': classes,
+        'ids': set(re.findall(r'id="([^"]+)"', html)),
+        'tags': set(re.findall(r'<([a-z][a-z0-9]*)', html)) | {'html', 'body'},
+    }
+
+
+def _selector_used(selector, used):
+    bare = PSEUDO.sub('', selector)
+    if not bare.strip() or bare.strip() in ('*', ':root'):
+        return True
+    return (
+        set(SELECTOR_CLASSES.findall(bare)) <= used['classes']
+        and set(SELECTOR_IDS.findall(bare)) <= used['ids']
+        and set(SELECTOR_TAGS.findall(SELECTOR_CLASSES.sub('', SELECTOR_IDS.sub('', bare)))) <= used['tags']
+    )
+
+
+def split_critical(css, used):
+    """Separa ``css`` (minificado) em ``(crítico, resto)``.
+
+    Crítico são as regras cujos seletores só usam o que está em ``used``; de
+    uma lista de seletores, só os usados vão para o crítico e os outros
+    ficam no resto com o mesmo corpo. Blocos ``@media`` são separados
+    recursivamente; ``@keyframes``, ``@font-face`` e ``@import`` ficam no resto.
+    """
+    kept, rest = [], []
+    for prelude, body in _split_rules(css):
+        if body is None:
+            rest.append(f'{prelude};')
+        elif prelude.startswith('@media') or prelude.startswith('@supports'):
+            inner, outer = split_critical(body, used)
+            if inner:
+                kept.append(f'{prelude}{{{inner}}}')
+            if outer:
+                rest.append(f'{prelude}{{{outer}}}')
+        elif prelude.startswith('@'):
+            rest.append(f'{prelude}{{{body}}}')
+        else:
+            selectors = prelude.split(',')
+            critical = [selector for selector in selectors if _selector_used(selector, used)]
+            others = [selector for selector in selectors if selector not in critical]
+            if critical:
+                kept.append(f'{",".join(critical)}{{{body}}}')
+            if others:
+                rest.append(f'{",".join(others)}{{{body}}}')
+    return ''.join(kept), ''.join(rest)
+
+
+def compressed_sizes(data):
+    """Tamanho com gzip e com Brotli (None se o módulo não estiver instalado)"""
+    gzipped = len(gzip.compress(data, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        return gzipped, None
+    return gzipped, len(brotli.compress(data))
+
+
+def build(critical_templates=None):
+    """Gera os bundles minificados e o CSS crítico em ``ASSET_BUILD_DIR/bundles``.
+
+    Retorna ``{nome: (bytes das fontes, bytes do bundle)}``; para o CSS crítico,
+    ``(bytes dos bundles CSS minificados, bytes do crítico)``.
+    """
+    from django.contrib.staticfiles import finders
+    from django.template.loader import get_template
+
+    used = {'classes': set(), 'ids': set(), 'tags': set()}
+    for template_name in critical_templates or getattr(django_settings, 'ASSET_CRITICAL_TEMPLATES', ['base.html']):
+        with open(get_template(template_name).origin.name, encoding='utf-8') as handle:
+            for kind, values in used_selectors(handle.read()).items():
+                used[kind] |= values
+
+    target = os.path.join(build_dir(), BUNDLE_DIR)
+    os.makedirs(target, exist_ok=True)
+    result, critical, css_bytes = {}, [], 0
+    for name, sources in get_bundles().items():
+        texts = []
+        for source in sources:
+            path = finders.find(source)
+            if path is None:
+                raise FileNotFoundError(f'Arquivo estático não encontrado: {source}')
+            with open(path, encoding='utf-8') as handle:
+                texts.append(handle.read())
+        minify = minify_css if name.endswith('.css') else minify_js
+        # ``;`` entre arquivos JS: um arquivo sem ``;`` no fim não se junta ao próximo
+        joiner = '\n' if name.endswith('.css') else ';\n'
+        content = joiner.join(minify(text) for text in texts)
+        if name.endswith('.css'):
+            # As regras embutidas no <head> não são baixadas de novo com o bundle
+            css_bytes += len(content.encode())
+            inline, content = split_critical(content, used)
+            critical.append(inline)
+        _write(os.path.join(target, name), content)
+        result[name] = (sum(len(text.encode()) for text in texts), len(content.encode()))
+
+    critical = ''.join(critical)
+    _write(os.path.join(target, CRITICAL_NAME), critical)
+    result[CRITICAL_NAME] = (css_bytes, len(critical.encode()))
+    return result
+
+
+def _read_bytes(path):
+    with open(path, 'rb') as handle:
+        return handle.read()
+
+
+def _write(path, content):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as handle:
+        handle.write(content)
+    os.replace(temporary, path)
+
+
+def built_path(name):
+    """Caminho do arquivo gerado por ``build`` ou None se ainda não foi gerado"""
+    directory = build_dir()
+    if not directory:
+        return None
+    path = os.path.join(directory, BUNDLE_DIR, name)
+    return path if os.path.exists(path) else None
+
+
+def read_critical_css():
+    """Conteúdo do CSS crítico (relido só quando o arquivo muda)"""
+    path = built_path(CRITICAL_NAME)
+    if path is None:
+        return ''
+    mtime = os.stat(path).st_mtime
+    cached = _critical_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as handle:
+            cached = _critical_cache[path] = (mtime, handle.read())
+    return cached[1]
+
+
+_critical_cache = {}
+
+
+INLINE_BLOCKS = re.compile(r'<(style|script)\b[^>]*>(.*?)</\1>', re.S)
+
+
+def page_report(directories, result):
+    """Bytes de CSS/JS transferidos por página antes e depois do build.
+
+    Antes: as fontes com gzip (o que o WhiteNoise servia). Depois: os bundles
+    com Brotli (ou gzip) mais o CSS crítico embutido. ``<style>``/``<script>``
+    embutidos na própria página entram nos dois lados sem alteração.
+    """
+    from django.contrib.staticfiles import finders
+
+    before = after = 0
+    for name, sources in get_bundles().items():
+        data = b''.join(_read_bytes(finders.find(source)) for source in sources)
+        before += compressed_sizes(data)[0]
+        gzipped, brotli_size = compressed_sizes(_read_bytes(built_path(name)))
+        after += brotli_size or gzipped
+    after += result[CRITICAL_NAME][1]
+
+    rows = []
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for filename in sorted(files):
+                if not filename.endswith('.html'):
+                    continue
+                path = os.path.join(root, filename)
+                with open(path, encoding='utf-8') as handle:
+                    html = handle.read()
+                if 'base.html' not in html and filename != 'base.html':
+                    continue
+                inline = sum(len(body.encode()) for _, body in INLINE_BLOCKS.findall(html))
+                rows.append((os.path.relpath(path, directory), before + inline, after + inline))
+    return sorted(rows)
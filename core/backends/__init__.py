@@ -0,0 +1,7 @@
+"""
+Backends de banco do projeto: os do Django com o pool de ``core.dbpool``.
+
+Use ``core.backends.sqlite3`` ou ``core.backends.postgresql`` em
+``DATABASES[alias]['ENGINE']`` e configure o pool em
+``DATABASES[alias]['POOL']``.
+"""
@@ -0,0 +1,38 @@
+"""
+SQLite com o pool de ``core.dbpool`` e o perfil de desempenho opcional.
+
+O perfil (``SQLITE_PERFORMANCE`` em settings) preenche duas chaves de
+``DATABASES[alias]``:
+
+- ``PRAGMAS``: aplicados a cada conexão nova com o arquivo (uma vez por
+  conexão física; as retiradas do pool já os têm): WAL, ``synchronous``,
+  ``mmap_size``, ``cache_size`` e ``busy_timeout``.
+- ``TRANSACTION_MODE = 'IMMEDIATE'``: ``atomic()`` abre a transação com
+  ``BEGIN IMMEDIATE``. Com o ``BEGIN`` padrão a transação que lê e depois
+  escreve (``sessions.connect``) tenta subir para escrita no meio e, se outra
+  conexão já escreve, o SQLite falha na hora com ``database is locked`` sem
+  esperar o ``busy_timeout``; pegando o lock de escrita no início, a espera
+  acontece no ``BEGIN``.
+"""
+from django.db.backends.sqlite3 import base
+
+from core.dbpool import PooledDatabaseWrapperMixin
+
+
+class TunedDatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in (self.settings_dict.get('PRAGMAS') or {}).items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, TunedDatabaseWrapper):
+    def _pool_unsupported(self):
+        # Banco em memória: fechar a conexão apaga o banco, e ela nunca é
+        # fechada de qualquer forma (close() é ignorado)
+        return self.is_in_memory_db()
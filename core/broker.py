@@ -0,0 +1,74 @@
+"""
+Broker em processo para o status de conexão.
+
+Cada cliente do stream SSE (``core.views.connection_status_stream``) assina o
+canal do seu usuário com uma fila no event loop do ASGI. ``publish`` pode ser
+chamado de qualquer thread (as views síncronas rodam fora do loop) e só
+entrega o status mais recente: um cliente lento nunca acumula eventos.
+
+O broker é por processo: ``publish`` só alcança os assinantes do worker que
+fez a alteração. Com vários workers (``WEB_CONCURRENCY`` no fly.toml) uma
+conexão aberta ou encerrada em outro worker não chega ao stream, por isso o
+``main.js`` mantém um polling lento de ``/api/status/`` enquanto o stream está
+aberto. Entrega imediata entre workers exige um canal entre processos (Redis
+pub/sub, ``LISTEN/NOTIFY`` do PostgreSQL).
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class Subscription:
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=1)
+
+    def deliver(self, payload):
+        # Executado no loop do assinante; descarta o status anterior não lido
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class StatusBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def has_subscribers(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                return bool(self._subscribers)
+            return user_id in self._subscribers
+
+    def publish(self, user_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, payload)
+            except RuntimeError:
+                # Loop já encerrado
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+status_broker = StatusBroker()
@@ -0,0 +1,131 @@
+"""
+Conexões ativas por servidor e a carga derivada delas.
+
+``VPNServer.active_connections`` é atualizado a cada abertura e encerramento
+de sessão (``core.sessions``) com um ``UPDATE`` usando ``F()``, na mesma
+transação da sessão. A entrada é condicionada à capacidade::
+
+    UPDATE ... SET active_connections = active_connections + 1,
+                   load = MIN(CASE WHEN capacity = 0 THEN 100
+                                   ELSE (active_connections + 1) * 100 / capacity END, 100)
+     WHERE id = %s AND active_connections < capacity
+
+então a reserva da vaga e a verificação de lotação são um único comando
+atômico, sem ler a contagem antes. ``load`` passa a ser sempre a ocupação em %,
+a mesma conta de ``load_for`` (100 sem capacidade, nunca acima de 100).
+
+As atualizações não disparam sinais nem mudam a versão do catálogo (seria uma
+invalidação de todo o catálogo por conexão): depois do commit elas renovam o
+carimbo dos contadores (``catalog.bump_counters``), que invalida só as
+respostas em cache que mostram carga e conexões. ``reconcile`` recalcula os
+contadores a partir das linhas de ``Connection``, corrige desvios (sessões
+encerradas fora de ``core.sessions``, capacidade alterada) e gera uma nova
+versão do catálogo.
+"""
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import Least
+
+from . import catalog
+from .models import VPNServer, Connection
+from .ranking import ranking_index
+
+
+class ServerFull(Exception):
+    """O servidor atingiu a capacidade"""
+
+    def __init__(self, server):
+        super().__init__(f'Servidor {server.name} lotado')
+        self.server = server
+
+
+def load_for(active, capacity):
+    return min(100, active * 100 // capacity) if capacity else 100
+
+
+def load_expression(active):
+    """``load_for`` em SQL, para ``active`` conexões (uma expressão)"""
+    return Least(
+        Case(When(capacity=0, then=Value(100)), default=active * 100 / F('capacity')),
+        Value(100),
+        output_field=IntegerField(),
+    )
+
+
+def acquire(server_id):
+    """Ocupa uma vaga no servidor; False se ele estiver lotado"""
+    acquired = VPNServer.objects.filter(id=server_id, active_connections__lt=F('capacity')).update(
+        active_connections=F('active_connections') + 1,
+        load=load_expression(F('active_connections') + 1),
+    ) == 1
+    if acquired:
+        transaction.on_commit(catalog.bump_counters)
+    return acquired
+
+
+def release(server_ids):
+    """Libera uma vaga por item de ``server_ids`` (um por sessão encerrada)"""
+    released = 0
+    for server_id in server_ids:
+        released += VPNServer.objects.filter(id=server_id, active_connections__gt=0).update(
+            active_connections=F('active_connections') - 1,
+            load=load_expression(F('active_connections') - 1),
+        )
+    if released:
+        transaction.on_commit(catalog.bump_counters)
+
+
+def refresh_load(server_ids):
+    """Recalcula a carga depois de mudar a capacidade"""
+    VPNServer.objects.filter(id__in=server_ids).update(load=load_expression(F('active_connections')))
+
+
+def alternatives(server, limit=3):
+    """Servidores com vaga no mesmo país (ou em qualquer lugar), pelo ranking"""
+    candidates = VPNServer.objects.filter(is_active=True, active_connections__lt=F('capacity')) \
+        .exclude(id=server.id)
+    available = set(candidates.values_list('id', flat=True))
+    result = []
+    for country in (server.country, None):
+        for candidate in ranking_index.recommended(country=country, limit=None):
+            if candidate.id in available and candidate not in result:
+                result.append(candidate)
+                if len(result) >= limit:
+                    return result
+    return result
+
+
+def reconcile():
+    """Recalcula contadores e carga a partir das sessões ativas.
+
+    Retorna os servidores corrigidos como ``{id: (contador antigo, real)}``.
+    """
+    from .sessions import ACTIVE_STATUSES
+
+    with transaction.atomic():
+        # Trava os servidores antes de contar: nenhuma sessão abre ou fecha
+        # (acquire/release) entre a contagem e a gravação
+        servers = list(VPNServer.objects.select_for_update().only('id', 'capacity', 'active_connections', 'load'))
+        actual = dict(
+            Connection.objects.filter(status__in=ACTIVE_STATUSES)
+            .values_list('server_id')
+            .annotate(total=Count('id'))
+        )
+        drift, changed = {}, []
+        for server in servers:
+            active = actual.get(server.id, 0)
+            load = load_for(active, server.capacity)
+            if server.active_connections != active:
+                drift[server.id] = (server.active_connections, active)
+            if (server.active_connections, server.load) != (active, load):
+                server.active_connections, server.load = active, load
+                changed.append(server)
+        if changed:
+            VPNServer.objects.bulk_update(changed, ['active_connections', 'load'])
+    # A carga mudou desde a última versão mesmo sem desvio
+    catalog.bump_version()
+    return drift
+
+
+aalternatives = sync_to_async(alternatives)
@@ -0,0 +1,64 @@
+"""
+Versão do catálogo (servidores, jogos e perfis de otimização).
+
+Qualquer alteração nesses modelos gera uma nova versão (ver ``core.signals``);
+caches de respostas e fragmentos usam a versão na chave, então nunca é
+preciso apagar entradas antigas, elas apenas deixam de ser lidas e expiram.
+A versão fica no cache ``default`` para ser compartilhada entre workers
+quando o backend é compartilhado (arquivo, memcached, redis).
+
+Os contadores de conexões ativas (``core.capacity``) mudam a cada sessão e
+têm um carimbo próprio (``bump_counters``): só as respostas que os incluem o
+usam na chave, e a versão do catálogo (que também fixa as leituras no
+primário, ver ``core.routers``) não muda a cada conexão.
+"""
+import time
+import uuid
+
+from django.core.cache import cache
+
+
+VERSION_KEY = 'catalog:version'
+COUNTERS_KEY = 'catalog:counters'
+PINNED_KEY = 'catalog:pinned_at'
+
+
+def bump_version(pin_reads=True):
+    """Gera uma nova versão; retorna ``(versão, timestamp)``.
+
+    ``pin_reads=False`` para alterações que podem ser lidas de uma réplica
+    atrasada sem prejuízo (o ping medido pelas sondagens): só as outras
+    mandam as leituras para o primário por um tempo (``core.routers``).
+    """
+    version = (uuid.uuid4().hex[:12], time.time())
+    cache.set(VERSION_KEY, version, None)
+    if pin_reads:
+        cache.set(PINNED_KEY, version[1], None)
+    return version
+
+
+def get_version():
+    """Versão atual e o momento (epoch) em que foi gerada"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Cache vazio ou reiniciado: começa uma versão nova
+        cache.add(VERSION_KEY, (uuid.uuid4().hex[:12], time.time()), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def pinned_change_at():
+    """Momento (epoch) da última alteração feita com ``pin_reads`` (0 se nenhuma)"""
+    return cache.get(PINNED_KEY) or 0
+
+
+def bump_counters():
+    """Novo carimbo dos contadores de conexões; retorna ``(carimbo, timestamp)``"""
+    stamp = (uuid.uuid4().hex[:12], time.time())
+    cache.set(COUNTERS_KEY, stamp, None)
+    return stamp
+
+
+def get_counters():
+    """Carimbo atual dos contadores de conexões (``('', 0)`` se nunca mudaram)"""
+    return cache.get(COUNTERS_KEY) or ('', 0)
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from . import catalog
+
+
+DEFAULT_FRAGMENT_TIMEOUT = 60
+
+
+def catalog_version(request):
+    """Versão do catálogo, carimbo dos contadores e validade para as chaves dos ``{% cache %}``"""
+    return {
+        'catalog_version': SimpleLazyObject(lambda: catalog.get_version()[0]),
+        'catalog_counters': SimpleLazyObject(lambda: catalog.get_counters()[0]),
+        'fragment_cache_timeout': getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', DEFAULT_FRAGMENT_TIMEOUT),
+    }
@@ -0,0 +1,328 @@
+"""
+Pool de conexões com o banco, por processo, usado pelos backends de
+``core/backends`` (``ENGINE`` em ``settings.DATABASES``).
+
+Sem pool, o Django abre uma conexão no primeiro acesso ao banco de cada
+request e a fecha no ``request_finished`` (``CONN_MAX_AGE = 0``): no
+PostgreSQL do Render cada request paga TCP, TLS e autenticação. Com o pool,
+``get_new_connection`` retira uma conexão já aberta e ``_close`` a devolve;
+o resto do ciclo de vida do Django (``close_old_connections``,
+``connection_created``, transações) continua igual.
+
+- ``min_size`` conexões são abertas no primeiro uso e mantidas mesmo ociosas;
+  acima disso, as ociosas há mais de ``max_idle`` segundos são fechadas.
+- no máximo ``max_size`` conexões abertas (ociosas + em uso); sem nenhuma
+  livre, a retirada espera até ``timeout`` segundos e levanta ``PoolTimeout``.
+- ``pre_ping``: ``SELECT 1`` antes de entregar uma conexão ociosa; se falhar
+  ela é descartada e outra é usada (o banco reiniciou, o proxy cortou...).
+- ``max_lifetime``: conexões mais velhas que isso são fechadas na devolução.
+
+Um pool herdado por ``fork`` (gunicorn com ``preload_app``) nunca é usado nem
+fechado no processo filho: as conexões continuam sendo do processo pai. O
+filho cria o próprio pool e guarda o herdado em ``_inherited`` até o fim: se
+fosse coletado, o driver (``PQfinish`` no psycopg2) encerraria a sessão no
+socket que o pai ainda usa.
+
+``pool_stats`` alimenta os gauges ``db_pool_*`` do ``/metrics``.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+
+DEFAULTS = {
+    'MIN_SIZE': 1,
+    'MAX_SIZE': 10,
+    'TIMEOUT': 5.0,
+    'MAX_LIFETIME': 1800.0,
+    'MAX_IDLE': 600.0,
+    'PRE_PING': True,
+}
+
+
+class PoolTimeout(OperationalError):
+    """Nenhuma conexão livre no pool dentro do tempo de espera"""
+
+
+class PooledConnection:
+    __slots__ = ('raw', 'created_at', 'returned_at')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = self.returned_at = time.monotonic()
+
+
+class ConnectionPool:
+    def __init__(self, alias, min_size=1, max_size=10, timeout=5.0,
+                 max_lifetime=1800.0, max_idle=600.0, pre_ping=True):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError(f'Pool {alias}: tamanho inválido (min {min_size}, max {max_size})')
+        self.alias = alias
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.pre_ping = pre_ping
+        self.pid = os.getpid()
+
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._opening = 0
+        self._waiting = 0
+        self._filled = False
+
+        self.checkouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _open(self, connect):
+        """Abre uma conexão fora do lock.
+
+        A vaga foi reservada em ``_opening``; quem chama a libera (com o lock)
+        ao guardar a conexão em ``_idle`` ou ``_in_use``, para o tamanho do
+        pool nunca passar de ``max_size`` nesse meio-tempo.
+        """
+        try:
+            return PooledConnection(connect())
+        except BaseException:
+            with self._condition:
+                self._opening -= 1
+                self._condition.notify()
+            raise
+
+    def _discard(self, pooled):
+        self.discarded += 1
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+
+    def _ping(self, raw):
+        try:
+            cursor = raw.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def fill(self, connect):
+        """Abre conexões até ``min_size``"""
+        while True:
+            with self._condition:
+                if self.size >= self.min_size:
+                    return
+                self._opening += 1
+            pooled = self._open(connect)
+            with self._condition:
+                self._opening -= 1
+                self.created += 1
+                self._idle.append(pooled)
+                self._condition.notify()
+
+    def _trim(self, now):
+        # Chamado com o lock: fecha as ociosas acima do mínimo, das mais antigas
+        while self._idle and self.size > self.min_size and now - self._idle[0].returned_at >= self.max_idle:
+            self._discard(self._idle.popleft())
+
+    def checkout(self, connect):
+        """Conexão do pool (ou nova com ``connect()``, se houver vaga); espera até ``timeout``"""
+        if not self._filled:
+            self._filled = True
+            self.fill(connect)
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            with self._condition:
+                self._trim(started)
+                while not self._idle and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f'Pool {self.alias}: nenhuma conexão livre em {self.timeout:g}s '
+                            f'({self.max_size} em uso)'
+                        )
+                    self._waiting += 1
+                    try:
+                        self._condition.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    # LIFO: a conexão usada há menos tempo, a mais provável de estar viva
+                    pooled = self._idle.pop()
+                    self._in_use[id(pooled.raw)] = pooled
+                else:
+                    self._opening += 1
+                    pooled = None
+
+            if pooled is None:
+                pooled = self._open(connect)
+                with self._condition:
+                    self._opening -= 1
+                    self.created += 1
+                    self._in_use[id(pooled.raw)] = pooled
+            elif self.pre_ping and not self._ping(pooled.raw):
+                with self._condition:
+                    del self._in_use[id(pooled.raw)]
+                    self._discard(pooled)
+                    self._condition.notify()
+                continue
+
+            waited = time.monotonic() - started
+            with self._condition:
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.wait_max = max(self.wait_max, waited)
+            return pooled.raw
+
+    def checkin(self, raw, discard=False):
+        """Devolve ``raw`` ao pool (ou fecha, se ``discard`` ou velha demais)"""
+        if os.getpid() != self.pid:
+            # Herdada do processo pai: não é nossa para fechar nem reutilizar
+            return
+        with self._condition:
+            # Continua em _in_use (contando no tamanho) até voltar para _idle
+            pooled = self._in_use.get(id(raw))
+        if pooled is None:
+            raw.close()
+            return
+
+        now = time.monotonic()
+        if not discard and now - pooled.created_at < self.max_lifetime:
+            try:
+                # Nenhuma transação aberta volta para o pool
+                raw.rollback()
+            except Exception:
+                discard = True
+        else:
+            discard = True
+
+        with self._condition:
+            del self._in_use[id(raw)]
+            if discard:
+                self._discard(pooled)
+            else:
+                pooled.returned_at = now
+                self._idle.append(pooled)
+            self._condition.notify()
+
+    def close(self):
+        """Fecha as conexões ociosas (as em uso fecham ao serem devolvidas)"""
+        with self._condition:
+            while self._idle:
+                self._discard(self._idle.popleft())
+            self._filled = False
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiting': self._waiting,
+                'max_size': self.max_size,
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'discarded': self.discarded,
+                'timeouts': self.timeouts,
+                'wait_seconds': self.wait_seconds,
+                'wait_max': self.wait_max,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Pools herdados do processo pai: referenciados para nunca serem coletados
+_inherited = []
+
+
+def pool_options(settings_dict):
+    """Opções de ``DATABASES[alias]['POOL']`` com os padrões; None se desligado"""
+    options = settings_dict.get('POOL')
+    if not options or not options.get('ENABLED', True):
+        return None
+    return {**DEFAULTS, **{key: value for key, value in options.items() if key != 'ENABLED'}}
+
+
+def get_pool(alias, options):
+    """Pool do alias neste processo (criado no primeiro uso, e de novo após um fork)"""
+    pool = _pools.get(alias)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pools_lock:
+        detach_inherited()
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(
+                alias,
+                min_size=options['MIN_SIZE'],
+                max_size=options['MAX_SIZE'],
+                timeout=options['TIMEOUT'],
+                max_lifetime=options['MAX_LIFETIME'],
+                max_idle=options['MAX_IDLE'],
+                pre_ping=options['PRE_PING'],
+            )
+        return pool
+
+
+def detach_inherited():
+    """Tira de ``_pools`` os pools de outro processo, sem fechar as conexões deles"""
+    for alias, pool in list(_pools.items()):
+        if pool.pid != os.getpid():
+            _inherited.append(_pools.pop(alias))
+
+
+def pool_stats():
+    """``{alias: stats}`` dos pools deste processo"""
+    return {alias: pool.stats() for alias, pool in list(_pools.items()) if pool.pid == os.getpid()}
+
+
+def close_pools():
+    for pool in list(_pools.values()):
+        if pool.pid == os.getpid():
+            pool.close()
+
+
+class PooledDatabaseWrapperMixin:
+    """Mixin para ``DatabaseWrapper``: conexões vêm do pool e voltam para ele"""
+
+    def _pool(self):
+        options = pool_options(self.settings_dict)
+        if options is None or self._pool_unsupported():
+            return None
+        return get_pool(self.alias, options)
+
+    def _pool_unsupported(self):
+        return False
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool()
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        self._pooled_by = pool
+        return pool.checkout(lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params))
+
+    def _close(self):
+        pool = getattr(self, '_pooled_by', None)
+        if pool is None or self.connection is None:
+            return super()._close()
+        self._pooled_by = None
+        # Conexão com erro ou devolvida no meio de um atomic() não é reaproveitada
+        pool.checkin(self.connection, discard=self.errors_occurred or self.in_atomic_block)
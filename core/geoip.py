@@ -0,0 +1,244 @@
+"""
+Localização aproximada do cliente pelo IP, para sugerir servidores próximos.
+
+A base é um CSV local (``GEOIP_DATABASE``) com uma faixa por linha::
+
+    # rede ou início-fim, país (ISO), região, latitude, longitude
+    177.54.128.0/18,BR,SP,-23.55,-46.63
+    200.1.0.0-200.1.255.255,CL,RM
+
+Latitude e longitude são opcionais (vale o centro do país). As faixas IPv4
+ficam em dois ``array('I')`` ordenados (início e fim) mais um ``array('H')``
+com o índice da região, então a busca é um ``bisect`` e a memória fica em
+~10 bytes por faixa; regiões repetidas são guardadas uma vez só.
+
+Cada worker confere a data de modificação do arquivo a cada
+``GEOIP_CHECK_INTERVAL`` segundos e, se mudou, carrega uma tabela nova e só
+então a troca pela antiga (uma atribuição), então buscas concorrentes nunca
+veem uma tabela pela metade.
+"""
+import csv
+import ipaddress
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECK_INTERVAL = 30
+
+Region = namedtuple('Region', 'country region latitude longitude')
+
+# Centro aproximado dos países por código ISO, com o nome usado em VPNServer.country
+COUNTRIES = {
+    'BR': ('Brasil', -14.2, -51.9),
+    'AR': ('Argentina', -38.4, -63.6),
+    'CL': ('Chile', -35.7, -71.5),
+    'CO': ('Colômbia', 4.6, -74.1),
+    'PE': ('Peru', -9.2, -75.0),
+    'UY': ('Uruguai', -32.5, -55.8),
+    'PY': ('Paraguai', -23.4, -58.4),
+    'MX': ('México', 23.6, -102.6),
+    'US': ('Estados Unidos', 37.1, -95.7),
+    'PT': ('Portugal', 39.4, -8.2),
+    'DE': ('Alemanha', 51.2, 10.5),
+    'JP': ('Japão', 36.2, 138.3),
+}
+COUNTRY_COORDINATES = {name: (lat, lon) for name, lat, lon in COUNTRIES.values()}
+
+CITY_COORDINATES = {
+    'São Paulo': (-23.55, -46.63),
+    'Rio de Janeiro': (-22.91, -43.17),
+    'Brasília': (-15.79, -47.88),
+    'Fortaleza': (-3.72, -38.54),
+    'Porto Alegre': (-30.03, -51.23),
+    'Buenos Aires': (-34.60, -58.38),
+    'Santiago': (-33.45, -70.67),
+    'Bogotá': (4.71, -74.07),
+    'Lima': (-12.05, -77.04),
+    'Cidade do México': (19.43, -99.13),
+    'Miami': (25.76, -80.19),
+    'Dallas': (32.78, -96.80),
+    'Nova York': (40.71, -74.01),
+    'Lisboa': (38.72, -9.14),
+    'Frankfurt': (50.11, 8.68),
+    'Tóquio': (35.68, 139.69),
+}
+
+
+def distance_km(origin, target):
+    """Distância em km entre dois pontos ``(latitude, longitude)``"""
+    lat1, lon1 = map(math.radians, origin)
+    lat2, lon2 = map(math.radians, target)
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 12742 * math.asin(math.sqrt(min(1.0, a)))
+
+
+def server_location(server):
+    """Coordenadas de um servidor pela cidade, ou pelo país"""
+    return CITY_COORDINATES.get(server.city) or COUNTRY_COORDINATES.get(server.country)
+
+
+def _parse_range(field):
+    if '/' in field:
+        network = ipaddress.ip_network(field.strip(), strict=False)
+        return network.version, int(network.network_address), int(network.broadcast_address)
+    first, _, last = field.partition('-')
+    start = ipaddress.ip_address(first.strip())
+    end = ipaddress.ip_address(last.strip()) if last else start
+    return start.version, int(start), int(end)
+
+
+class GeoTable:
+    """Faixas de IP ordenadas e suas regiões (imutável depois de construída)"""
+
+    def __init__(self, rows=()):
+        regions = {}
+        v4, v6 = [], []
+        for version, start, end, region in rows:
+            index = regions.setdefault(region, len(regions))
+            (v4 if version == 4 else v6).append((start, end, index))
+        v4.sort()
+        v6.sort()
+        self.regions = list(regions)
+        self.v4_starts = array('I', (row[0] for row in v4))
+        self.v4_ends = array('I', (row[1] for row in v4))
+        self.v4_regions = array('H' if len(self.regions) <= 0xFFFF else 'I', (row[2] for row in v4))
+        self.v6_starts = [row[0] for row in v6]
+        self.v6_ends = [row[1] for row in v6]
+        self.v6_regions = [row[2] for row in v6]
+
+    def __len__(self):
+        return len(self.v4_starts) + len(self.v6_starts)
+
+    @classmethod
+    def load(cls, path):
+        rows = []
+        with open(path, encoding='utf-8', newline='') as handle:
+            for line_number, fields in enumerate(csv.reader(handle), 1):
+                if not fields or fields[0].startswith('#'):
+                    continue
+                try:
+                    version, start, end = _parse_range(fields[0])
+                except ValueError:
+                    if line_number == 1:
+                        continue  # cabeçalho
+                    raise ValueError(f'{path}:{line_number}: faixa inválida {fields[0]!r}')
+                country = fields[1].strip().upper() if len(fields) > 1 else ''
+                region = fields[2].strip() if len(fields) > 2 else ''
+                if len(fields) > 4 and fields[3].strip() and fields[4].strip():
+                    latitude, longitude = float(fields[3]), float(fields[4])
+                else:
+                    _, latitude, longitude = COUNTRIES.get(country, (None, None, None))
+                rows.append((version, start, end, Region(country, region, latitude, longitude)))
+        return cls(rows)
+
+    def lookup(self, address):
+        try:
+            value = int.from_bytes(socket.inet_aton(address), 'big') if ':' not in address else None
+        except OSError:
+            return None
+        if value is not None and address.count('.') == 3:
+            starts, ends, regions = self.v4_starts, self.v4_ends, self.v4_regions
+        else:
+            try:
+                ip = ipaddress.ip_address(address)
+            except ValueError:
+                return None
+            if ip.version == 4:
+                return self.lookup(str(ip))
+            if ip.ipv4_mapped:
+                return self.lookup(str(ip.ipv4_mapped))
+            value = int(ip)
+            starts, ends, regions = self.v6_starts, self.v6_ends, self.v6_regions
+        position = bisect_right(starts, value) - 1
+        if position >= 0 and value <= ends[position]:
+            return self.regions[regions[position]]
+        return None
+
+
+class GeoIP:
+    """Tabela de faixas carregada de ``GEOIP_DATABASE`` e recarregada se o arquivo mudar"""
+
+    def __init__(self, path=None, check_interval=None):
+        self._path = path
+        self.check_interval = check_interval if check_interval is not None else \
+            getattr(settings, 'GEOIP_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        self._table = GeoTable()
+        self._mtime = None
+        self._checked_at = None
+        self._loading = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path or getattr(settings, 'GEOIP_DATABASE', '')
+
+    def lookup(self, address):
+        """Região do endereço (``Region``) ou None"""
+        self._maybe_reload()
+        return self._table.lookup(address) if address else None
+
+    def reload(self):
+        """Carrega o arquivo e troca a tabela atual; retorna o número de faixas"""
+        path = self.path
+        with self._loading:
+            mtime = os.stat(path).st_mtime
+            table = GeoTable.load(path)
+            self._table, self._mtime = table, mtime
+        return len(table)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        path = self.path
+        if not path:
+            return
+        try:
+            if os.stat(path).st_mtime == self._mtime:
+                return
+            self.reload()
+        except (OSError, ValueError) as error:
+            # Mantém a tabela anterior
+            logger.warning('GeoIP: não foi possível carregar %s: %s', path, error)
+
+
+def client_ip(request):
+    """IP do cliente: ``REMOTE_ADDR`` ou, atrás de ``GEOIP_PROXY_COUNT`` proxies, o ``X-Forwarded-For``"""
+    proxies = getattr(settings, 'GEOIP_PROXY_COUNT', 0)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+        if hops:
+            # Cada proxy confiável acrescenta o endereço de quem falou com ele
+            return hops[max(0, len(hops) - proxies)]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def locate(request):
+    """Região do cliente do request (guardada no próprio request)"""
+    if not hasattr(request, '_geo_region'):
+        request._geo_region = geoip.lookup(client_ip(request))
+    return request._geo_region
+
+
+def origin(request):
+    """``(latitude, longitude)`` do cliente, ou None se desconhecida"""
+    region = locate(request)
+    if region is None or region.latitude is None:
+        return None
+    return region.latitude, region.longitude
+
+
+geoip = GeoIP()
@@ -0,0 +1,151 @@
+"""
+Verificações de saúde para o fly/Render, respondidas antes dos middlewares.
+
+``HealthMiddleware`` fica no topo de ``MIDDLEWARE`` e responde sozinho dois
+caminhos, sem sessão, CSRF, autenticação, templates nem ``ALLOWED_HOSTS``
+(o health check do fly chega pelo IP interno da máquina):
+
+- ``/healthz`` (liveness): o processo está de pé. Não toca no banco.
+- ``/readyz`` (readiness): ``SELECT 1`` numa conexão do pool
+  (``core.dbpool``) e um ``set``/``get`` no cache ``default``. O resultado vale por
+  ``HEALTH_READY_TTL`` segundos em cada worker, então checagens frequentes
+  (e vários balanceadores) não viram uma consulta por request.
+
+As respostas trazem a latência de cada verificação em microssegundos.
+"""
+import json
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+
+
+LIVENESS_PATH = '/healthz'
+READINESS_PATH = '/readyz'
+DEFAULT_READY_TTL = 2.0
+CACHE_KEY = 'health:ready'
+
+
+def _micros(started):
+    return round((time.perf_counter() - started) * 1_000_000)
+
+
+def check_database(alias=DEFAULT_DB_ALIAS):
+    started = time.perf_counter()
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except Exception as exc:
+        return {'ok': False, 'us': _micros(started), 'error': exc.__class__.__name__}
+    return {'ok': True, 'us': _micros(started)}
+
+
+def check_cache():
+    started = time.perf_counter()
+    value = uuid.uuid4().hex
+    try:
+        cache.set(CACHE_KEY, value, 30)
+        ok = cache.get(CACHE_KEY) == value
+    except Exception as exc:
+        return {'ok': False, 'us': _micros(started), 'error': exc.__class__.__name__}
+    return {'ok': ok, 'us': _micros(started)}
+
+
+class Readiness:
+    """Último resultado do ``/readyz`` neste processo, válido por ``ttl`` segundos"""
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = 0.0
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else \
+            getattr(settings, 'HEALTH_READY_TTL', DEFAULT_READY_TTL)
+
+    def cached(self):
+        """``(resultado, idade)`` ou None se expirou"""
+        age = time.monotonic() - self._checked_at
+        if self._result is None or age >= self.ttl:
+            return None
+        return self._result, age
+
+    def check(self):
+        with self._lock:
+            # Outro thread pode ter verificado enquanto este esperava
+            current = self.cached()
+            if current is not None:
+                return current
+            checks = {'database': check_database(), 'cache': check_cache()}
+            self._result = {'ok': all(check['ok'] for check in checks.values()), 'checks': checks}
+            self._checked_at = time.monotonic()
+            return self._result, 0.0
+
+    def reset(self):
+        self._result = None
+
+
+def _response(payload, status=200):
+    response = HttpResponse(json.dumps(payload), content_type='application/json', status=status)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def liveness_response():
+    return _response({'status': 'ok'})
+
+
+def readiness_response(result, age, started):
+    payload = {
+        'status': 'ok' if result['ok'] else 'unavailable',
+        'checks': result['checks'],
+        'cached': age > 0,
+        'age_ms': round(age * 1000),
+        'us': _micros(started),
+    }
+    return _response(payload, 200 if result['ok'] else 503)
+
+
+class HealthMiddleware:
+    """Responde ``/healthz`` e ``/readyz`` sem passar pelo resto da pilha"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        path = request.path_info
+        if path == LIVENESS_PATH:
+            return liveness_response()
+        if path == READINESS_PATH:
+            started = time.perf_counter()
+            return readiness_response(*(readiness.cached() or readiness.check()), started)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        path = request.path_info
+        if path == LIVENESS_PATH:
+            return liveness_response()
+        if path == READINESS_PATH:
+            started = time.perf_counter()
+            # Dentro do TTL responde no event loop, sem ir para uma thread
+            current = readiness.cached() or await sync_to_async(readiness.check)()
+            return readiness_response(*current, started)
+        return await self.get_response(request)
+
+
+readiness = Readiness()
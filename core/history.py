@@ -0,0 +1,248 @@
+"""
+Histórico de ping/carga por servidor.
+
+As amostras não viram uma linha cada: são agregadas em slots de tamanho fixo
+(1 minuto, 1 hora e 1 dia) e cada ``ServerMetricBlock`` guarda um bloco de
+slots consecutivos empacotado como ``array('I')``. Cada slot contém:
+
+    count, soma do ping, soma da carga, ping mínimo, ping máximo,
+    e um histograma de ping com ``len(PING_BUCKETS)`` faixas
+
+Toda amostra é somada nas três resoluções ao mesmo tempo (rollup incremental),
+então consultas nunca reprocessam amostras brutas. O número de linhas por
+servidor é limitado pela retenção de cada resolução e uma consulta lê no
+máximo ``MAX_POINTS`` slots.
+"""
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ServerMetricBlock
+
+
+# Limites superiores (ms) das faixas do histograma; a última faixa é aberta
+PING_BUCKETS = [5, 10, 15, 20, 25, 30, 40, 50, 60, 80, 100, 130, 160, 200, 300, 500, 1000]
+
+COUNT, PING_SUM, LOAD_SUM, PING_MIN, PING_MAX = range(5)
+HIST = 5
+SLOT_WIDTH = HIST + len(PING_BUCKETS) + 1
+
+# resolução -> (segundos por slot, slots por bloco)
+TIERS = {
+    '1m': (60, 60),
+    '1h': (3600, 24),
+    '1d': (86400, 32),
+}
+
+DEFAULT_RETENTION = {
+    '1m': timedelta(days=2),
+    '1h': timedelta(days=90),
+    '1d': timedelta(days=5 * 365),
+}
+
+MAX_POINTS = 2000
+
+EMPTY_MIN = 0xFFFFFFFF
+
+
+def get_retention(resolution):
+    retention = getattr(settings, 'SERVER_HISTORY_RETENTION', {})
+    return retention.get(resolution, DEFAULT_RETENTION[resolution])
+
+
+def _epoch(moment):
+    return int(moment.timestamp())
+
+
+def _from_epoch(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+
+def _block_start(ts, resolution):
+    slot_seconds, slots = TIERS[resolution]
+    span = slot_seconds * slots
+    return ts - ts % span
+
+
+def _empty_block(resolution):
+    slots = TIERS[resolution][1]
+    data = array('I', [0]) * (slots * SLOT_WIDTH)
+    for slot in range(slots):
+        data[slot * SLOT_WIDTH + PING_MIN] = EMPTY_MIN
+    return data
+
+
+def pack(data):
+    if sys.byteorder == 'big':
+        data = array('I', data)
+        data.byteswap()
+    return data.tobytes()
+
+
+def unpack(raw):
+    data = array('I')
+    data.frombytes(bytes(raw))
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+
+def _add_sample(data, slot, ping, load):
+    base = slot * SLOT_WIDTH
+    ping = max(0, int(ping))
+    data[base + COUNT] += 1
+    data[base + PING_SUM] += ping
+    data[base + LOAD_SUM] += max(0, int(load))
+    data[base + PING_MIN] = min(data[base + PING_MIN], ping)
+    data[base + PING_MAX] = max(data[base + PING_MAX], ping)
+    data[base + HIST + bisect_left(PING_BUCKETS, ping)] += 1
+
+
+def record_samples(samples):
+    """Grava amostras ``(server_id, momento, ping, carga)`` em todas as resoluções.
+
+    Cada bloco afetado é lido e escrito uma única vez, com uma consulta por
+    resolução, um ``bulk_create`` e um ``bulk_update``.
+    """
+    samples = [(server_id, _epoch(moment), ping, load) for server_id, moment, ping, load in samples]
+    if not samples:
+        return
+
+    with transaction.atomic():
+        for resolution, (slot_seconds, slots) in TIERS.items():
+            grouped = {}
+            for server_id, ts, ping, load in samples:
+                start = _block_start(ts, resolution)
+                slot = (ts - start) // slot_seconds
+                grouped.setdefault((server_id, start), []).append((slot, ping, load))
+
+            existing = {
+                (block.server_id, _epoch(block.start)): block
+                for block in ServerMetricBlock.objects.filter(
+                    resolution=resolution,
+                    server_id__in={server_id for server_id, _ in grouped},
+                    start__in={_from_epoch(start) for _, start in grouped},
+                )
+            }
+
+            to_create, to_update = [], []
+            for (server_id, start), points in grouped.items():
+                block = existing.get((server_id, start))
+                data = unpack(block.data) if block else _empty_block(resolution)
+                for slot, ping, load in points:
+                    _add_sample(data, slot, ping, load)
+                if block:
+                    block.data = pack(data)
+                    to_update.append(block)
+                else:
+                    to_create.append(ServerMetricBlock(
+                        server_id=server_id, resolution=resolution,
+                        start=_from_epoch(start), data=pack(data),
+                    ))
+
+            ServerMetricBlock.objects.bulk_create(to_create)
+            ServerMetricBlock.objects.bulk_update(to_update, ['data'])
+
+
+def prune(now=None):
+    """Remove blocos que já saíram da retenção de sua resolução"""
+    now = now or timezone.now()
+    deleted = 0
+    for resolution, (slot_seconds, slots) in TIERS.items():
+        cutoff = now - get_retention(resolution) - timedelta(seconds=slot_seconds * slots)
+        deleted += ServerMetricBlock.objects.filter(
+            resolution=resolution, start__lt=cutoff
+        ).delete()[0]
+    return deleted
+
+
+def pick_resolution(start, end):
+    """Menor resolução que cobre o intervalo com no máximo MAX_POINTS slots"""
+    span = (end - start).total_seconds()
+    for resolution, (slot_seconds, _) in TIERS.items():
+        if span / slot_seconds <= MAX_POINTS:
+            return resolution
+    return '1d'
+
+
+def _percentile(hist, total, lowest, highest, q):
+    """Estima o percentil ``q`` interpolando dentro da faixa do histograma"""
+    rank = q / 100 * total
+    seen = 0
+    for index, count in enumerate(hist):
+        if count and seen + count >= rank:
+            low = PING_BUCKETS[index - 1] if index else 0
+            high = PING_BUCKETS[index] if index < len(PING_BUCKETS) else highest
+            low, high = max(low, lowest), min(high, highest)
+            value = low + (high - low) * (rank - seen) / count
+            return round(value, 1)
+        seen += count
+    return float(highest)
+
+
+def query(server_id, start, end, resolution=None, percentiles=(50, 95, 99)):
+    """Série temporal e percentis de um servidor no intervalo ``[start, end)``"""
+    resolution = resolution or pick_resolution(start, end)
+    slot_seconds, slots = TIERS[resolution]
+    start_ts, end_ts = _epoch(start), _epoch(end)
+    start_ts -= start_ts % slot_seconds
+    if (end_ts - start_ts) / slot_seconds > MAX_POINTS:
+        start_ts = end_ts - end_ts % slot_seconds - (MAX_POINTS - 1) * slot_seconds
+
+    blocks = ServerMetricBlock.objects.filter(
+        server_id=server_id,
+        resolution=resolution,
+        start__gt=_from_epoch(start_ts - slot_seconds * slots),
+        start__lt=_from_epoch(end_ts),
+    ).order_by('start')
+
+    points = []
+    hist = [0] * (len(PING_BUCKETS) + 1)
+    total = ping_sum = 0
+    lowest, highest = EMPTY_MIN, 0
+    for block in blocks:
+        block_start = _epoch(block.start)
+        data = unpack(block.data)
+        for slot in range(slots):
+            ts = block_start + slot * slot_seconds
+            base = slot * SLOT_WIDTH
+            count = data[base + COUNT]
+            if not count or ts < start_ts or ts >= end_ts:
+                continue
+            points.append({
+                'time': _from_epoch(ts).isoformat(),
+                'samples': count,
+                'ping_avg': round(data[base + PING_SUM] / count, 1),
+                'ping_min': data[base + PING_MIN],
+                'ping_max': data[base + PING_MAX],
+                'load_avg': round(data[base + LOAD_SUM] / count, 1),
+            })
+            total += count
+            ping_sum += data[base + PING_SUM]
+            lowest = min(lowest, data[base + PING_MIN])
+            highest = max(highest, data[base + PING_MAX])
+            for index in range(len(hist)):
+                hist[index] += data[base + HIST + index]
+
+    summary = {'samples': total}
+    if total:
+        summary.update({
+            'ping_avg': round(ping_sum / total, 1),
+            'ping_min': lowest,
+            'ping_max': highest,
+        })
+        for q in percentiles:
+            summary[f'p{q:g}'] = _percentile(hist, total, lowest, highest, q)
+
+    return {
+        'resolution': resolution,
+        'start': _from_epoch(start_ts).isoformat(),
+        'end': _from_epoch(end_ts).isoformat(),
+        'summary': summary,
+        'points': points,
+    }
@@ -0,0 +1,74 @@
+"""
+Paginação por keyset (cursor) do histórico de conexões.
+
+A ordem é ``connected_at`` decrescente com ``id`` como desempate. O cursor
+guarda o par da última linha entregue e a próxima página é buscada com
+``WHERE (connected_at, id) < cursor``, que o índice ``(user, -connected_at,
+-id)`` resolve sem ler as páginas anteriores: o custo é o mesmo na primeira
+página ou na milésima.
+
+Linhas antigas podem ter ``connected_at`` nulo; elas vêm depois de todas as
+outras, ordenadas só por ``id``.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(moment, pk):
+    raw = json.dumps([moment.isoformat() if moment else None, pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        moment, pk = json.loads(raw)
+        pk = int(pk)
+        # Data impossível (mês 13) é ValueError; algo que não é texto, TypeError
+        parsed = None if moment is None else parse_datetime(moment)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if moment is not None and parsed is None:
+        raise InvalidCursor(cursor)
+    return parsed, pk
+
+
+def _get(item, name):
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+def keyset_page(queryset, cursor=None, page_size=20, field='connected_at'):
+    """Uma página de ``queryset`` após ``cursor``; retorna ``(itens, próximo_cursor)``.
+
+    Funciona com querysets de instâncias ou de ``values()`` (que precisam
+    incluir ``field`` e ``id``).
+    """
+    moment, pk = decode_cursor(cursor) if cursor else (None, None)
+    null_phase = cursor is not None and moment is None
+    items = []
+
+    if not null_phase:
+        dated = queryset.filter(**{f'{field}__isnull': False})
+        if moment is not None:
+            dated = dated.filter(Q(**{f'{field}__lt': moment}) | Q(**{field: moment, 'id__lt': pk}))
+        items = list(dated.order_by(f'-{field}', '-id')[:page_size + 1])
+
+    if len(items) <= page_size:
+        undated = queryset.filter(**{f'{field}__isnull': True})
+        if null_phase:
+            undated = undated.filter(id__lt=pk)
+        items += list(undated.order_by('-id')[:page_size + 1 - len(items)])
+
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    last = items[-1]
+    return items, encode_cursor(_get(last, field), _get(last, 'id'))
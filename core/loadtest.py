@@ -0,0 +1,395 @@
+"""
+Teste de carga HTTP reproduzível (comando ``loadtest``).
+
+Sobe o projeto localmente a partir de ``exitlag_free/wsgi.py`` (gunicorn, ou
+o servidor WSGI da biblioteca padrão se o gunicorn não estiver instalado) ou
+``exitlag_free/asgi.py`` (uvicorn), ou usa uma URL já em execução. Cada
+usuário virtual faz login e executa uma mistura ponderada de ações parecida
+com o tráfego real. O resultado por endpoint (p50/p95/p99, requisições por
+segundo, erros e consultas SQL por requisição, lidas do ``X-Query-Count`` de
+``core.query_budget``) pode ser salvo como baseline JSON e comparado depois.
+
+``sweep`` mede a concorrência: mantém N requests simultâneos em voo (um
+cliente asyncio, sem uma thread por conexão) contra um endpoint e sobe N
+até a latência ou os erros passarem do limite, para comparar quantos
+requests em voo o mesmo servidor aguenta em WSGI e em ASGI.
+"""
+import asyncio
+import http.cookiejar
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from django.conf import settings
+
+
+PASSWORD = 'loadtest-password-123'
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+# (nome, peso, método, caminho); {server}, {game} e {country} são sorteados
+ACTIONS = [
+    ('status_poll', 30, 'GET', '/api/status/'),
+    ('dashboard', 10, 'GET', '/dashboard/'),
+    ('servers_page', 6, 'GET', '/servers/'),
+    ('servers_page_filtered', 3, 'GET', '/servers/?country={country}&search=a'),
+    ('games_page', 4, 'GET', '/games/?category=FPS'),
+    ('api_servers', 8, 'GET', '/api/servers/'),
+    ('api_servers_by_country', 3, 'GET', '/api/servers/by_country/'),
+    ('api_servers_recommended', 5, 'GET', '/api/servers/recommended/?game={game}'),
+    ('api_server_history', 1, 'GET', '/api/servers/{server}/history/'),
+    ('api_games', 4, 'GET', '/api/games/'),
+    ('api_games_by_category', 2, 'GET', '/api/games/by_category/'),
+    ('api_connections', 3, 'GET', '/api/connections/'),
+    ('api_connections_active', 5, 'GET', '/api/connections/active/'),
+    ('api_profile', 2, 'GET', '/api/profile/'),
+    ('api_stats', 1, 'GET', '/api/stats/'),
+    ('connect', 3, 'POST', '/connect/{server}/'),
+    ('disconnect', 3, 'POST', '/disconnect/'),
+    ('api_connect', 2, 'POST', '/api/connections/connect/'),
+    ('api_disconnect', 2, 'POST', '/api/connections/disconnect/'),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_wsgi(port):
+    """Servidor WSGI multithread da biblioteca padrão (fallback sem gunicorn)"""
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    from exitlag_free.wsgi import application
+    make_server('127.0.0.1', port, application, ThreadingWSGIServer, QuietHandler).serve_forever()
+
+
+def server_command(mode, port, workers):
+    bind = f'127.0.0.1:{port}'
+    if mode == 'wsgi':
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            return [sys.executable, '-c', f'from core.loadtest import serve_wsgi; serve_wsgi({port})']
+        return [sys.executable, '-m', 'gunicorn', 'exitlag_free.wsgi:application',
+                '--bind', bind, '--workers', str(workers), '--log-level', 'warning']
+    if mode == 'asgi':
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            # O mesmo worker do deploy (gunicorn.conf.py com SERVER_MODE=asgi)
+            return [sys.executable, '-m', 'gunicorn', 'exitlag_free.asgi:application',
+                    '--worker-class', 'uvicorn.workers.UvicornWorker',
+                    '--bind', bind, '--workers', str(workers), '--log-level', 'warning']
+        return [sys.executable, '-m', 'uvicorn', 'exitlag_free.asgi:application',
+                '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+                '--log-level', 'warning']
+    raise ValueError(mode)
+
+
+class LocalServer:
+    """Processo do servidor local, encerrado ao sair do bloco ``with``"""
+
+    def __init__(self, mode, workers=1, env=None):
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.command = server_command(mode, self.port, workers)
+        self.env = {**os.environ, 'QUERY_BUDGET_ENABLED': 'True', **(env or {})}
+        self.env.setdefault('DJANGO_SETTINGS_MODULE', os.environ.get('DJANGO_SETTINGS_MODULE', ''))
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=settings.BASE_DIR, env=self.env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'servidor encerrou com código {self.process.returncode}')
+            try:
+                urllib.request.urlopen(self.url + '/login/', timeout=1)
+                return self
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError('servidor não respondeu em 30s')
+
+    def __exit__(self, *exc_info):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class VirtualUser:
+    def __init__(self, base_url, username, rng, catalog, recorder):
+        self.base_url = base_url
+        self.username = username
+        self.rng = rng
+        self.catalog = catalog
+        self.recorder = recorder
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies),
+            NoRedirect,
+        )
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, name, method, path, data=None, headers=None):
+        headers = {'X-CSRFToken': self.csrf_token(), 'Referer': self.base_url + '/', **(headers or {})}
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        started = time.perf_counter()
+        try:
+            response = self.opener.open(request, timeout=30)
+            status, content, queries = response.status, response.read(), response.headers.get('X-Query-Count')
+        except urllib.error.HTTPError as error:
+            status, content, queries = error.code, error.read(), error.headers.get('X-Query-Count')
+        except (urllib.error.URLError, OSError):
+            status, content, queries = 0, b'', None
+        elapsed = time.perf_counter() - started
+        self.recorder.add(name, elapsed, status, queries)
+        return status, content
+
+    def login(self):
+        _, content = self.request('login_form', 'GET', '/login/')
+        match = CSRF_INPUT.search(content.decode(errors='ignore'))
+        status, _ = self.request('login', 'POST', '/login/', {
+            'username': self.username,
+            'password': PASSWORD,
+            'csrfmiddlewaretoken': match.group(1) if match else '',
+        })
+        return status in (200, 302)
+
+    def step(self, actions, weights):
+        name, _, method, path = self.rng.choices(actions, weights)[0]
+        server = self.rng.choice(self.catalog['servers'])
+        path = path.format(
+            server=server,
+            game=self.rng.choice(self.catalog['games']),
+            country=urllib.parse.quote(self.rng.choice(self.catalog['countries'])),
+        )
+        data = None
+        if method == 'POST':
+            data = {'server_id': server, 'ping_before': self.rng.randint(40, 160)}
+        self.request(name, method, path, data)
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.queries = defaultdict(list)
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.errors.clear()
+            self.queries.clear()
+
+    def add(self, name, elapsed, status, queries):
+        with self._lock:
+            self.samples[name].append(elapsed)
+            if status == 0 or status >= 500:
+                self.errors[name] += 1
+            if queries is not None:
+                self.queries[name].append(int(queries))
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(recorder, duration):
+    endpoints = {}
+    everything = []
+    for name, samples in sorted(recorder.samples.items()):
+        everything.extend(samples)
+        queries = recorder.queries.get(name)
+        endpoints[name] = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(name, 0),
+            'rps': round(len(samples) / duration, 2),
+            'p50_ms': round(percentile(samples, 50) * 1000, 2),
+            'p95_ms': round(percentile(samples, 95) * 1000, 2),
+            'p99_ms': round(percentile(samples, 99) * 1000, 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    return {
+        'duration_s': round(duration, 2),
+        'total': {
+            'requests': len(everything),
+            'errors': sum(recorder.errors.values()),
+            'rps': round(len(everything) / duration, 2),
+            'p50_ms': round(percentile(everything, 50) * 1000, 2),
+            'p95_ms': round(percentile(everything, 95) * 1000, 2),
+            'p99_ms': round(percentile(everything, 99) * 1000, 2),
+        },
+        'endpoints': endpoints,
+    }
+
+
+def run(base_url, usernames, catalog, duration, seed=0, actions=None):
+    """Executa os usuários virtuais por ``duration`` segundos e resume o resultado"""
+    actions = actions or ACTIONS
+    weights = [action[1] for action in actions]
+    recorder = Recorder()
+    stop = threading.Event()
+    barrier = threading.Barrier(len(usernames) + 1)
+
+    def worker(index, username):
+        user = VirtualUser(base_url, username, random.Random(seed * 1000 + index), catalog, recorder)
+        user.login()
+        barrier.wait()
+        while not stop.is_set():
+            user.step(actions, weights)
+
+    threads = [threading.Thread(target=worker, args=(index, username), daemon=True)
+               for index, username in enumerate(usernames)]
+    for thread in threads:
+        thread.start()
+    # A medição começa depois que todos fizeram login
+    barrier.wait()
+    recorder.reset()
+    started = time.monotonic()
+    stop.wait(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return summarize(recorder, time.monotonic() - started)
+
+
+async def _fetch(host, port, raw_request, timeout):
+    """Um request HTTP/1.1 com ``Connection: close``; retorna o status (0 em falha)"""
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(raw_request)
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+        return 0
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def _hold(host, port, raw_request, concurrency, duration, timeout):
+    samples, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            status = await _fetch(host, port, raw_request, timeout)
+            samples.append(time.perf_counter() - started)
+            if status == 0 or status >= 500:
+                errors += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return samples, errors, time.monotonic() - started
+
+
+def sweep(base_url, username, levels, duration, path='/api/status/', target_p99_ms=500, timeout=30):
+    """Latência e vazão com ``levels`` requests simultâneos em voo contra ``path``.
+
+    Retorna um resultado por nível e ``max_concurrency``: o maior nível sem
+    erros e com p99 dentro de ``target_p99_ms``.
+    """
+    user = VirtualUser(base_url, username, random.Random(0), {}, Recorder())
+    if not user.login():
+        raise RuntimeError(f'login de {username} falhou')
+    cookies = '; '.join(f'{cookie.name}={cookie.value}' for cookie in user.cookies)
+    parsed = urllib.parse.urlsplit(base_url)
+    host, port = parsed.hostname, parsed.port or 80
+    raw_request = (
+        f'GET {path} HTTP/1.1\r\nHost: {parsed.netloc}\r\nCookie: {cookies}\r\n'
+        f'Accept: application/json\r\nConnection: close\r\n\r\n'
+    ).encode()
+
+    results, sustained = [], 0
+    for concurrency in levels:
+        samples, errors, elapsed = asyncio.run(
+            _hold(host, port, raw_request, concurrency, duration, timeout))
+        level = {
+            'concurrency': concurrency,
+            'requests': len(samples),
+            'errors': errors,
+            'rps': round(len(samples) / elapsed, 2),
+            'p50_ms': round(percentile(samples, 50) * 1000, 2),
+            'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        }
+        results.append(level)
+        if errors or level['p99_ms'] > target_p99_ms:
+            break
+        sustained = concurrency
+    return {'path': path, 'target_p99_ms': target_p99_ms, 'levels': results, 'max_concurrency': sustained}
+
+
+def compare(current, baseline, threshold):
+    """Lista de regressões de ``current`` frente a ``baseline``"""
+    regressions = []
+    for name, base in baseline.get('endpoints', {}).items():
+        now = current['endpoints'].get(name)
+        if not now:
+            continue
+        if base['p95_ms'] and now['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f'{name}: p95 {base["p95_ms"]}ms -> {now["p95_ms"]}ms')
+        if base['rps'] and now['rps'] < base['rps'] * (1 - threshold):
+            regressions.append(f'{name}: rps {base["rps"]} -> {now["rps"]}')
+        if base.get('queries_per_request') is not None and now.get('queries_per_request') is not None \
+                and now['queries_per_request'] > base['queries_per_request'] + 0.5:
+            regressions.append(
+                f'{name}: consultas/req {base["queries_per_request"]} -> {now["queries_per_request"]}')
+        if now['errors'] > base['errors']:
+            regressions.append(f'{name}: erros {base["errors"]} -> {now["errors"]}')
+    return regressions
+
+
+def dump(result, path):
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(result, handle, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
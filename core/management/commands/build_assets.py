@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core import assets
+
+
+class Command(BaseCommand):
+    help = 'Minify and bundle the project JS/CSS, extract critical CSS and report the bytes saved per page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-report', action='store_true', help='Não mostrar o relatório de tamanhos')
+
+    def handle(self, *args, **options):
+        if not assets.build_dir():
+            raise CommandError('ASSET_BUILD_DIR não está configurado')
+        try:
+            result = assets.build()
+        except FileNotFoundError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(f'Bundles gerados em {assets.build_dir()}'))
+        if not options['no_report']:
+            self.report(result)
+        self.stdout.write('Rode collectstatic para gerar os nomes com hash e as versões gzip/Brotli.')
+
+    def report(self, result):
+        header = f'{"arquivo":16} {"fontes":>9} {"minif.":>9} {"gzip":>9} {"brotli":>9}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, (source, minified) in result.items():
+            with open(assets.built_path(name), 'rb') as handle:
+                gzipped, brotli_size = assets.compressed_sizes(handle.read())
+            self.stdout.write(f'{name:16} {source:>9} {minified:>9} {gzipped:>9} '
+                              f'{brotli_size if brotli_size is not None else "-":>9}')
+        if brotli_size is None:
+            self.stdout.write(self.style.WARNING('Módulo brotli não instalado: só gzip será gerado'))
+
+        directories = [directory for engine in settings.TEMPLATES for directory in engine.get('DIRS', [])]
+        rows = assets.page_report(directories, result)
+        self.stdout.write('')
+        header = f'{"página":32} {"antes":>9} {"depois":>9} {"economia":>9}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for page, before, after in rows:
+            saved = before - after
+            self.stdout.write(f'{page:32} {before:>9} {after:>9} {saved:>9} ({saved * 100 / before:.0f}%)')
@@ -0,0 +1,54 @@
+import statistics
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from core import health
+from core.startup import local_request
+
+
+class Command(BaseCommand):
+    help = 'Measure in-process latency of /healthz and /readyz against a regular page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests por endpoint')
+        parser.add_argument('--compare', default='/login/',
+                            help='Página para comparar (o antigo health check), renderizada pela pilha inteira')
+
+    def handle(self, *args, **options):
+        application = WSGIHandler()
+        total = options['requests']
+        if total < 1:
+            raise CommandError('--requests precisa ser pelo menos 1')
+
+        cases = [
+            (health.LIVENESS_PATH, health.LIVENESS_PATH, None),
+            (f'{health.READINESS_PATH} (cache)', health.READINESS_PATH, None),
+            (f'{health.READINESS_PATH} (verificando)', health.READINESS_PATH, health.readiness.reset),
+            (options['compare'], options['compare'], None),
+        ]
+        status, _ = local_request(application, options['compare'])
+        if not 200 <= status < 400:
+            raise CommandError(f'{options["compare"]} respondeu {status}: a comparação seria com uma página de erro '
+                               f'(sem collectstatic? use --compare com uma página que renderize)')
+        self.stdout.write(f'{"endpoint":<26} {"status":>6} {"p50":>10} {"p99":>10} {"média":>10}')
+        for label, path, before in cases:
+            # Aquecimento: conexão, URLconf e templates fora da medição
+            local_request(application, path)
+            samples = []
+            for _ in range(total):
+                if before:
+                    before()
+                started = time.perf_counter()
+                status, _ = local_request(application, path)
+                samples.append((time.perf_counter() - started) * 1_000_000)
+            samples.sort()
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            self.stdout.write(
+                f'{label:<26} {status:>6} {self.format(statistics.median(samples)):>10} '
+                f'{self.format(p99):>10} {self.format(statistics.fmean(samples)):>10}'
+            )
+
+    @staticmethod
+    def format(micros):
+        return f'{micros:.0f}µs' if micros < 1000 else f'{micros / 1000:.2f}ms'
@@ -0,0 +1,124 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from core import loadtest
+from core.models import VPNServer, Game
+
+
+class Command(BaseCommand):
+    help = 'Run an HTTP load test against a local WSGI/ASGI server and compare with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['wsgi', 'asgi', 'both'], default='wsgi',
+                            help='Servidor local a iniciar (ignorado com --url); both só com --sweep')
+        parser.add_argument('--url', help='Testar um servidor já em execução')
+        parser.add_argument('--workers', type=int, default=3, help='Workers do servidor local')
+        parser.add_argument('--users', type=int, default=10, help='Usuários virtuais simultâneos')
+        parser.add_argument('--duration', type=float, default=30, help='Duração da medição (s)')
+        parser.add_argument('--seed', type=int, default=0, help='Semente da mistura de ações')
+        parser.add_argument('--output', help='Salvar o resultado neste arquivo JSON')
+        parser.add_argument('--compare', help='Baseline JSON para comparar')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Piora relativa tolerada antes de acusar regressão')
+        parser.add_argument('--sweep', help='Níveis de concorrência (ex.: 10,50,100,200) contra --path, '
+                                            'em vez da mistura de ações')
+        parser.add_argument('--path', default='/api/status/', help='Endpoint do --sweep')
+        parser.add_argument('--target-p99', type=float, default=500,
+                            help='p99 máximo (ms) para um nível do --sweep contar como sustentado')
+
+    def handle(self, *args, **options):
+        catalog = {
+            'servers': list(VPNServer.objects.filter(is_active=True).values_list('id', flat=True)),
+            'games': list(Game.objects.filter(is_optimized=True).values_list('slug', flat=True)),
+            'countries': list(VPNServer.objects.filter(is_active=True)
+                              .values_list('country', flat=True).distinct()),
+        }
+        if not catalog['servers'] or not catalog['games']:
+            raise CommandError('Catálogo vazio: rode populate_db antes')
+
+        usernames = self.ensure_users(options['users'])
+
+        if options['sweep']:
+            return self.sweep(usernames[0], options)
+        if options['server'] == 'both':
+            raise CommandError('--server both só vale com --sweep')
+
+        if options['url']:
+            result = loadtest.run(options['url'].rstrip('/'), usernames, catalog,
+                                  options['duration'], options['seed'])
+        else:
+            self.stdout.write(f'Iniciando servidor {options["server"]} com {options["workers"]} workers...')
+            with loadtest.LocalServer(options['server'], options['workers']) as server:
+                result = loadtest.run(server.url, usernames, catalog, options['duration'], options['seed'])
+        result['config'] = {key: options[key] for key in ('server', 'url', 'workers', 'users', 'duration', 'seed')}
+
+        self.report(result)
+        if options['output']:
+            loadtest.dump(result, options['output'])
+            self.stdout.write(f'Resultado salvo em {options["output"]}')
+
+        if options['compare']:
+            regressions = loadtest.compare(result, loadtest.load(options['compare']), options['threshold'])
+            if regressions:
+                for line in regressions:
+                    self.stdout.write(self.style.ERROR(f'Regressão: {line}'))
+                raise CommandError(f'{len(regressions)} regressões em relação ao baseline')
+            self.stdout.write(self.style.SUCCESS('Sem regressões em relação ao baseline'))
+
+    def sweep(self, username, options):
+        try:
+            levels = sorted({int(level) for level in options['sweep'].split(',') if level.strip()})
+        except ValueError:
+            raise CommandError('--sweep espera números separados por vírgula')
+        if not levels or levels[0] < 1:
+            raise CommandError('--sweep espera níveis positivos')
+
+        def measure(url):
+            return loadtest.sweep(url, username, levels, options['duration'], options['path'],
+                                  options['target_p99'])
+
+        results = {}
+        if options['url']:
+            results['url'] = measure(options['url'].rstrip('/'))
+        else:
+            modes = ['wsgi', 'asgi'] if options['server'] == 'both' else [options['server']]
+            for mode in modes:
+                self.stdout.write(f'Iniciando servidor {mode} com {options["workers"]} workers...')
+                with loadtest.LocalServer(mode, options['workers']) as server:
+                    results[mode] = measure(server.url)
+
+        for mode, result in results.items():
+            self.stdout.write(f'\n{mode}: {result["path"]} (p99 alvo {result["target_p99_ms"]:.0f}ms)')
+            header = f'{"em voo":>8} {"req":>7} {"err":>5} {"rps":>8} {"p50":>8} {"p99":>8}'
+            self.stdout.write(header)
+            self.stdout.write('-' * len(header))
+            for level in result['levels']:
+                self.stdout.write(
+                    f'{level["concurrency"]:>8} {level["requests"]:>7} {level["errors"]:>5} '
+                    f'{level["rps"]:>8.1f} {level["p50_ms"]:>6.1f}ms {level["p99_ms"]:>6.1f}ms')
+            self.stdout.write(self.style.SUCCESS(
+                f'{mode}: {result["max_concurrency"]} requests simultâneos sustentados'))
+
+        if options['output']:
+            loadtest.dump({'sweep': results, 'workers': options['workers']}, options['output'])
+            self.stdout.write(f'Resultado salvo em {options["output"]}')
+
+    def ensure_users(self, count):
+        usernames = [f'loadtest-{index}' for index in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        for username in usernames:
+            if username not in existing:
+                User.objects.create_user(username=username, password=loadtest.PASSWORD)
+        return usernames
+
+    def report(self, result):
+        header = f'{"endpoint":28} {"req":>7} {"err":>5} {"rps":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"sql/req":>8}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        rows = list(result['endpoints'].items()) + [('TOTAL', result['total'])]
+        for name, stats in rows:
+            queries = stats.get('queries_per_request')
+            self.stdout.write(
+                f'{name:28} {stats["requests"]:>7} {stats["errors"]:>5} {stats["rps"]:>8.1f} '
+                f'{stats["p50_ms"]:>7.1f}ms {stats["p95_ms"]:>6.1f}ms {stats["p99_ms"]:>6.1f}ms '
+                f'{queries if queries is not None else "-":>8}'
+            )
@@ -0,0 +1,95 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from core import dbpool
+from core.models import Connection
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request database latency with and without the connection pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests simulados por modo')
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Threads simultâneas (acima de DB_POOL_MAX_SIZE mostra a espera)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Alias do banco')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        settings_dict = connections[alias].settings_dict
+        if not settings_dict['ENGINE'].startswith('core.backends.') or dbpool.pool_options(settings_dict) is None:
+            raise CommandError(f'O banco {alias} não usa o pool (ENGINE core.backends.* com DB_POOL ligado)')
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('--requests e --threads precisam ser pelo menos 1')
+
+        original = settings_dict['POOL']
+        try:
+            settings_dict['POOL'] = {**original, 'ENABLED': False}
+            without_pool = self.run(alias, options['requests'], options['threads'])
+        finally:
+            settings_dict['POOL'] = original
+        with_pool = self.run(alias, options['requests'], options['threads'])
+        stats = dbpool.pool_stats().get(alias, {})
+
+        self.stdout.write(f'{settings_dict["ENGINE"]} ({settings_dict["NAME"]}), '
+                          f'{options["requests"]} requests, {options["threads"]} thread(s)\n')
+        self.stdout.write(f'{"modo":<10} {"p50":>10} {"p99":>10} {"média":>10} {"req/s":>8} {"erros":>6}')
+        for label, (samples, elapsed, errors) in (('sem pool', without_pool), ('com pool', with_pool)):
+            samples.sort()
+            self.stdout.write(
+                f'{label:<10} {self.format(statistics.median(samples)):>10} '
+                f'{self.format(samples[max(0, int(len(samples) * 0.99) - 1)]):>10} '
+                f'{self.format(statistics.fmean(samples)):>10} {len(samples) / elapsed:>8.0f} {errors:>6}'
+            )
+        saved = statistics.fmean(without_pool[0]) - statistics.fmean(with_pool[0])
+        self.stdout.write(f'\nEconomia por request: {self.format(saved)}')
+        if stats:
+            self.stdout.write(
+                f'Pool: {stats["created"]} conexões abertas para {stats["checkouts"]} retiradas, '
+                f'máximo {stats["max_size"]}; espera total {stats["wait_seconds"] * 1000:.1f}ms, '
+                f'maior {stats["wait_max"] * 1000:.2f}ms, {stats["timeouts"]} timeouts'
+            )
+
+    def run(self, alias, total, threads):
+        """Latência (µs) de cada request simulado (abrir, consultar e encerrar) e erros"""
+        samples = []
+        errors = 0
+        lock = threading.Lock()
+
+        def worker(count):
+            nonlocal errors
+            local, failed = [], 0
+            for _ in range(count):
+                started = time.perf_counter()
+                # Mesmo ciclo de um request: close_old_connections no início e no
+                # fim, que sem pool fecha a conexão (CONN_MAX_AGE = 0)
+                request_started.send(sender=self.__class__)
+                try:
+                    Connection.objects.using(alias).filter(status='connected').exists()
+                except OperationalError:
+                    # PoolTimeout (ou "database is locked" no SQLite)
+                    failed += 1
+                finally:
+                    request_finished.send(sender=self.__class__)
+                local.append((time.perf_counter() - started) * 1_000_000)
+            connections.close_all()
+            with lock:
+                samples.extend(local)
+                errors += failed
+
+        share, extra = divmod(total, threads)
+        workers = [threading.Thread(target=worker, args=(share + (index < extra),)) for index in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return samples, time.perf_counter() - started, errors
+
+    @staticmethod
+    def format(micros):
+        return f'{micros:.0f}µs' if micros < 1000 else f'{micros / 1000:.2f}ms'
@@ -1,12 +1,75 @@
-from django.core.management.base import BaseCommand
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
+from django.utils import timezone
+from core import catalog, synthetic, usage
 from core.models import VPNServer, Game, OptimizationProfile
+from core.ranking import ranking_index
 
 
 class Command(BaseCommand):
     help = 'Populate database with sample data for ExitLag Free'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0,
+                            help='Usuários sintéticos (com perfil e jogos favoritos)')
+        parser.add_argument('--connections', type=int, default=0,
+                            help='Conexões sintéticas a acrescentar ao histórico')
+        parser.add_argument('--servers', type=int, default=0, help='Servidores sintéticos')
+        parser.add_argument('--seed', type=int, default=1, help='Semente dos dados sintéticos')
+        parser.add_argument('--days', type=int, default=90,
+                            help='Período coberto pelo histórico de conexões')
+        parser.add_argument('--batch-size', type=int, default=synthetic.BATCH_SIZE,
+                            help='Linhas por lote de inserção')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Usar bulk_create mesmo no PostgreSQL')
+
     def handle(self, *args, **options):
+        self.populate_samples()
+        if options['users'] or options['connections'] or options['servers']:
+            self.populate_scale(options)
+
+    def populate_scale(self, options):
+        """Dados sintéticos em escala, determinísticos pela semente"""
+        if min(options['users'], options['connections'], options['servers']) < 0 or options['days'] < 1:
+            raise CommandError('Quantidades devem ser positivas')
+
+        inserter = synthetic.Inserter(options['batch_size'], use_copy=False if options['no_copy'] else None)
+        seed = options['seed']
+        self.stdout.write(f'Gerando dados sintéticos (semente {seed}, '
+                          f'{"COPY" if inserter.use_copy else "bulk_create"})...')
+
+        if options['servers']:
+            synthetic.generate_servers(inserter, options['servers'], seed)
+            catalog.bump_version()
+            ranking_index.invalidate()
+
+        server_ids = list(VPNServer.objects.filter(is_active=True).values_list('id', flat=True))
+        game_ids = list(Game.objects.values_list('id', flat=True))
+        if options['users']:
+            synthetic.generate_users(inserter, options['users'], seed, server_ids, game_ids)
+
+        if options['connections']:
+            user_ids = list(User.objects.filter(username__startswith=f'synth{seed}-')
+                            .values_list('id', flat=True)) or list(User.objects.values_list('id', flat=True))
+            synthetic.generate_connections(inserter, options['connections'], seed,
+                                           user_ids, server_ids, game_ids, options['days'])
+            since = timezone.localdate() - timedelta(days=options['days'])
+            rows = usage.rebuild(since)
+            self.stdout.write(f'Uso diário recalculado: {rows} linhas')
+
+        total_rows = total_time = 0
+        for label, (rows, elapsed) in inserter.stats.items():
+            total_rows += rows
+            total_time += elapsed
+            rate = rows / elapsed if elapsed else 0
+            self.stdout.write(f'  {label:16} {rows:>10} linhas em {elapsed:7.2f}s ({rate:,.0f} linhas/s)')
+        rate = total_rows / total_time if total_time else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_rows} linhas sintéticas em {total_time:.2f}s ({rate:,.0f} linhas/s)'))
+
+    def populate_samples(self):
         self.stdout.write('Criando dados de exemplo...')
 
         # Create VPN Servers
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core import history
+from core.models import VPNServer
+from core.probing import refresh_servers, DEFAULT_PORT, DEFAULT_TIMEOUT, DEFAULT_CONCURRENCY
+
+
+class Command(BaseCommand):
+    help = 'Measure TCP connect latency of every active VPN server and update its ping'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                            help='Porta TCP sondada em cada servidor')
+        parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                            help='Timeout por sonda, em segundos')
+        parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                            help='Máximo de sondas simultâneas')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repetir a cada N segundos (0 = executar uma vez)')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            self.probe_once(options)
+            if interval <= 0:
+                break
+            time.sleep(interval)
+
+    def probe_once(self, options):
+        started = time.perf_counter()
+        updated, failed = refresh_servers(
+            VPNServer.objects.filter(is_active=True),
+            port=options['port'],
+            timeout=options['timeout'],
+            concurrency=options['concurrency'],
+        )
+        pruned = history.prune()
+        elapsed = time.perf_counter() - started
+
+        for server in failed:
+            self.stdout.write(self.style.WARNING(f'Sem resposta: {server.ip_address}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(updated)} servidores atualizados, {len(failed)} sem resposta, '
+            f'{pruned} blocos de histórico expirados em {elapsed:.2f}s'
+        ))
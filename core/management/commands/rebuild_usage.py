@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from core import usage
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily usage rollups from the connection history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Recalcular a partir desta data (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('Data inválida, use AAAA-MM-DD')
+
+        rows = usage.rebuild(since)
+        self.stdout.write(self.style.SUCCESS(f'{rows} linhas de uso diário recalculadas'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core import capacity
+
+
+class Command(BaseCommand):
+    help = 'Recount active sessions per server and fix the connection counters and load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repetir a cada N segundos (0 = executar uma vez)')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            self.reconcile_once()
+            if interval <= 0:
+                break
+            time.sleep(interval)
+
+    def reconcile_once(self):
+        drift = capacity.reconcile()
+        for server_id, (counted, actual) in sorted(drift.items()):
+            self.stdout.write(self.style.WARNING(
+                f'Servidor {server_id}: contador {counted}, sessões ativas {actual}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Contadores reconciliados ({len(drift)} servidores corrigidos)'))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core import routers
+
+
+class Command(BaseCommand):
+    help = 'Show read replicas with their weight and lag; --sync copies the SQLite primary into SQLite replicas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync', action='store_true',
+                            help='Copiar o primário para as réplicas SQLite (testes locais)')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Com --sync, repetir a cada N segundos (simula a replicação contínua)')
+
+    def handle(self, *args, **options):
+        replicas = routers.replica_set.replicas
+        if not replicas:
+            raise CommandError('Nenhuma réplica configurada (DATABASE_REPLICA_URLS)')
+
+        while True:
+            if options['sync']:
+                for replica in replicas:
+                    try:
+                        routers.sync_sqlite_replica(replica.alias)
+                    except ValueError as exc:
+                        raise CommandError(str(exc))
+                    # Mede de novo na próxima escolha
+                    replica.checked_at = None
+            self.report()
+            if not options['sync'] or options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
+
+    def report(self):
+        self.stdout.write(f'{"réplica":<12} {"peso":>5} {"atraso":>9}  estado')
+        for row in routers.replica_set.status():
+            lag = f'{row["lag"]:.1f}s' if row['lag'] is not None else '-'
+            state = self.style.SUCCESS('disponível') if row['available'] else self.style.WARNING(
+                'fora do ar' if row['lag'] is None else 'atrasada')
+            self.stdout.write(f'{row["alias"]:<12} {row["weight"]:>5} {lag:>9}  {state}')
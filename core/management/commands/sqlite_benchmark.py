@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from core import sessions
+from core.models import Connection, VPNServer
+from core.writes import write_queue
+
+
+USERNAME = 'sqlite-bench-{}'
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent session writes on SQLite with and without the performance profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Processos, como os workers do gunicorn')
+        parser.add_argument('--threads', type=int, default=4, help='Threads por processo')
+        parser.add_argument('--duration', type=float, default=5.0, help='Segundos de carga por modo')
+        # Modos internos: executados nos subprocessos, contra a cópia do banco
+        parser.add_argument('--prepare', type=int, default=0, help=argparse.SUPPRESS)
+        parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['prepare']:
+            return self.prepare(options['prepare'])
+        if options['worker'] is not None:
+            return self.worker(options['worker'], options['threads'], options['duration'])
+
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('O banco default não é SQLite')
+        if options['workers'] < 1 or options['threads'] < 1 or options['duration'] <= 0:
+            raise CommandError('--workers e --threads precisam ser pelo menos 1 e --duration positivo')
+
+        source = str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+        users = options['workers'] * options['threads']
+        with tempfile.TemporaryDirectory(prefix='sqlite-bench-') as directory:
+            # Cópias do banco: a carga não toca no original e cada modo começa do mesmo estado
+            base = os.path.join(directory, 'base.sqlite3')
+            self.copy(source, base)
+            self.subprocess(base, False, '--prepare', str(users)).check_returncode()
+
+            results = {}
+            for label, enabled in (('padrão', False), ('desempenho', True)):
+                path = os.path.join(directory, f'{enabled:d}.sqlite3')
+                self.copy(base, path)
+                results[label] = self.run(path, enabled, options)
+
+        self.stdout.write(
+            f'{source}: {options["workers"]} processo(s) x {options["threads"]} thread(s), '
+            f'{options["duration"]:g}s por modo (connect + close_all por operação)\n'
+        )
+        self.stdout.write(f'{"modo":<12} {"ops/s":>8} {"p50":>10} {"p99":>10} {"locked":>7} {"erros":>6}')
+        for label, result in results.items():
+            samples = sorted(result['latencies'])
+            if not samples:
+                samples = [0.0]
+            self.stdout.write(
+                f'{label:<12} {result["ops"] / options["duration"]:>8.0f} '
+                f'{self.format(statistics.median(samples)):>10} '
+                f'{self.format(samples[max(0, int(len(samples) * 0.99) - 1)]):>10} '
+                f'{result["locked"]:>7} {result["errors"]:>6}'
+            )
+        tuned = results['desempenho']
+        if tuned['batches']:
+            self.stdout.write(
+                f'\nFila de escrita: {tuned["jobs"]} operações em {tuned["batches"]} transações '
+                f'({tuned["jobs"] / tuned["batches"]:.1f} por lote, maior {tuned["largest_batch"]})'
+            )
+        baseline = results['padrão']['ops']
+        if baseline:
+            self.stdout.write(f'Vazão: {tuned["ops"] / baseline:.1f}x')
+
+    @staticmethod
+    def copy(source, target):
+        source_db, target_db = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            source_db.backup(target_db)
+            # O backup copia o modo WAL do original; o modo padrão começa em DELETE
+            target_db.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            source_db.close()
+            target_db.close()
+
+    @staticmethod
+    def subprocess(path, enabled, *arguments, **kwargs):
+        env = {
+            **os.environ,
+            'DATABASE_URL': f'sqlite:///{path}',
+            'DATABASE_REPLICA_URLS': '',
+            'SQLITE_PERFORMANCE': str(enabled),
+            'SQLITE_WRITE_QUEUE': str(enabled),
+        }
+        command = [sys.executable, '-m', 'django', 'sqlite_benchmark', *arguments]
+        if kwargs.pop('background', False):
+            return subprocess.Popen(command, env=env, cwd=settings.BASE_DIR, text=True,
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return subprocess.run(command, env=env, cwd=settings.BASE_DIR)
+
+    def run(self, path, enabled, options):
+        workers = [
+            self.subprocess(path, enabled, '--worker', str(index * options['threads']),
+                            '--threads', str(options['threads']), '--duration', str(options['duration']),
+                            background=True)
+            for index in range(options['workers'])
+        ]
+        # Barreira: todos carregaram o Django e os dados antes de começar
+        for process in workers:
+            if process.stdout.readline().strip() != 'ready':
+                raise CommandError('Um worker do benchmark falhou ao iniciar')
+        for process in workers:
+            process.stdin.write('go\n')
+            process.stdin.flush()
+
+        total = {'ops': 0, 'locked': 0, 'errors': 0, 'latencies': [], 'batches': 0, 'jobs': 0, 'largest_batch': 0}
+        for process in workers:
+            output, _ = process.communicate()
+            if process.returncode:
+                raise CommandError('Um worker do benchmark falhou')
+            result = json.loads(output)
+            for key in ('ops', 'locked', 'errors', 'latencies', 'batches', 'jobs'):
+                total[key] += result[key]
+            total['largest_batch'] = max(total['largest_batch'], result['largest_batch'])
+        return total
+
+    def prepare(self, count):
+        """Usuários do benchmark sem sessões abertas e servidores com vagas de sobra"""
+        names = [USERNAME.format(index) for index in range(count)]
+        existing = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+        User.objects.bulk_create([User(username=name, password='!') for name in names if name not in existing])
+        Connection.objects.filter(status__in=sessions.ACTIVE_STATUSES).update(status='disconnected')
+        VPNServer.objects.update(is_active=True, capacity=1_000_000, active_connections=0, load=0)
+
+    def worker(self, offset, threads, duration):
+        users = list(User.objects.filter(username__in=[USERNAME.format(offset + index) for index in range(threads)]))
+        servers = list(VPNServer.objects.filter(is_active=True))
+        if len(users) < threads or not servers:
+            raise CommandError('Banco do benchmark sem usuários ou servidores')
+        connections.close_all()
+
+        results = {'ops': 0, 'locked': 0, 'errors': 0, 'latencies': []}
+        lock = threading.Lock()
+
+        def load(user, deadline):
+            ops, locked, errors, latencies = 0, 0, 0, []
+            step = 0
+            while time.monotonic() < deadline:
+                server = servers[(user.id + step) % len(servers)]
+                step += 1
+                started = time.perf_counter()
+                try:
+                    sessions.connect(user, server)
+                    sessions.close_all(user)
+                    ops += 1
+                except OperationalError as exc:
+                    if 'locked' in str(exc):
+                        locked += 1
+                    else:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1_000_000)
+            connections.close_all()
+            with lock:
+                results['ops'] += ops
+                results['locked'] += locked
+                results['errors'] += errors
+                results['latencies'].extend(latencies)
+
+        print('ready', flush=True)
+        sys.stdin.readline()
+        deadline = time.monotonic() + duration
+        pool = [threading.Thread(target=load, args=(user, deadline)) for user in users]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        results.update(batches=write_queue.batches, jobs=write_queue.jobs, largest_batch=write_queue.largest_batch)
+        sys.stdout.write(json.dumps(results))
+        sys.stdout.flush()
+
+    @staticmethod
+    def format(micros):
+        return f'{micros:.0f}µs' if micros < 1000 else f'{micros / 1000:.2f}ms'
+
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core import startup
+
+
+class Command(BaseCommand):
+    help = 'Measure cold start in a fresh process: import time per module, app ready() and time to first response'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='Caminho do primeiro request')
+        parser.add_argument('--preload', action='store_true',
+                            help='Aquecer antes do primeiro request, como o gunicorn com preload_app')
+        parser.add_argument('--target', type=float,
+                            default=getattr(settings, 'STARTUP_TARGET_MS', 1000),
+                            help='Tempo máximo (ms) do início do processo à primeira resposta')
+        parser.add_argument('--top', type=int, default=15, help='Quantos módulos/pacotes listar')
+
+    def handle(self, *args, **options):
+        code = f'from core.startup import profile; profile({options["path"]!r}, {options["preload"]!r})'
+
+        # Sem -X importtime para o tempo total (a instrumentação tem custo próprio)
+        spawned_at = time.time()
+        result = self.run([sys.executable, '-c', code])
+        first_response_ms = (result['first_response_at'] - spawned_at) * 1000
+        imports = startup.parse_importtime(
+            self.run([sys.executable, '-X', 'importtime', '-c', code], stderr=True))
+
+        self.stdout.write(f'Primeiro request: GET {options["path"]} -> {result["status"]} ({result["bytes"]} bytes)')
+        self.stdout.write('')
+        for name, seconds in result['phases']:
+            self.stdout.write(f'{name:24} {seconds * 1000:>8.1f}ms')
+
+        self.stdout.write('\nready() por app')
+        for label, seconds in sorted(result['ready'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f'  {label:22} {seconds * 1000:>8.1f}ms')
+
+        total_import = sum(own for _, own, _, _ in imports)
+        self.stdout.write(f'\nImportação: {total_import / 1000:.1f}ms em {len(imports)} módulos; por pacote:')
+        for package, own in startup.by_package(imports)[:options['top']]:
+            self.stdout.write(f'  {package:22} {own / 1000:>8.1f}ms')
+        self.stdout.write('Módulos mais caros (acumulado):')
+        for module, _, cumulative, depth in sorted(imports, key=lambda row: -row[2])[:options['top']]:
+            self.stdout.write(f'  {"  " * min(depth, 6)}{module:{40 - 2 * min(depth, 6)}} {cumulative / 1000:>8.1f}ms')
+
+        self.stdout.write('\nAdiados até o primeiro uso:')
+        for module, loaded in result['loaded'].items():
+            state = self.style.ERROR('carregado') if loaded else self.style.SUCCESS('não carregado')
+            self.stdout.write(f'  {module:30} {state}')
+
+        summary = (f'Do início do processo à primeira resposta: {first_response_ms:.0f}ms '
+                   f'(alvo {options["target"]:.0f}ms)')
+        if not 200 <= result['status'] < 400:
+            # O tempo medido é o de uma página de erro, não o da página pedida
+            raise CommandError(f'{summary}\nGET {options["path"]} respondeu {result["status"]}: a medição não vale '
+                               f'(sem collectstatic/build_assets? use --path com uma página que renderize)')
+        if first_response_ms > options['target']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def run(self, command, stderr=False):
+        process = subprocess.run(command, cwd=settings.BASE_DIR, env=os.environ.copy(),
+                                 capture_output=True, text=True)
+        if process.returncode:
+            raise CommandError(f'Falha ao medir a partida:\n{process.stderr[-2000:]}')
+        if stderr:
+            return process.stderr
+        return json.loads(process.stdout.strip().splitlines()[-1])
@@ -0,0 +1,337 @@
+"""
+Tempo de cada request: total, banco, templates e o restante (a view).
+
+``TimingMiddleware`` abre um acumulador por request (``contextvars``, vale
+para threads e para ASGI, inclusive dentro de ``sync_to_async``), soma o
+tempo e o número de consultas por um ``execute_wrapper`` instalado em cada
+conexão ao ser criada e o tempo de renderização pelo backend
+``TimedDjangoTemplates``. O resultado sai no cabeçalho ``Server-Timing`` e é
+somado em histogramas por rota (nome da URL) e método.
+
+Cada processo (worker do gunicorn) acumula em memória e grava seus números
+em ``METRICS_DIR/worker-<pid>-<id>.json`` no máximo a cada
+``METRICS_FLUSH_INTERVAL`` segundos, com escrita atômica, junto com os
+números do pool de conexões (``core.dbpool``). ``/metrics`` soma os arquivos
+de todos os workers e responde no formato texto do Prometheus. Os contadores
+dos workers que já terminaram (reinício, ``max_requests``) continuam na soma;
+os números do pool são o estado atual de cada pool e só contam os arquivos
+de processos vivos (o pid está no nome).
+"""
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+
+
+# Limites dos buckets do histograma de latência (segundos)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DEFAULT_FLUSH_INTERVAL = 5
+
+_current = contextvars.ContextVar('request_timing', default=None)
+
+
+class Timing:
+    __slots__ = ('db', 'queries', 'template')
+
+    def __init__(self):
+        self.db = 0.0
+        self.queries = 0
+        self.template = 0.0
+
+
+def _record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.db += time.perf_counter() - started
+        timing.queries += 1
+
+
+def install(connection, **kwargs):
+    # No início da lista: execute_wrapper() remove sempre o último da lista
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+connection_created.connect(install)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        if timing is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.template += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """``DjangoTemplates`` que mede o tempo de renderização dos templates"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _new_route():
+    return {'buckets': [0] * (len(BUCKETS) + 1), 'count': 0, 'sum': 0.0,
+            'db': 0.0, 'queries': 0, 'template': 0.0, 'status': {}}
+
+
+class MetricsStore:
+    """Histogramas por rota deste processo, gravados periodicamente em disco"""
+
+    def __init__(self, directory=None, flush_interval=None):
+        self._directory = directory
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        self._lock = threading.Lock()
+        self._routes = defaultdict(_new_route)
+        self._flushed_at = time.monotonic()
+        self._worker = None
+
+    @property
+    def directory(self):
+        return self._directory or getattr(settings, 'METRICS_DIR', '') or \
+            os.path.join(tempfile.gettempdir(), 'exitlag-metrics')
+
+    def observe(self, route, method, status, elapsed, timing):
+        position = 0
+        while position < len(BUCKETS) and elapsed > BUCKETS[position]:
+            position += 1
+        status_class = f'{status // 100}xx'
+        with self._lock:
+            data = self._routes[(route, method)]
+            data['buckets'][position] += 1
+            data['count'] += 1
+            data['sum'] += elapsed
+            data['db'] += timing.db
+            data['queries'] += timing.queries
+            data['template'] += timing.template
+            data['status'][status_class] = data['status'].get(status_class, 0) + 1
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Grava os números deste processo (escrita atômica com rename)"""
+        from .dbpool import pool_stats
+
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            snapshot = {
+                'routes': [
+                    {'route': route, 'method': method, **data}
+                    for (route, method), data in self._routes.items()
+                ],
+                'pools': pool_stats(),
+            }
+        # Processos filhos (fork do gunicorn) recebem um nome de arquivo próprio
+        if self._worker is None or self._worker[0] != os.getpid():
+            self._worker = (os.getpid(), uuid.uuid4().hex[:8])
+        directory = self.directory
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'worker-{self._worker[0]}-{self._worker[1]}.json')
+            fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(snapshot, handle)
+            os.replace(temporary, path)
+        except OSError:
+            pass
+
+    def collect(self):
+        """Soma dos arquivos de todos os workers: ``(rotas, pools)``"""
+        self.flush()
+        totals = defaultdict(_new_route)
+        pools = {}
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except OSError:
+            names = []
+        for name in names:
+            try:
+                with open(os.path.join(self.directory, name)) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            pool_snapshot = snapshot.get('pools', {}) if _worker_alive(name) else {}
+            for alias, stats in pool_snapshot.items():
+                merged = pools.setdefault(alias, dict.fromkeys(stats, 0))
+                for field, value in stats.items():
+                    merged[field] = max(merged[field], value) if field == 'wait_max' else merged[field] + value
+            for row in snapshot.get('routes', []):
+                data = totals[(row['route'], row['method'])]
+                data['buckets'] = [a + b for a, b in zip(data['buckets'], row['buckets'])]
+                for field in ('count', 'sum', 'db', 'queries', 'template'):
+                    data[field] += row[field]
+                for status_class, count in row['status'].items():
+                    data['status'][status_class] = data['status'].get(status_class, 0) + count
+        return totals, pools
+
+
+def _worker_alive(name):
+    """Se o processo que gravou ``worker-<pid>-<id>.json`` ainda existe"""
+    try:
+        pid = int(name.split('-')[1])
+        os.kill(pid, 0)
+    except (IndexError, ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        # Existe, mas é de outro usuário
+        return True
+    return True
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(totals, pools=None):
+    lines = [
+        '# HELP http_request_duration_seconds Tempo total do request no Django.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    ordered = sorted(totals.items())
+    for (route, method), data in ordered:
+        labels = f'route="{_label(route)}",method="{method}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), data['buckets']):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {data["sum"]:.6f}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {data["count"]}')
+
+    for name, field, kind, help_text in (
+        ('http_request_db_seconds_total', 'db', 'counter', 'Tempo gasto em consultas SQL.'),
+        ('http_request_db_queries_total', 'queries', 'counter', 'Consultas SQL executadas.'),
+        ('http_request_template_seconds_total', 'template', 'counter', 'Tempo de renderização de templates.'),
+    ):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (route, method), data in ordered:
+            value = data[field]
+            value = f'{value:.6f}' if isinstance(value, float) else value
+            lines.append(f'{name}{{route="{_label(route)}",method="{method}"}} {value}')
+
+    lines.append('# HELP http_responses_total Respostas por classe de status.')
+    lines.append('# TYPE http_responses_total counter')
+    for (route, method), data in ordered:
+        for status_class, count in sorted(data['status'].items()):
+            lines.append(f'http_responses_total{{route="{_label(route)}",method="{method}",'
+                         f'status="{status_class}"}} {count}')
+
+    if pools:
+        lines.extend(render_pools(pools))
+    return '\n'.join(lines) + '\n'
+
+
+def render_pools(pools):
+    """Gauges e contadores do pool de conexões, por alias (soma dos workers)"""
+    lines = ['# HELP db_pool_connections Conexões abertas no pool por estado.',
+             '# TYPE db_pool_connections gauge']
+    ordered = sorted(pools.items())
+    for alias, stats in ordered:
+        for state in ('idle', 'in_use'):
+            lines.append(f'db_pool_connections{{alias="{_label(alias)}",state="{state}"}} {stats[state]}')
+    for name, kind, help_text, value in (
+        ('db_pool_max_size', 'gauge', 'Máximo de conexões (soma dos workers).', lambda s: s['max_size']),
+        ('db_pool_saturation', 'gauge', 'Conexões em uso / máximo.',
+         lambda s: f'{s["in_use"] / s["max_size"]:.4f}' if s['max_size'] else 0),
+        ('db_pool_waiting', 'gauge', 'Requests esperando uma conexão livre.', lambda s: s['waiting']),
+        ('db_pool_wait_seconds_total', 'counter', 'Tempo total de espera por uma conexão.',
+         lambda s: f'{s["wait_seconds"]:.6f}'),
+        ('db_pool_wait_seconds_max', 'gauge', 'Maior espera por uma conexão.', lambda s: f'{s["wait_max"]:.6f}'),
+        ('db_pool_checkouts_total', 'counter', 'Conexões retiradas do pool.', lambda s: s['checkouts']),
+        ('db_pool_created_total', 'counter', 'Conexões abertas com o banco.', lambda s: s['created']),
+        ('db_pool_discarded_total', 'counter', 'Conexões fechadas (ping, idade, erro).', lambda s: s['discarded']),
+        ('db_pool_timeouts_total', 'counter', 'Retiradas que esgotaram a espera.', lambda s: s['timeouts']),
+    ):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, stats in ordered:
+            lines.append(f'{name}{{alias="{_label(alias)}"}} {value(stats)}')
+    return lines
+
+
+def server_timing(total, timing):
+    app = max(0.0, total - timing.db - timing.template)
+    return (f'total;dur={total * 1000:.1f}, db;dur={timing.db * 1000:.1f};desc="{timing.queries} queries", '
+            f'tpl;dur={timing.template * 1000:.1f}, app;dur={app * 1000:.1f}')
+
+
+class TimingMiddleware:
+    """Mede cada request e adiciona ``Server-Timing`` à resposta"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        for connection in connections.all():
+            install(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        timing = Timing()
+        token = _current.set(timing)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, timing)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        timing = Timing()
+        token = _current.set(timing)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, time.perf_counter() - started, timing)
+
+    def finish(self, request, response, elapsed, timing):
+        match = getattr(request, 'resolver_match', None)
+        route = (match.view_name or match.route) if match else '<unmatched>'
+        if route != 'metrics':
+            metrics_store.observe(route, request.method, response.status_code, elapsed, timing)
+        response['Server-Timing'] = server_timing(elapsed, timing)
+        return response
+
+
+metrics_store = MetricsStore()
@@ -11,6 +11,9 @@ class VPNServer(models.Model):
     ip_address = models.GenericIPAddressField(verbose_name="Endereço IP")
     ping = models.IntegerField(default=0, verbose_name="Ping (ms)")
     load = models.IntegerField(default=0, verbose_name="Carga (%)")
+    capacity = models.PositiveIntegerField(default=100, verbose_name="Capacidade")
+    # Mantido por core.capacity; a carga é derivada dele e da capacidade
+    active_connections = models.PositiveIntegerField(default=0, verbose_name="Conexões Ativas")
     is_active = models.BooleanField(default=True, verbose_name="Ativo")
     flag_icon = models.CharField(max_length=10, verbose_name="Ícone da Bandeira")
     
@@ -82,6 +85,19 @@ class Connection(models.Model):
         verbose_name = "Conexão"
         verbose_name_plural = "Conexões"
         ordering = ['-connected_at']
+        constraints = [
+            # Cada usuário tem no máximo uma sessão ativa (ver core.sessions)
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(status__in=['connecting', 'connected', 'disconnecting']),
+                name='unique_active_connection_per_user',
+            ),
+        ]
+        indexes = [
+            # Histórico paginado por keyset (core.keyset)
+            models.Index(fields=['user', '-connected_at', '-id'], name='connection_user_recent_idx'),
+            models.Index(fields=['user', 'status'], name='connection_user_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.server.name} ({self.status})"
@@ -109,4 +125,101 @@ class OptimizationProfile(models.Model):
         verbose_name_plural = "Perfis de Otimização"
     
     def __str__(self):
-        return f"{self.name} - {self.game.name}"
\ No newline at end of file
+        return f"{self.name} - {self.game.name}"
+
+
+class ServerMetricBlock(models.Model):
+    """Bloco compacto do histórico de ping/carga de um servidor.
+
+    Cada linha guarda um intervalo fixo de slots de uma resolução (1m, 1h, 1d)
+    empacotados em binário; o formato é definido em ``core.history``.
+    """
+    RESOLUTION_CHOICES = [
+        ('1m', '1 minuto'),
+        ('1h', '1 hora'),
+        ('1d', '1 dia'),
+    ]
+
+    server = models.ForeignKey(VPNServer, on_delete=models.CASCADE,
+                               related_name='metric_blocks', verbose_name="Servidor")
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES, verbose_name="Resolução")
+    start = models.DateTimeField(verbose_name="Início")
+    data = models.BinaryField(verbose_name="Dados")
+
+    class Meta:
+        verbose_name = "Bloco de Métricas"
+        verbose_name_plural = "Blocos de Métricas"
+        ordering = ['start']
+        unique_together = [('server', 'resolution', 'start')]
+        indexes = [
+            models.Index(fields=['resolution', 'start']),
+        ]
+
+    def __str__(self):
+        return f"{self.server_id} {self.resolution} {self.start:%Y-%m-%d %H:%M}"
+
+
+class DailyUsage(models.Model):
+    """Uso agregado por dia, servidor e jogo (mantido por ``core.usage``)"""
+    day = models.DateField(verbose_name="Dia")
+    server = models.ForeignKey(VPNServer, on_delete=models.CASCADE,
+                               related_name='daily_usage', verbose_name="Servidor")
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='daily_usage', verbose_name="Jogo")
+    sessions = models.PositiveIntegerField(default=0, verbose_name="Sessões")
+    total_seconds = models.BigIntegerField(default=0, verbose_name="Tempo Total (s)")
+    ping_before_sum = models.BigIntegerField(default=0, verbose_name="Soma Ping Antes")
+    ping_after_sum = models.BigIntegerField(default=0, verbose_name="Soma Ping Depois")
+
+    class Meta:
+        verbose_name = "Uso Diário"
+        verbose_name_plural = "Uso Diário"
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'server', 'game'],
+                                    condition=models.Q(game__isnull=False),
+                                    name='unique_daily_usage_game'),
+            models.UniqueConstraint(fields=['day', 'server'],
+                                    condition=models.Q(game__isnull=True),
+                                    name='unique_daily_usage_no_game'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.server_id} - {self.game_id or '-'}"
+
+    @property
+    def avg_ping_improvement(self):
+        if not self.sessions:
+            return 0
+        return round((self.ping_before_sum - self.ping_after_sum) / self.sessions, 1)
+
+
+class APIToken(models.Model):
+    """Token de acesso à API (clientes desktop/launcher).
+
+    Só o SHA-256 do token é guardado; o valor é mostrado uma única vez, ao
+    ser criado (ver ``core.tokens``).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_tokens',
+                             verbose_name="Usuário")
+    name = models.CharField(max_length=100, blank=True, verbose_name="Nome")
+    prefix = models.CharField(max_length=8, verbose_name="Prefixo")
+    key_hash = models.CharField(max_length=64, unique=True, verbose_name="Hash")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Expira em")
+    last_used_at = models.DateTimeField(null=True, blank=True, verbose_name="Último uso")
+    revoked_at = models.DateTimeField(null=True, blank=True, verbose_name="Revogado em")
+
+    class Meta:
+        verbose_name = "Token da API"
+        verbose_name_plural = "Tokens da API"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.prefix}… ({self.name or 'sem nome'})"
+
+    @property
+    def is_valid(self):
+        if self.revoked_at:
+            return False
+        return self.expires_at is None or self.expires_at > timezone.now()
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from django.utils import timezone
+
+from . import catalog, history
+from .models import VPNServer
+
+
+DEFAULT_PORT = 443
+DEFAULT_TIMEOUT = 2.0
+DEFAULT_CONCURRENCY = 100
+
+
+async def probe_host(host, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT,
+                     open_connection=asyncio.open_connection):
+    """Mede o RTT (ms) de um connect TCP; retorna None se falhar"""
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    rtt = (time.perf_counter() - started) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return rtt
+
+
+async def probe_many(targets, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT,
+                     concurrency=DEFAULT_CONCURRENCY, open_connection=asyncio.open_connection):
+    """Sonda vários hosts em paralelo.
+
+    ``targets`` é um iterável de pares ``(chave, host)`` ou ``(chave, host, porta)``;
+    o resultado é um dict ``chave -> rtt_ms`` (None para falhas).
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(target):
+        key, host = target[0], target[1]
+        target_port = target[2] if len(target) > 2 else port
+        async with semaphore:
+            return key, await probe_host(host, target_port, timeout, open_connection)
+
+    results = await asyncio.gather(*(run(target) for target in targets))
+    return dict(results)
+
+
+def refresh_servers(queryset=None, port=DEFAULT_PORT, timeout=DEFAULT_TIMEOUT,
+                    concurrency=DEFAULT_CONCURRENCY, open_connection=asyncio.open_connection):
+    """Sonda os servidores ativos e grava o ping medido com um único bulk_update.
+
+    Servidores que não responderam mantêm o último ping conhecido. As medições
+    também são gravadas no histórico (``core.history``).
+    Retorna ``(atualizados, falhas)``.
+    """
+    if queryset is None:
+        queryset = VPNServer.objects.filter(is_active=True)
+    servers = list(queryset.only('id', 'ip_address', 'ping', 'load'))
+    if not servers:
+        return [], []
+
+    results = asyncio.run(probe_many(
+        [(server.id, server.ip_address) for server in servers],
+        port=port, timeout=timeout, concurrency=concurrency,
+        open_connection=open_connection,
+    ))
+
+    updated, failed = [], []
+    for server in servers:
+        rtt = results.get(server.id)
+        if rtt is None:
+            failed.append(server)
+            continue
+        server.ping = max(1, round(rtt))
+        updated.append(server)
+
+    if updated:
+        VPNServer.objects.bulk_update(updated, ['ping'])
+        # bulk_update não dispara sinais. Um ping antigo lido de uma réplica
+        # atrasada não faz mal: a sondagem não fixa as leituras no primário
+        catalog.bump_version(pin_reads=False)
+        now = timezone.now()
+        history.record_samples((server.id, now, server.ping, server.load) for server in updated)
+    return updated, failed
@@ -0,0 +1,217 @@
+"""
+Orçamento de consultas SQL por view e detector de N+1.
+
+``QueryRecorder`` registra-se no contexto atual (``contextvars``, que acompanha
+o request em threads, em ASGI e dentro de ``sync_to_async``); um
+``execute_wrapper`` instalado em cada conexão ao ser criada anota cada
+consulta com sua impressão digital (o SQL com os parâmetros fora e listas
+``IN`` colapsadas) e a origem: a linha de código do projeto que fez o acesso
+ao ORM e, se a consulta saiu da renderização de um template, o template e a
+linha. Consultas com a mesma impressão digital repetidas no mesmo request são
+o sintoma típico de N+1.
+
+Views declaram seu orçamento com ``@query_budget(n)`` (funções ou actions de
+viewsets). ``QueryBudgetMiddleware`` mede cada request e, quando o orçamento
+é excedido, registra o relatório no log ou levanta ``QueryBudgetExceeded``
+(``QUERY_BUDGET_RAISE = True``, útil em testes). Em testes também se pode
+usar ``assert_max_queries(n)`` diretamente.
+"""
+import contextvars
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+WHITESPACE = re.compile(r'\s+')
+
+_recorders = contextvars.ContextVar('query_recorders', default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    return WHITESPACE.sub(' ', IN_LIST.sub('IN (...)', sql)).strip()
+
+
+def _project_root():
+    return str(getattr(settings, 'BASE_DIR', os.getcwd()))
+
+
+def find_origin(frame, root):
+    """Linha do projeto (e template, se houver) responsável pela consulta"""
+    code_line = template_line = None
+    this_file = __file__.rstrip('c')
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if code_line is None and filename.startswith(root) and filename != this_file \
+                and 'site-packages' not in filename:
+            code_line = f'{os.path.relpath(filename, root)}:{frame.f_lineno} ({frame.f_code.co_name})'
+        if template_line is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                template_line = f'{origin.template_name}:{token.lineno}'
+        if code_line is not None:
+            break
+        frame = frame.f_back
+    if template_line:
+        return f'{template_line} via {code_line}' if code_line else template_line
+    return code_line or '?'
+
+
+def _record(execute, sql, params, many, context):
+    recorders = _recorders.get()
+    if recorders:
+        frame = sys._getframe(1)
+        for recorder in recorders:
+            recorder.add(sql, frame)
+    return execute(sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    # No início da lista: execute_wrapper() remove sempre o último da lista
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record)
+
+
+connection_created.connect(install)
+
+
+class QueryRecorder:
+    """Registra as consultas executadas dentro do bloco ``with``"""
+
+    def __init__(self):
+        self.queries = []
+        self._root = _project_root()
+        self._token = None
+
+    def __enter__(self):
+        for connection in connections.all():
+            install(connection)
+        self._token = _recorders.set(_recorders.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info):
+        _recorders.reset(self._token)
+
+    def add(self, sql, frame):
+        self.queries.append((fingerprint(sql), find_origin(frame, self._root)))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def duplicates(self):
+        """``[(impressão digital, vezes, Counter(origem))]`` das consultas repetidas"""
+        counts = Counter(fp for fp, _ in self.queries)
+        result = []
+        for fp, times in counts.most_common():
+            if times < 2:
+                break
+            origins = Counter(origin for other, origin in self.queries if other == fp)
+            result.append((fp, times, origins))
+        return result
+
+    def report(self):
+        lines = [f'{self.count} consultas']
+        for fp, times, origins in self.duplicates():
+            lines.append(f'  {times}x {fp[:200]}')
+            for origin, hits in origins.most_common():
+                lines.append(f'      {hits}x em {origin}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def assert_max_queries(limit, label='bloco'):
+    """Falha com ``QueryBudgetExceeded`` se o bloco fizer mais de ``limit`` consultas"""
+    with QueryRecorder() as recorder:
+        yield recorder
+    if recorder.count > limit:
+        raise QueryBudgetExceeded(f'{label}: orçamento de {limit} excedido\n{recorder.report()}')
+
+
+@contextmanager
+def unrecorded():
+    """Consultas de manutenção (reconstrução de índices em memória) fora da contagem do request"""
+    token = _recorders.set(())
+    try:
+        yield
+    finally:
+        _recorders.reset(token)
+
+
+def query_budget(limit):
+    """Declara o máximo de consultas de uma view ou action"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def get_view_budget(callback, method):
+    budget = getattr(callback, 'query_budget', None)
+    if budget is None and hasattr(callback, 'cls'):
+        # Viewsets do DRF: o orçamento fica no método da action
+        action = getattr(callback, 'actions', {}).get(method.lower())
+        handler = getattr(callback.cls, action or method.lower(), None)
+        budget = getattr(handler, 'query_budget', None)
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """Mede as consultas de cada request e aplica o orçamento da view"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG)
+        self.raise_errors = getattr(settings, 'QUERY_BUDGET_RAISE', False)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        return self.check(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = await self.get_response(request)
+        return self.check(request, response, recorder)
+
+    def check(self, request, response, recorder):
+        match = getattr(request, 'resolver_match', None)
+        budget = get_view_budget(match.func, request.method) if match else None
+        response['X-Query-Count'] = str(recorder.count)
+        if budget is not None and recorder.count > budget:
+            message = f'{request.method} {request.path}: orçamento de {budget} consultas excedido\n{recorder.report()}'
+            if self.raise_errors:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        elif recorder.duplicates():
+            logger.info('%s %s: consultas repetidas\n%s', request.method, request.path, recorder.report())
+        return response
@@ -0,0 +1,266 @@
+"""
+Ranking de servidores recomendados.
+
+O score combina ping, carga (a ocupação em %, derivada das conexões ativas
+em ``core.capacity``) e o ``OptimizationProfile`` do jogo (menor é melhor). O
+índice mantém em memória uma lista ordenada de ``(score, id)`` para o ranking
+geral, para cada país e para cada jogo com perfil, então uma recomendação é
+só a leitura dos k primeiros itens.
+
+Com a origem do cliente (``core.geoip``), a distância até cada servidor entra
+no score e o resultado por (ranking, origem) fica guardado até a próxima
+alteração do índice.
+
+Alterações de servidores e perfis chegam pelos sinais em ``core.signals`` e
+atualizam apenas as entradas afetadas. Como cada worker tem sua própria cópia
+e ``bulk_update`` não dispara sinais, o índice também é reconstruído por
+completo a cada ``RANKING_INDEX_TTL`` segundos. Os contadores de conexões
+(``core.capacity``) mudam com ``update()``, também sem sinais: quando o
+carimbo ``catalog.get_counters`` muda, o índice relê só ``active_connections``
+e ``load`` e reposiciona os servidores alterados. As duas leituras ficam fora
+da contagem do request que as disparou (``query_budget.unrecorded``).
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from . import catalog
+from .geoip import distance_km, server_location
+from .query_budget import unrecorded
+from .models import VPNServer, OptimizationProfile
+
+
+DEFAULT_WEIGHTS = {
+    'load': 0.5,               # pontos por % de carga (já inclui as conexões ativas)
+    'recommended_bonus': 20,   # desconto para servidores recomendados pelo perfil
+    'over_threshold': 2.0,     # pontos por ms acima do ping_threshold do perfil
+    'distance': 0.01,          # pontos por km entre o cliente e o servidor (~1 ms a cada 100 km)
+}
+
+DEFAULT_TTL = 60
+
+# Distância assumida para servidores em local desconhecido (km)
+UNKNOWN_DISTANCE = 10000
+NEARBY_CACHE_SIZE = 1024
+
+ALL = ('all',)
+
+
+def get_weights():
+    return {**DEFAULT_WEIGHTS, **getattr(settings, 'SERVER_SCORE_WEIGHTS', {})}
+
+
+def score_server(server, profile=None, weights=None):
+    """Score de um servidor (menor é melhor), opcionalmente para um perfil de jogo.
+
+    ``profile`` é uma tupla ``(ping_threshold, ids_recomendados)``.
+    """
+    weights = weights or get_weights()
+    score = server.ping + weights['load'] * server.load
+    if profile:
+        threshold, recommended = profile
+        if server.id in recommended:
+            score -= weights['recommended_bonus']
+        if server.ping > threshold:
+            score += weights['over_threshold'] * (server.ping - threshold)
+    return round(score, 3)
+
+
+class RankingIndex:
+    """Índice em memória dos servidores ativos ordenados por score"""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'RANKING_INDEX_TTL', DEFAULT_TTL)
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._counters = None
+        self._servers = {}
+        self._profiles = {}
+        self._rankings = {}
+        self._scores = {}
+        self._nearby = {}
+
+    # Leitura
+
+    def recommended(self, game_id=None, country=None, limit=5, origin=None):
+        """Os ``limit`` melhores servidores, por jogo e/ou país.
+
+        ``origin`` é ``(latitude, longitude)`` do cliente; com ela, servidores
+        mais próximos sobem no ranking.
+        """
+        with self._lock:
+            self._ensure_fresh()
+            if game_id is not None and game_id in self._profiles:
+                key = ('game', game_id)
+            elif country:
+                key, country = ('country', country), None
+            else:
+                key = ALL
+
+            if origin is not None:
+                return self._nearest(key, country, limit, origin)
+
+            result = []
+            for _, server_id in self._rankings.get(key, []):
+                server = self._servers[server_id]
+                if country and server.country != country:
+                    continue
+                result.append(server)
+                if limit is not None and len(result) >= limit:
+                    break
+            return result
+
+    def _nearest(self, key, country, limit, origin):
+        cache_key = (key, country, limit, origin)
+        result = self._nearby.get(cache_key)
+        if result is None:
+            weight = get_weights()['distance']
+            candidates = (
+                (score + weight * self._distance(server_id, origin), server_id)
+                for score, server_id in self._rankings.get(key, [])
+                if not country or self._servers[server_id].country == country
+            )
+            ranked = heapq.nsmallest(limit, candidates) if limit is not None else sorted(candidates)
+            result = [self._servers[server_id] for _, server_id in ranked]
+            if len(self._nearby) >= NEARBY_CACHE_SIZE:
+                self._nearby.clear()
+            self._nearby[cache_key] = result
+        return list(result)
+
+    def _distance(self, server_id, origin):
+        location = server_location(self._servers[server_id])
+        return distance_km(origin, location) if location else UNKNOWN_DISTANCE
+
+    def score(self, server_id, game_id=None):
+        with self._lock:
+            self._ensure_fresh()
+            key = ('game', game_id) if game_id in self._profiles else ALL
+            return self._scores.get(key, {}).get(server_id)
+
+    # Manutenção
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def rebuild(self):
+        """Reconstrói o índice inteiro a partir do banco"""
+        # Carimbo lido antes da consulta: uma conexão durante a leitura gera outra atualização
+        counters = catalog.get_counters()[0]
+        servers = {server.id: server for server in VPNServer.objects.filter(is_active=True)}
+        profiles = {}
+        queryset = OptimizationProfile.objects.prefetch_related('recommended_servers') \
+            .order_by('game_id', '-is_default', 'id')
+        for profile in queryset:
+            if profile.game_id not in profiles:
+                profiles[profile.game_id] = self._profile_key(profile)
+
+        with self._lock:
+            self._servers = servers
+            self._profiles = profiles
+            self._rankings = {}
+            self._scores = {}
+            self._nearby = {}
+            for server in servers.values():
+                self._insert(server)
+            self._built_at = time.monotonic()
+            self._counters = counters
+
+    def refresh_counters(self):
+        """Relê conexões ativas e carga e reposiciona os servidores que mudaram"""
+        counters = catalog.get_counters()[0]
+        rows = VPNServer.objects.filter(is_active=True).values_list('id', 'active_connections', 'load')
+        with self._lock:
+            for server_id, active, load in rows:
+                server = self._servers.get(server_id)
+                if server is None or (server.active_connections, server.load) == (active, load):
+                    continue
+                self._remove(server_id)
+                server.active_connections, server.load = active, load
+                self._servers[server_id] = server
+                self._insert(server)
+            self._counters = counters
+
+    def update_server(self, server):
+        """Reposiciona (ou remove, se inativo) um servidor em todos os rankings"""
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove(server.id)
+            if server.is_active:
+                self._servers[server.id] = server
+                self._insert(server)
+
+    def remove_server(self, server_id):
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove(server_id)
+
+    def update_game(self, game_id):
+        """Recalcula o ranking de um jogo depois de mudanças em seus perfis"""
+        profile = OptimizationProfile.objects.prefetch_related('recommended_servers') \
+            .filter(game_id=game_id).order_by('-is_default', 'id').first()
+        with self._lock:
+            if self._built_at is None:
+                return
+            key = ('game', game_id)
+            self._rankings.pop(key, None)
+            self._scores.pop(key, None)
+            self._nearby.clear()
+            self._profiles.pop(game_id, None)
+            if profile is None:
+                return
+            self._profiles[game_id] = self._profile_key(profile)
+            weights = get_weights()
+            for server in self._servers.values():
+                self._add(key, server, self._profiles[game_id], weights)
+
+    # Internos
+
+    def _ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.ttl:
+            with unrecorded():
+                self.rebuild()
+        elif catalog.get_counters()[0] != self._counters:
+            with unrecorded():
+                self.refresh_counters()
+
+    @staticmethod
+    def _profile_key(profile):
+        return profile.ping_threshold, frozenset(server.id for server in profile.recommended_servers.all())
+
+    def _keys(self, server):
+        yield ALL, None
+        yield ('country', server.country), None
+        for game_id, profile in self._profiles.items():
+            yield ('game', game_id), profile
+
+    def _add(self, key, server, profile, weights):
+        self._nearby.clear()
+        score = score_server(server, profile, weights)
+        self._scores.setdefault(key, {})[server.id] = score
+        insort(self._rankings.setdefault(key, []), (score, server.id))
+
+    def _insert(self, server):
+        weights = get_weights()
+        for key, profile in self._keys(server):
+            self._add(key, server, profile, weights)
+
+    def _remove(self, server_id):
+        self._nearby.clear()
+        self._servers.pop(server_id, None)
+        for key, scores in self._scores.items():
+            score = scores.pop(server_id, None)
+            if score is None:
+                continue
+            ranking = self._rankings[key]
+            position = bisect_left(ranking, (score, server_id))
+            if position < len(ranking) and ranking[position] == (score, server_id):
+                del ranking[position]
+
+
+ranking_index = RankingIndex()
@@ -0,0 +1,352 @@
+"""
+Leituras em réplicas: roteador de banco, marcação das views e aderência ao
+primário depois de escritas.
+
+Réplicas são os aliases de ``settings.DATABASES`` com a chave ``REPLICA``
+(``{'WEIGHT': n}``). Só leituras de views marcadas vão para elas: funções com
+``@replica_reads`` e viewsets com ``ReplicaReadsMixin`` (métodos seguros). A
+marcação vale depois da autenticação, então sessão, usuário e token são
+sempre lidos do primário; todo o resto (e qualquer escrita) usa ``default``.
+
+Escolha da réplica (``ReplicaSet.choose``):
+
+- round robin ponderado suave (o do nginx), por request: com pesos 2 e 1 a
+  sequência é ``a, b, a, a, b, a...``, sem rajadas na mesma réplica;
+- o atraso de cada réplica é medido no máximo a cada
+  ``REPLICA_LAG_CHECK_INTERVAL`` segundos, num thread em segundo plano (um
+  por vez): nenhum request espera a medição, nem o timeout de uma réplica
+  fora do ar. Réplicas atrasadas mais que ``REPLICA_MAX_LAG`` segundos,
+  inacessíveis ou ainda não medidas ficam de fora e, sem nenhuma
+  disponível, a leitura vai para o primário.
+
+Ler o que se acabou de escrever: uma escrita no request (``db_for_write``)
+manda as leituras seguintes do mesmo request para o primário, e
+``ReplicaMiddleware`` fixa o cliente no primário por
+``REPLICA_STICKY_SECONDS`` (cookie e, para clientes da API sem cookies, uma
+chave por usuário no cache ``default``). Esse tempo deve ser maior que
+``REPLICA_MAX_LAG``. Também vão para o primário as leituras feitas até
+``REPLICA_MAX_LAG`` segundos depois de uma nova versão do catálogo
+(``core.catalog``): os caches chaveados pela versão nova não podem ser
+preenchidos com dados de uma réplica que ainda não recebeu a alteração. As
+versões geradas pelas sondagens de ping (a cada ciclo do ``probe_servers``)
+não contam: com elas as réplicas ficariam quase sempre sem uso, e um ping de
+alguns segundos atrás é aceitável.
+
+O atraso vem de ``pg_last_xact_replay_timestamp()`` no PostgreSQL. Réplicas
+SQLite (para testes locais) são cópias do primário feitas com
+``manage.py replicas --sync``, que registra o momento da cópia.
+"""
+import contextvars
+import functools
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import empty
+from rest_framework.permissions import SAFE_METHODS
+
+from . import catalog
+
+
+DEFAULT_MAX_LAG = 5.0
+DEFAULT_LAG_CHECK_INTERVAL = 5.0
+DEFAULT_STICKY_SECONDS = 15
+STICKY_COOKIE = 'primary_until'
+STICKY_CACHE_KEY = 'replicas:pin:{}'
+SQLITE_STATUS_TABLE = 'replica_status'
+
+POSTGRESQL_LAG = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class ReadState:
+    """Estado do request atual: leituras em réplica liberadas, réplica escolhida e se houve escrita"""
+    __slots__ = ('replica', 'pinned', 'wrote', 'alias')
+
+    def __init__(self, pinned=False):
+        self.replica = False
+        self.pinned = pinned
+        self.wrote = False
+        self.alias = None
+
+
+_state = contextvars.ContextVar('replica_reads', default=None)
+
+
+def replication_lag(alias):
+    """Atraso da réplica em segundos, ou None se ela não responder"""
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        # Cursor do driver: a medição não entra nas métricas nem no orçamento de consultas da view
+        cursor = connection.connection.cursor()
+        try:
+            if connection.vendor == 'postgresql':
+                cursor.execute(POSTGRESQL_LAG)
+                return float(cursor.fetchone()[0] or 0)
+            if connection.vendor == 'sqlite':
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                               (SQLITE_STATUS_TABLE,))
+                if cursor.fetchone() is None:
+                    # O mesmo arquivo do primário, não uma cópia
+                    return 0.0
+                cursor.execute(f'SELECT synced_at FROM {SQLITE_STATUS_TABLE}')
+                row = cursor.fetchone()
+                return max(0.0, time.time() - row[0]) if row else None
+            return 0.0
+        finally:
+            cursor.close()
+    except Exception:
+        return None
+
+
+def sync_sqlite_replica(alias, source=DEFAULT_DB_ALIAS):
+    """Copia o banco SQLite do primário para a réplica (simula a replicação)"""
+    import sqlite3
+
+    names = [connections[name].settings_dict['NAME'] for name in (source, alias)]
+    for name in (source, alias):
+        if connections[name].vendor != 'sqlite':
+            raise ValueError(f'{name} não é SQLite: a replicação é do próprio banco')
+    if str(names[0]) == str(names[1]):
+        raise ValueError(f'{alias} usa o mesmo arquivo do primário')
+    connections[alias].close()
+    primary, replica = sqlite3.connect(names[0]), sqlite3.connect(names[1])
+    try:
+        primary.backup(replica)
+        replica.execute(f'CREATE TABLE IF NOT EXISTS {SQLITE_STATUS_TABLE} (synced_at REAL NOT NULL)')
+        replica.execute(f'DELETE FROM {SQLITE_STATUS_TABLE}')
+        replica.execute(f'INSERT INTO {SQLITE_STATUS_TABLE} VALUES (?)', (time.time(),))
+        replica.commit()
+    finally:
+        primary.close()
+        replica.close()
+
+
+class Replica:
+    __slots__ = ('alias', 'weight', 'current', 'lag', 'checked_at')
+
+    def __init__(self, alias, weight):
+        self.alias = alias
+        self.weight = weight
+        self.current = 0
+        self.lag = None
+        self.checked_at = None
+
+
+class ReplicaSet:
+    """Réplicas configuradas, com o round robin ponderado e o atraso medido"""
+
+    def __init__(self, databases=None):
+        self._databases = databases
+        self._replicas = None
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    @property
+    def replicas(self):
+        if self._replicas is None:
+            databases = self._databases if self._databases is not None else settings.DATABASES
+            self._replicas = [
+                Replica(alias, max(1, int(options['REPLICA'].get('WEIGHT', 1))))
+                for alias, options in databases.items() if options.get('REPLICA') is not None
+            ]
+        return self._replicas
+
+    @property
+    def max_lag(self):
+        return getattr(settings, 'REPLICA_MAX_LAG', DEFAULT_MAX_LAG)
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', DEFAULT_LAG_CHECK_INTERVAL)
+
+    def _refresh(self, replica, now):
+        # Fora do lock: a consulta pode demorar (réplica fora do ar)
+        lag = replication_lag(replica.alias)
+        with self._lock:
+            replica.lag, replica.checked_at = lag, now
+
+    def _refresh_all(self, replicas):
+        try:
+            for replica in replicas:
+                self._refresh(replica, time.monotonic())
+        finally:
+            # Conexões deste thread, que termina aqui
+            for replica in replicas:
+                connections[replica.alias].close()
+
+    def available(self):
+        """Réplicas que responderam com atraso dentro do limite na última medição"""
+        now = time.monotonic()
+        stale = [replica for replica in self.replicas
+                 if replica.checked_at is None or now - replica.checked_at >= self.check_interval]
+        if stale:
+            with self._lock:
+                # Um thread por vez; depois de um fork o do processo pai não está vivo aqui
+                if self._refresher is None or not self._refresher.is_alive():
+                    self._refresher = threading.Thread(target=self._refresh_all, args=(stale,),
+                                                       name='replica-lag', daemon=True)
+                    self._refresher.start()
+        return [replica for replica in self.replicas if replica.lag is not None and replica.lag <= self.max_lag]
+
+    def choose(self):
+        """Alias da próxima réplica (round robin ponderado suave) ou None"""
+        candidates = self.available()
+        if not candidates:
+            return None
+        with self._lock:
+            total = 0
+            best = None
+            for replica in candidates:
+                replica.current += replica.weight
+                total += replica.weight
+                if best is None or replica.current > best.current:
+                    best = replica
+            best.current -= total
+            return best.alias
+
+    def status(self):
+        """Mede todas as réplicas agora (comando ``replicas``) e devolve o estado"""
+        self._refresh_all(self.replicas)
+        return [
+            {'alias': replica.alias, 'weight': replica.weight, 'lag': replica.lag,
+             'available': replica.lag is not None and replica.lag <= self.max_lag}
+            for replica in self.replicas
+        ]
+
+
+replica_set = ReplicaSet()
+
+
+class ReplicaRouter:
+    """Leituras marcadas em réplicas; escritas, migrações e o resto no primário"""
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica or state.pinned or state.wrote:
+            return None
+        if state.alias is None:
+            # Uma réplica por request: consultas relacionadas (prefetch) leem o mesmo estado
+            state.alias = replica_set.choose() or DEFAULT_DB_ALIAS
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas são cópias do primário: os objetos são os mesmos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in {replica.alias for replica in replica_set.replicas}:
+            return False
+        return None
+
+
+def _pinned_user(user):
+    return user is not None and user.is_authenticated and cache.get(STICKY_CACHE_KEY.format(user.pk)) is not None
+
+
+def _enable(request):
+    state = _state.get()
+    if state is None:
+        return
+    if not state.pinned:
+        state.pinned = _pinned_user(getattr(request, 'user', None)) or \
+            time.time() - catalog.pinned_change_at() < replica_set.max_lag
+    state.replica = True
+
+
+def replica_reads(view):
+    """Leituras da view (depois da autenticação) podem ir para uma réplica"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            _enable(request)
+            return await view(request, *args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            _enable(request)
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadsMixin:
+    """Viewsets: requests GET/HEAD/OPTIONS leem de réplica depois da autenticação"""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            _enable(request)
+
+
+class ReplicaMiddleware:
+    """Estado de leitura por request e aderência ao primário depois de escritas"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not replica_set.replicas:
+            return self.get_response(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        if not replica_set.replicas:
+            return await self.get_response(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(request, response, state)
+
+    @staticmethod
+    def start(request):
+        try:
+            until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            until = 0
+        return ReadState(pinned=until > time.time())
+
+    @staticmethod
+    def finish(request, response, state):
+        if state.wrote:
+            seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+            response.set_cookie(STICKY_COOKIE, f'{time.time() + seconds:.0f}', max_age=seconds,
+                                httponly=True, samesite='Lax')
+            # Só se o usuário já foi carregado pela view; não consulta o banco aqui
+            user = getattr(request, 'user', None)
+            if _user_loaded(user) and user.is_authenticated:
+                cache.set(STICKY_CACHE_KEY.format(user.pk), 1, seconds)
+        return response
+
+
+def _user_loaded(user):
+    return user is not None and getattr(user, '_wrapped', None) is not empty
@@ -0,0 +1,160 @@
+"""
+Busca de servidores e jogos por prefixo, sem diferenciar acentos e caixa.
+
+O índice guarda em memória, para cada palavra normalizada (nome, cidade e país
+dos servidores ativos; nome e categoria dos jogos otimizados), quais itens a
+contêm, em uma lista ordenada de termos. Uma busca é um ``bisect`` por termo
+da consulta ("sao pa" encontra "São Paulo") e a interseção dos resultados,
+sem tocar no banco.
+
+Cada worker tem sua cópia, reconstruída quando a versão do catálogo
+(``core.catalog``) muda. A reconstrução acontece na primeira busca depois da
+mudança, mas suas consultas ficam fora da contagem do request
+(``query_budget.unrecorded``): o orçamento da view mede só o que é dela. No
+PostgreSQL, os filtros ``icontains`` que ainda vão ao banco (admin) usam
+índices trigram criados por ``ensure_trigram_indexes``.
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from django.db import connections
+
+from . import catalog
+from .query_budget import unrecorded
+from .models import VPNServer, Game
+
+
+MAX_RESULTS = 50
+NON_WORD = re.compile(r'[^0-9a-z]+')
+
+# (tabela, coluna) com índice trigram no PostgreSQL
+TRIGRAM_COLUMNS = [
+    (VPNServer._meta.db_table, 'name'),
+    (VPNServer._meta.db_table, 'city'),
+    (VPNServer._meta.db_table, 'country'),
+    (Game._meta.db_table, 'name'),
+    (Game._meta.db_table, 'category'),
+]
+
+
+def normalize(text):
+    """Minúsculas, sem acentos e com pontuação virando espaço"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return NON_WORD.sub(' ', stripped.casefold()).strip()
+
+
+def tokenize(text):
+    return normalize(text).split()
+
+
+class SearchIndex:
+    """Índice de prefixos dos servidores ativos e jogos otimizados"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._terms = []
+        self._postings = []
+        self._items = {}
+
+    def search(self, query, kinds=('server', 'game'), limit=10):
+        """Itens cujo texto tem palavras começando com cada termo da consulta"""
+        keys, items = self._match(query)
+        results = [items[key] for key in keys if key[0] in kinds]
+        prefix = normalize(query)
+        # Primeiro quem tem o nome começando pela consulta, depois servidores por ping
+        results.sort(key=lambda item: (not item['_name'].startswith(prefix), item['_order']))
+        return [
+            {field: value for field, value in item.items() if not field.startswith('_')}
+            for item in results[:limit]
+        ]
+
+    def ids(self, kind, query):
+        """Ids de ``kind`` ('server' ou 'game') que casam com a consulta"""
+        keys, _ = self._match(query)
+        return [item_id for item_kind, item_id in keys if item_kind == kind]
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def rebuild(self, version=None):
+        items = {}
+        words = {}
+
+        def add(key, item, *texts):
+            items[key] = item
+            for text in texts:
+                for token in tokenize(text):
+                    words.setdefault(token, set()).add(key)
+
+        servers = VPNServer.objects.filter(is_active=True).values(
+            'id', 'name', 'city', 'country', 'flag_icon', 'ping', 'load')
+        for server in servers:
+            item = {'type': 'server', **server, '_name': normalize(server['name']),
+                    '_order': (0, server['ping'], server['load'])}
+            add(('server', server['id']), item, server['name'], server['city'], server['country'])
+
+        for game in Game.objects.filter(is_optimized=True).values('id', 'name', 'slug', 'category'):
+            item = {'type': 'game', **game, '_name': normalize(game['name']),
+                    '_order': (1, game['name'].casefold(), 0)}
+            add(('game', game['id']), item, game['name'], game['category'])
+
+        terms = sorted(words)
+        with self._lock:
+            self._items = items
+            self._terms = terms
+            self._postings = [frozenset(words[term]) for term in terms]
+            self._version = version
+
+    def _ensure_fresh(self):
+        version = catalog.get_version()[0]
+        if version != self._version:
+            with unrecorded():
+                self.rebuild(version)
+
+    def _prefix(self, prefix):
+        start = bisect_left(self._terms, prefix)
+        end = bisect_left(self._terms, prefix + '\uffff', start)
+        if end - start == 1:
+            return self._postings[start]
+        return set().union(*self._postings[start:end])
+
+    def _match(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return set(), {}
+        self._ensure_fresh()
+        with self._lock:
+            # Termos mais longos são mais seletivos: começa por eles
+            tokens.sort(key=len, reverse=True)
+            keys = set(self._prefix(tokens[0]))
+            for token in tokens[1:]:
+                if not keys:
+                    break
+                keys &= self._prefix(token)
+            return keys, self._items
+
+
+def ensure_trigram_indexes(using=None, **kwargs):
+    """Cria a extensão pg_trgm e os índices trigram (só no PostgreSQL).
+
+    Os índices são sobre ``UPPER(coluna)``, a expressão que o Django gera
+    para ``icontains``, então as buscas do admin deixam de varrer a tabela.
+    """
+    db = connections[using or 'default']
+    if db.vendor != 'postgresql':
+        return
+    with db.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, column in TRIGRAM_COLUMNS:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm '
+                f'ON {db.ops.quote_name(table)} USING gin (UPPER({db.ops.quote_name(column)}::text) gin_trgm_ops)'
+            )
+
+
+search_index = SearchIndex()
@@ -0,0 +1,195 @@
+"""
+Serviço de sessões VPN.
+
+Centraliza as transições de ``Connection.status``::
+
+    connecting -> connected -> disconnecting -> disconnected
+         \\____________\\______________\\______-> error
+
+Cada transição é um único ``UPDATE`` condicionado ao estado atual, e a regra
+"uma sessão ativa por usuário" é garantida pela constraint
+``unique_active_connection_per_user`` (índice único parcial), que também
+atende a busca da sessão ativa. Abrir e encerrar sessões também ocupa e
+libera a vaga do servidor (``core.capacity``) na mesma transação.
+
+As variantes ``a*`` servem as views async: leituras usam o ORM async e as
+operações com transação (que o ORM async ainda não tem) rodam numa thread
+com ``sync_to_async``.
+
+``connect`` e ``close_all`` são escritas em rajada (vários workers abrindo e
+encerrando sessões) e passam pela fila de escrita de ``core.writes``: no
+SQLite com ``SQLITE_WRITE_QUEUE`` ligado, as de um mesmo processo são
+serializadas num thread escritor e gravadas em lote, uma transação por lote.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from . import capacity, usage
+from .writes import aqueued, queued
+from .broker import status_broker
+from .models import Connection
+
+
+ACTIVE_STATUSES = ('connecting', 'connected', 'disconnecting')
+CLOSED_STATUSES = ('disconnected', 'error')
+
+TRANSITIONS = {
+    'connecting': {'connected', 'disconnecting', 'error'},
+    'connected': {'disconnecting', 'disconnected', 'error'},
+    'disconnecting': {'disconnected', 'error'},
+}
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def active_sessions(user):
+    return Connection.objects.filter(user=user, status__in=ACTIVE_STATUSES)
+
+
+def get_active(user):
+    """Sessão ativa do usuário (ou None), já com servidor e jogo carregados"""
+    return active_sessions(user).select_related('server', 'game').first()
+
+
+async def aget_active(user):
+    return await active_sessions(user).select_related('server', 'game').afirst()
+
+
+def status_payload(connection):
+    """Status da sessão no formato de ``/api/status/``"""
+    if connection is None:
+        return {'connected': False}
+    return {
+        'connected': True,
+        'status': connection.status,
+        'server_name': connection.server.name,
+        'server_country': connection.server.country,
+        'server_city': connection.server.city,
+        'ping': connection.ping_after,
+        'connected_since': connection.connected_at.isoformat() if connection.connected_at else None,
+    }
+
+
+def current_status(user):
+    return status_payload(get_active(user))
+
+
+async def acurrent_status(user):
+    return status_payload(await aget_active(user))
+
+
+def notify(user_id, connection=None):
+    """Envia o status aos assinantes do usuário depois do commit"""
+    if status_broker.has_subscribers(user_id):
+        payload = status_payload(connection)
+        transaction.on_commit(lambda: status_broker.publish(user_id, payload))
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+@queued
+def connect(user, server, game=None, ping_before=0):
+    """Abre uma sessão, encerrando a anterior do usuário se houver.
+
+    A conexão é simulada, então a sessão já nasce ``connected``: o
+    encerramento da anterior (``close_all``), a vaga no servidor e o
+    ``INSERT`` da nova, na mesma transação. Levanta ``capacity.ServerFull``
+    se o servidor estiver lotado (a sessão anterior continua aberta).
+    """
+    now = timezone.now()
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                close_all(user, now=now, notify_user=False)
+                if not capacity.acquire(server.id):
+                    raise capacity.ServerFull(server)
+                connection = Connection.objects.create(
+                    user=user,
+                    server=server,
+                    game=game,
+                    status='connected',
+                    connected_at=now,
+                    ping_before=_to_int(ping_before),
+                    ping_after=max(10, server.ping - 20),  # Simular melhoria no ping
+                )
+                notify(user.id, connection)
+                return connection
+        except IntegrityError:
+            # Outra requisição do mesmo usuário abriu uma sessão em paralelo
+            if attempt:
+                raise
+
+
+def transition(connection_id, status, user=None):
+    """Move uma sessão para ``status`` se a transição for permitida.
+
+    Executa um único ``UPDATE ... WHERE status IN (<origens válidas>)`` e
+    retorna se alguma linha foi alterada. Encerramentos também leem a sessão
+    para somá-la nos agregados de uso.
+    """
+    sources = [source for source, targets in TRANSITIONS.items() if status in targets]
+    if not sources:
+        raise InvalidTransition(status)
+
+    fields = {'status': status}
+    if status == 'connected':
+        fields['connected_at'] = Now()
+
+    queryset = Connection.objects.filter(id=connection_id, status__in=sources)
+    if user is not None:
+        queryset = queryset.filter(user=user)
+
+    if status in CLOSED_STATUSES:
+        # A sessão encerrada entra nos agregados de uso (core.usage)
+        now = timezone.now()
+        fields['disconnected_at'] = now
+        with transaction.atomic(savepoint=False):
+            session = queryset.values(*usage.SESSION_FIELDS).first()
+            changed = session is not None and queryset.update(**fields) == 1
+            if changed:
+                usage.record_closed([session], now)
+                capacity.release([session['server_id']])
+    else:
+        changed = queryset.update(**fields) == 1
+
+    if changed and status_broker.has_subscribers():
+        connection = Connection.objects.select_related('server').get(id=connection_id)
+        notify(connection.user_id, connection if status in ACTIVE_STATUSES else None)
+    return changed
+
+
+@queued
+def close_all(user, status='disconnected', now=None, notify_user=True):
+    """Encerra as sessões ativas do usuário e soma-as nos agregados de uso.
+
+    Pela constraint de sessão ativa única há no máximo uma linha: um
+    ``SELECT`` pelo índice parcial, o ``UPDATE`` condicionado ao estado e o
+    incremento do agregado do dia.
+    """
+    if status not in CLOSED_STATUSES:
+        raise InvalidTransition(status)
+    now = now or timezone.now()
+    with transaction.atomic(savepoint=False):
+        closing = list(active_sessions(user).values(*usage.SESSION_FIELDS))
+        closed = [
+            session for session in closing
+            if Connection.objects.filter(id=session['id'], status__in=ACTIVE_STATUSES)
+            .update(status=status, disconnected_at=now)
+        ]
+        usage.record_closed(closed, now)
+        capacity.release(session['server_id'] for session in closed)
+    if closed and notify_user:
+        notify(user.id)
+    return len(closed)
+
+
+aconnect = aqueued(connect)
+aclose_all = aqueued(close_all)
@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import catalog
+from . import tokens
+from .models import VPNServer, Game, OptimizationProfile, APIToken
+from .ranking import ranking_index
+
+
+@receiver(post_save, sender=VPNServer)
+@receiver(post_delete, sender=VPNServer)
+@receiver(post_save, sender=Game)
+@receiver(post_delete, sender=Game)
+@receiver(post_save, sender=OptimizationProfile)
+@receiver(post_delete, sender=OptimizationProfile)
+@receiver(m2m_changed, sender=OptimizationProfile.recommended_servers.through)
+def catalog_changed(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        catalog.bump_version()
+
+
+@receiver(post_save, sender=VPNServer)
+def server_saved(sender, instance, **kwargs):
+    ranking_index.update_server(instance)
+
+
+@receiver(post_delete, sender=VPNServer)
+def server_deleted(sender, instance, **kwargs):
+    ranking_index.remove_server(instance.id)
+
+
+@receiver(post_save, sender=OptimizationProfile)
+@receiver(post_delete, sender=OptimizationProfile)
+def profile_changed(sender, instance, **kwargs):
+    ranking_index.update_game(instance.game_id)
+
+
+@receiver(m2m_changed, sender=OptimizationProfile.recommended_servers.through)
+def recommended_servers_changed(sender, instance, action, reverse, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # Alterado pelo lado do servidor: vários jogos podem ser afetados
+        ranking_index.invalidate()
+    else:
+        ranking_index.update_game(instance.game_id)
+
+
+@receiver(post_save, sender=APIToken)
+@receiver(post_delete, sender=APIToken)
+@receiver(post_delete, sender=User)
+def api_token_changed(sender, created=False, **kwargs):
+    # Um token novo ainda não está em cache em lugar nenhum
+    if not created:
+        tokens.bump_version()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, update_fields=None, **kwargs):
+    # O login só atualiza last_login; não precisa invalidar os tokens
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        tokens.bump_version()
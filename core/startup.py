@@ -0,0 +1,191 @@
+"""
+Partida a frio: medição (comando ``startup_report``), carregamento adiado e
+aquecimento.
+
+``profile`` roda num processo novo e mede cada fase até a primeira resposta:
+settings, ``django.setup()`` (com o tempo do ``ready()`` de cada app),
+criação do handler com os middlewares e o primeiro request. O comando roda
+``profile`` uma segunda vez com ``python -X importtime``; ``parse_importtime``
+transforma essa saída em tempo por módulo.
+
+O admin fica fora da partida: ``SimpleAdminConfig`` (sem autodiscover) e
+``lazy_include``, que só importa ``exitlag_free/admin_urls.py`` no primeiro
+acesso a ``/admin/``.
+
+``warm`` carrega tudo o que não depende do banco (URLconf, views, templates
+compilados) e é chamado pelo gunicorn no processo mestre com
+``preload_app`` (``gunicorn.conf.py``): os workers nascem por fork já
+aquecidos, compartilhando essa memória.
+"""
+import io
+import json
+import re
+import sys
+import time
+
+from django.urls import URLResolver
+from django.urls.resolvers import RoutePattern
+
+
+# Módulos pesados que não devem ser carregados para atender o primeiro request
+DEFERRED_MODULES = [
+    'exitlag_free.admin_urls',
+    'django.contrib.auth.admin',
+    'core.admin',
+    'PIL',
+]
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_importtime(text):
+    """``[(módulo, próprio_us, acumulado_us, profundidade)]`` da saída do ``-X importtime``"""
+    rows = []
+    for line in text.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            rows.append((module, int(own), int(cumulative), len(indent) // 2))
+    return rows
+
+
+def by_package(rows):
+    """Tempo próprio de importação somado por pacote de primeiro nível (µs)"""
+    totals = {}
+    for module, own, _, _ in rows:
+        package = module.split('.')[0]
+        totals[package] = totals.get(package, 0) + own
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def _time_app_ready(timings):
+    """Envolve o ``ready()`` de cada app criado pelo ``django.setup()``"""
+    from django.apps.config import AppConfig
+
+    create = AppConfig.create.__func__
+
+    def timed_create(cls, entry):
+        config = create(cls, entry)
+        ready = config.ready
+
+        def timed_ready():
+            started = time.perf_counter()
+            ready()
+            timings[config.label] = time.perf_counter() - started
+
+        config.ready = timed_ready
+        return config
+
+    AppConfig.create = classmethod(timed_create)
+
+
+def local_host():
+    """Um host aceito por ``ALLOWED_HOSTS`` para requests feitos no processo"""
+    from django.conf import settings
+
+    return next((host for host in settings.ALLOWED_HOSTS if host and '*' not in host), 'localhost').lstrip('.')
+
+
+def local_request(application, path):
+    """``GET path`` direto no handler WSGI; retorna ``(status, bytes)``"""
+    host = local_host()
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SERVER_NAME': host, 'SERVER_PORT': '80', 'HTTP_HOST': host,
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': False, 'wsgi.multiprocess': True,
+        'wsgi.run_once': False, 'wsgi.version': (1, 0),
+    }
+    status = []
+    body = b''.join(application(environ, lambda line, headers, exc_info=None: status.append(line)))
+    return int(status[0].split()[0]), len(body)
+
+
+class LazyURLResolver(URLResolver):
+    """``URLResolver`` que só importa o URLconf quando é realmente usado.
+
+    O ``_populate`` do resolver raiz (no primeiro ``reverse``/``{% url %}``)
+    percorre todos os sub-resolvers e importaria o módulo. Com namespace, o
+    raiz só precisa do prefixo; os nomes internos são lidos ao reverter
+    ``namespace:nome``, e aí o módulo é carregado.
+    """
+
+    def _populate(self):
+        if 'url_patterns' in self.__dict__:
+            super()._populate()
+
+    def _reverse_with_prefix(self, lookup_view, _prefix, *args, **kwargs):
+        self.url_patterns
+        return super()._reverse_with_prefix(lookup_view, _prefix, *args, **kwargs)
+
+
+def lazy_include(route, urlconf_name, namespace):
+    """``path(route, include(...))`` adiado para o primeiro uso (ver ``LazyURLResolver``)"""
+    return LazyURLResolver(RoutePattern(route), urlconf_name, app_name=namespace, namespace=namespace)
+
+
+def warm():
+    """Carrega URLconf, views e templates sem abrir conexão com o banco"""
+    from django.conf import settings
+    from django.template import TemplateDoesNotExist
+    from django.template.loader import get_template
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.url_patterns
+    # Preenche os dicionários de reverse() (o admin continua adiado)
+    resolver.reverse_dict
+    for name in getattr(settings, 'STARTUP_WARM_TEMPLATES', []):
+        try:
+            get_template(name)
+        except TemplateDoesNotExist:
+            pass
+
+
+def profile(path='/', preload=False):
+    """Mede as fases da partida e imprime o resultado em JSON (processo novo)"""
+    phases = []
+    started = time.perf_counter()
+
+    def mark(name):
+        nonlocal started
+        now = time.perf_counter()
+        phases.append((name, now - started))
+        started = now
+
+    from django.conf import settings
+    settings.INSTALLED_APPS
+    mark('settings')
+
+    import django
+    ready = {}
+    _time_app_ready(ready)
+    django.setup(set_prefix=False)
+    mark('django.setup')
+
+    from django.core.handlers.wsgi import WSGIHandler
+    application = WSGIHandler()
+    mark('middlewares')
+
+    if preload:
+        warm()
+        mark('warm')
+
+    status, size = local_request(application, path)
+    mark('primeiro request')
+    first_response_at = time.time()
+
+    status_again, _ = local_request(application, path)
+    mark('segundo request')
+
+    print(json.dumps({
+        'phases': phases,
+        'ready': ready,
+        'status': status,
+        'bytes': size,
+        'second_status': status_again,
+        'first_response_at': first_response_at,
+        'loaded': {module: module in sys.modules for module in DEFERRED_MODULES},
+    }))
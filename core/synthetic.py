@@ -0,0 +1,202 @@
+"""
+Gerador de dados sintéticos em escala (``populate_db --users/--connections/--servers``).
+
+Tudo é derivado da semente: usuário ``i`` usa ``Random(semente, i)`` e sempre
+recebe o mesmo nome, perfil e jogos favoritos, então rodar de novo com a mesma
+semente só completa o que falta. Servidores seguem a mesma regra; conexões são
+sempre acrescentadas, com datas relativas ao início do dia atual.
+
+As linhas são geradas em lotes e gravadas com ``bulk_create`` ou, no
+PostgreSQL, com ``COPY ... FROM STDIN``, sem passar por ``save()`` nem
+signals.
+"""
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .loadtest import PASSWORD
+from .models import VPNServer, UserProfile, Connection
+
+
+BATCH_SIZE = 5000
+
+LOCATIONS = [
+    ('Brasil', 'São Paulo', '🇧🇷'), ('Brasil', 'Rio de Janeiro', '🇧🇷'),
+    ('Brasil', 'Brasília', '🇧🇷'), ('Brasil', 'Fortaleza', '🇧🇷'),
+    ('Brasil', 'Porto Alegre', '🇧🇷'), ('Argentina', 'Buenos Aires', '🇦🇷'),
+    ('Chile', 'Santiago', '🇨🇱'), ('Colômbia', 'Bogotá', '🇨🇴'),
+    ('Peru', 'Lima', '🇵🇪'), ('México', 'Cidade do México', '🇲🇽'),
+    ('Estados Unidos', 'Miami', '🇺🇸'), ('Estados Unidos', 'Dallas', '🇺🇸'),
+    ('Estados Unidos', 'Nova York', '🇺🇸'), ('Portugal', 'Lisboa', '🇵🇹'),
+    ('Alemanha', 'Frankfurt', '🇩🇪'), ('Japão', 'Tóquio', '🇯🇵'),
+]
+SUFFIXES = ['Premium', 'Fast', 'Gaming', 'Speed', 'Connect', 'Pro', 'Edge', 'Ultra']
+
+
+def _rng(seed, index):
+    return random.Random(seed * 1_000_003 + index)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    text = str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_available():
+    return connection.vendor == 'postgresql'
+
+
+def copy_objects(model, objects):
+    """Grava instâncias não salvas com ``COPY`` (PostgreSQL)"""
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    buffer = io.StringIO()
+    for obj in objects:
+        buffer.write('\t'.join(
+            _copy_value(field.get_db_prep_save(field.pre_save(obj, True), connection))
+            for field in fields
+        ))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    sql = f'COPY {table} ({columns}) FROM STDIN'
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+class Inserter:
+    """Grava lotes de instâncias e contabiliza linhas e tempo por tabela"""
+
+    def __init__(self, batch_size=BATCH_SIZE, use_copy=None):
+        self.batch_size = batch_size
+        self.use_copy = copy_available() if use_copy is None else use_copy
+        self.stats = {}
+
+    def insert(self, label, model, objects):
+        total = 0
+        started = time.perf_counter()
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                if self.use_copy:
+                    copy_objects(model, batch)
+                else:
+                    model.objects.bulk_create(batch, batch_size=self.batch_size)
+            total += len(batch)
+        rows, elapsed = self.stats.get(label, (0, 0.0))
+        self.stats[label] = (rows + total, elapsed + time.perf_counter() - started)
+        return total
+
+
+def generate_servers(inserter, count, seed):
+    existing = set(VPNServer.objects.filter(name__startswith='Synthetic ').values_list('name', flat=True))
+
+    def servers():
+        for index in range(count):
+            rng = _rng(seed, index)
+            country, city, flag = rng.choice(LOCATIONS)
+            name = f'Synthetic {city} {rng.choice(SUFFIXES)} {seed}-{index}'
+            if name in existing:
+                continue
+            base = 15 if country == 'Brasil' else 40 if country != 'Estados Unidos' else 110
+            yield VPNServer(
+                name=name, country=country, city=city, flag_icon=flag,
+                ip_address=f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}',
+                ping=base + rng.randrange(60), load=rng.randrange(5, 95),
+                is_active=rng.random() > 0.05,
+            )
+    return inserter.insert('servidores', VPNServer, servers())
+
+
+def generate_users(inserter, count, seed, server_ids, game_ids):
+    """Usuários ``synth<semente>-<i>`` com perfil, servidor preferido e favoritos"""
+    prefix = f'synth{seed}-'
+    existing = set(User.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+    password = make_password(PASSWORD)
+    joined = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def users():
+        for index in range(count):
+            username = f'{prefix}{index:07d}'
+            if username in existing:
+                continue
+            rng = _rng(seed, index)
+            yield User(
+                username=username, password=password, email=f'{username}@example.com',
+                date_joined=joined - timedelta(seconds=rng.randrange(365 * 86400)),
+            )
+    created = inserter.insert('usuários', User, users())
+
+    # Perfis e favoritos de quem ainda não tem perfil
+    missing = list(
+        User.objects.filter(username__startswith=prefix, userprofile__isnull=True)
+        .values_list('id', 'username').order_by('id')
+    )
+    profiles = []
+    for user_id, username in missing:
+        rng = _rng(seed, int(username[len(prefix):]))
+        profiles.append(UserProfile(
+            user_id=user_id,
+            preferred_server_id=rng.choice(server_ids) if server_ids and rng.random() < 0.6 else None,
+        ))
+    inserter.insert('perfis', UserProfile, profiles)
+
+    Favorite = UserProfile.favorite_games.through
+    profile_ids = dict(UserProfile.objects.filter(user__username__startswith=prefix)
+                       .values_list('user_id', 'id'))
+
+    def favorites():
+        for user_id, username in missing:
+            rng = _rng(seed, int(username[len(prefix):]))
+            for game_id in rng.sample(game_ids, min(len(game_ids), rng.randrange(4))):
+                yield Favorite(userprofile_id=profile_ids[user_id], game_id=game_id)
+    inserter.insert('jogos favoritos', Favorite, favorites() if game_ids else [])
+    return created
+
+
+def generate_connections(inserter, count, seed, user_ids, server_ids, game_ids, days=90):
+    """Histórico de sessões encerradas espalhado pelos últimos ``days`` dias"""
+    rng = random.Random(seed)
+    anchor = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    span = days * 86400
+
+    def connections():
+        for _ in range(count):
+            connected_at = anchor - timedelta(seconds=rng.randrange(span))
+            ping_before = rng.randint(30, 220)
+            yield Connection(
+                user_id=rng.choice(user_ids),
+                server_id=rng.choice(server_ids),
+                game_id=rng.choice(game_ids) if game_ids and rng.random() < 0.8 else None,
+                status='error' if rng.random() < 0.03 else 'disconnected',
+                connected_at=connected_at,
+                disconnected_at=connected_at + timedelta(seconds=int(rng.expovariate(1 / 2700)) + 30),
+                ping_before=ping_before,
+                ping_after=max(10, ping_before - rng.randint(5, 80)),
+            )
+    return inserter.insert('conexões', Connection, connections())
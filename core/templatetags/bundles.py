@@ -0,0 +1,56 @@
+"""
+Tags dos bundles gerados por ``build_assets`` (``core.assets``).
+
+Sem build, ``{% bundle %}`` inclui os arquivos-fonte do bundle um a um e
+``{% critical_css %}`` não gera nada, então o projeto funciona igual sem o
+passo de build.
+"""
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from core import assets
+
+
+register = template.Library()
+
+
+def _urls(name):
+    if assets.built_path(name):
+        return [static(f'{assets.BUNDLE_DIR}/{name}')]
+    return [static(source) for source in assets.get_bundles()[name]]
+
+
+@register.simple_tag
+def bundle(name):
+    """``<link>`` ou ``<script>`` do bundle.
+
+    Com CSS crítico embutido, a folha completa é carregada sem bloquear a
+    renderização (``preload`` + ``onload``, com ``<noscript>`` de reserva).
+    """
+    urls = _urls(name)
+    if name.endswith('.js'):
+        return format_html_join('', '<script src="{}"></script>', ((url,) for url in urls))
+    if not assets.read_critical_css():
+        return format_html_join('', '<link href="{}" rel="stylesheet">', ((url,) for url in urls))
+    return format_html_join('', (
+        '<link rel="preload" href="{0}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+        '<noscript><link href="{0}" rel="stylesheet"></noscript>'
+    ), ((url,) for url in urls))
+
+
+@register.simple_tag
+def preload(name):
+    """``<link rel="preload">`` para o bundle começar a baixar já no ``<head>``"""
+    kind = 'script' if name.endswith('.js') else 'style'
+    return format_html_join('', '<link rel="preload" href="{}" as="{}">', ((url, kind) for url in _urls(name)))
+
+
+@register.simple_tag
+def critical_css():
+    css = assets.read_critical_css()
+    if not css:
+        return ''
+    # Gerado pelo build a partir dos nossos próprios arquivos
+    return format_html('<style>{}</style>', mark_safe(css.replace('</', '<\\/')))
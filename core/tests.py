@@ -0,0 +1,286 @@
+"""
+Testes do ``core``.
+
+Orçamentos de consultas das views (``core.query_budget``): com ``QUERY_BUDGET_RAISE`` o middleware levanta ``QueryBudgetExceeded`` e o
+teste falha com o relatório das consultas repetidas. Cada view é medida com
+poucas e com muitas linhas (o número de consultas não pode crescer com elas)
+e logo depois de uma nova versão do catálogo, quando os índices em memória
+(``core.ranking``, ``core.search``) são reconstruídos.
+
+Cursores do histórico (``core.keyset``): um cursor adulterado é sempre
+``InvalidCursor``, nunca um erro 500.
+
+Carga dos servidores (``core.capacity``): abrir uma sessão muda a carga
+mostrada em ``/servers/``, mesmo com o fragmento e o ranking em cache.
+
+Métricas (``core.metrics``): arquivos de workers que já terminaram somam nos
+contadores, não nos números do pool.
+
+Pool de conexões (``core.dbpool``) com conexões falsas: retirada, devolução,
+espera, ``pre_ping``, ``max_lifetime`` e pools herdados por fork.
+"""
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import catalog, dbpool, sessions
+from .dbpool import ConnectionPool, PoolTimeout
+from .keyset import InvalidCursor, decode_cursor
+from .metrics import MetricsStore
+from .models import Connection, Game, UserProfile, VPNServer
+from .ranking import ranking_index
+
+
+@override_settings(
+    QUERY_BUDGET_ENABLED=True,
+    QUERY_BUDGET_RAISE=True,
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', password='budget-pass')
+        cls.game = Game.objects.create(name='Valorant', slug='valorant', category='FPS')
+        UserProfile.objects.create(user=cls.user).favorite_games.add(cls.game)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_rows(self, count):
+        now = timezone.now()
+        servers = VPNServer.objects.bulk_create([
+            VPNServer(name=f'Servidor {index}', country=f'País {index % 5}', city=f'Cidade {index}',
+                      ip_address=f'10.0.{index // 250}.{index % 250 + 1}', ping=10 + index, flag_icon='br')
+            for index in range(count)
+        ])
+        Connection.objects.bulk_create([
+            Connection(user=self.user, server=server, game=self.game, status='disconnected',
+                       connected_at=now - timedelta(minutes=index + 1), disconnected_at=now)
+            for index, server in enumerate(servers)
+        ])
+        catalog.bump_version()
+
+    def query_counts(self, path):
+        """Consultas de ``path`` com 2 e com 40 linhas.
+
+        Com poucas linhas pode haver uma consulta a mais (a página do keyset
+        incompleta busca também as conexões sem data), nunca com muitas.
+        """
+        counts = []
+        for rows in (2, 40):
+            self.add_rows(rows)
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+            counts.append(int(response['X-Query-Count']))
+        return counts
+
+    def test_connections_api(self):
+        few, many = self.query_counts('/api/connections/')
+        self.assertLessEqual(many, few)
+
+    def test_dashboard(self):
+        few, many = self.query_counts('/dashboard/')
+        self.assertLessEqual(many, few)
+
+    def test_servers(self):
+        few, many = self.query_counts('/servers/')
+        self.assertLessEqual(many, few)
+
+    def test_servers_search(self):
+        few, many = self.query_counts('/servers/?search=cidade')
+        self.assertLessEqual(many, few)
+
+
+def make_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class KeysetCursorTests(TestCase):
+    # Data impossível (ValueError em parse_datetime) e data que não é texto (TypeError)
+    BAD_CURSORS = [make_cursor(['2024-13-01T00:00:00', 5]), make_cursor([5, 5])]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cursor', password='cursor-pass')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_decode(self):
+        for cursor in self.BAD_CURSORS:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+        self.assertEqual(decode_cursor(make_cursor([None, 7])), (None, 7))
+
+    def test_connections_api(self):
+        for cursor in self.BAD_CURSORS:
+            response = self.client.get('/api/connections/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+    def test_dashboard(self):
+        for cursor in self.BAD_CURSORS:
+            response = self.client.get('/dashboard/', {'history': cursor})
+            self.assertRedirects(response, '/dashboard/', fetch_redirect_response=False)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ServerLoadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('load', password='load-pass')
+        cls.server = VPNServer.objects.create(name='Servidor Carga', country='Brasil', city='São Paulo',
+                                              ip_address='10.1.0.1', ping=20, capacity=4, flag_icon='br')
+
+    def setUp(self):
+        catalog.bump_version()
+        ranking_index.invalidate()
+        self.client.force_login(self.user)
+
+    def test_connect_updates_servers_page(self):
+        self.assertContains(self.client.get('/servers/'), 'fw-bold">0%')
+        with self.captureOnCommitCallbacks(execute=True):
+            sessions.connect(self.user, self.server)
+        self.assertContains(self.client.get('/servers/'), 'fw-bold">25%')
+        self.assertEqual(ranking_index.recommended(limit=1)[0].active_connections, 1)
+
+
+class MetricsStoreTests(SimpleTestCase):
+    def write(self, directory, pid, pools):
+        route = {'route': 'servers', 'method': 'GET', 'buckets': [1] + [0] * 10, 'count': 1, 'sum': 0.01,
+                 'db': 0.0, 'queries': 2, 'template': 0.0, 'status': {'2xx': 1}}
+        with open(os.path.join(directory, f'worker-{pid}-test.json'), 'w') as handle:
+            json.dump({'routes': [route], 'pools': pools}, handle)
+
+    def test_dead_workers_count_only_in_counters(self):
+        finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                                  capture_output=True, text=True, check=True)
+        stats = {'size': 4, 'idle': 3, 'in_use': 1, 'waiting': 0, 'wait_max': 0.1}
+        with tempfile.TemporaryDirectory() as directory:
+            self.write(directory, int(finished.stdout), {'default': stats})
+            self.write(directory, os.getppid(), {'default': stats})
+            totals, pools = MetricsStore(directory=directory, flush_interval=60).collect()
+        self.assertEqual(totals[('servers', 'GET')]['count'], 2)
+        self.assertEqual(pools['default']['size'], 4)
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql):
+        if not self.connection.alive:
+            raise RuntimeError('conexão perdida')
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        self.opened.append(FakeConnection())
+        return self.opened[-1]
+
+    def test_checkin_reuses_connection(self):
+        pool = ConnectionPool('test', min_size=1, max_size=2)
+        raw = pool.checkout(self.connect)
+        pool.checkin(raw)
+        self.assertIs(pool.checkout(self.connect), raw)
+        self.assertEqual(raw.rollbacks, 1)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_timeout_when_full(self):
+        pool = ConnectionPool('test', min_size=0, max_size=1, timeout=0.05)
+        pool.checkout(self.connect)
+        with self.assertRaises(PoolTimeout):
+            pool.checkout(self.connect)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiter_gets_returned_connection(self):
+        pool = ConnectionPool('test', min_size=0, max_size=1, timeout=2)
+        raw = pool.checkout(self.connect)
+        timer = threading.Timer(0.05, pool.checkin, args=(raw,))
+        timer.start()
+        self.assertIs(pool.checkout(self.connect), raw)
+        timer.join()
+        self.assertGreater(pool.stats()['wait_max'], 0)
+
+    def test_pre_ping_discards_dead_connection(self):
+        pool = ConnectionPool('test', min_size=0, max_size=2)
+        raw = pool.checkout(self.connect)
+        pool.checkin(raw)
+        raw.alive = False
+        fresh = pool.checkout(self.connect)
+        self.assertIsNot(fresh, raw)
+        self.assertTrue(raw.closed)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_discard_old_or_broken(self):
+        pool = ConnectionPool('test', min_size=0, max_size=2, max_lifetime=0)
+        raw = pool.checkout(self.connect)
+        pool.checkin(raw)
+        self.assertTrue(raw.closed)
+        pool = ConnectionPool('test', min_size=0, max_size=2)
+        raw = pool.checkout(self.connect)
+        pool.checkin(raw, discard=True)
+        self.assertTrue(raw.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_idle_above_min_size_are_closed(self):
+        pool = ConnectionPool('test', min_size=1, max_size=3, max_idle=0)
+        first, second = pool.checkout(self.connect), pool.checkout(self.connect)
+        pool.checkin(first)
+        pool.checkin(second)
+        time.sleep(0.01)
+        pool.checkout(self.connect)
+        self.assertEqual(pool.stats()['size'], 1)
+        self.assertTrue(first.closed)
+
+    def test_inherited_pool_is_kept_open(self):
+        options = {**dbpool.DEFAULTS}
+        pool = dbpool.get_pool('fork-test', options)
+        raw = pool.checkout(self.connect)
+        # Como se o pool tivesse sido criado no processo pai
+        pool.pid = -1
+        pool.checkin(raw)
+        self.assertFalse(raw.closed)
+        try:
+            child_pool = dbpool.get_pool('fork-test', options)
+            self.assertIsNot(child_pool, pool)
+            self.assertIn(pool, dbpool._inherited)
+        finally:
+            dbpool._pools.pop('fork-test', None)
+            dbpool._inherited.remove(pool)
@@ -0,0 +1,160 @@
+"""
+Tokens da API: emissão, verificação e cache dos tokens verificados.
+
+O token é aleatório (``secrets``) e só o SHA-256 fica no banco, então um
+vazamento da tabela não expõe tokens válidos; o prefixo (8 caracteres) serve
+para o usuário reconhecer o token na listagem.
+
+Cada worker guarda os tokens verificados há pouco num LRU limitado
+(``API_TOKEN_CACHE_SIZE`` entradas), com o snapshot dos campos do usuário.
+Uma entrada vale por ``API_TOKEN_CACHE_TTL`` segundos (ou até o token
+expirar, o que vier antes) e, enquanto vale, o request autentica sem
+consultar o banco. Revogar um token ou alterar um usuário gera uma nova
+versão no cache ``default`` (como ``core.catalog``); entradas verificadas
+numa versão anterior são descartadas, inclusive nos outros workers quando o
+backend de cache é compartilhado.
+"""
+import hashlib
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import APIToken
+
+
+VERSION_KEY = 'api-tokens:version'
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 60
+DEFAULT_LIFETIME_DAYS = 90
+
+# Campos do usuário no snapshot (a senha nunca entra no cache)
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+
+def hash_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex[:12], None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Invalida os tokens verificados em cache (todos os workers)"""
+    cache.set(VERSION_KEY, uuid.uuid4().hex[:12], None)
+
+
+class TokenCache:
+    """LRU de ``hash -> (versão, validade, id do token, snapshot do usuário)``"""
+
+    def __init__(self, size=None, ttl=None):
+        self._size = size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self):
+        return self._size or getattr(settings, 'API_TOKEN_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else \
+            getattr(settings, 'API_TOKEN_CACHE_TTL', DEFAULT_CACHE_TTL)
+
+    def get(self, digest, version):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[0] != version or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[2], entry[3]
+
+    def put(self, digest, version, token_id, snapshot, expires_at=None):
+        deadline = time.time() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at.timestamp())
+        with self._lock:
+            self._entries[digest] = (version, deadline, token_id, snapshot)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _user_from_snapshot(snapshot):
+    # Instância nova a cada request: nada do que a view cachear nela vaza
+    # para outros requests. A senha fica adiada (carregada só se lida).
+    return User.from_db('default', USER_FIELDS, [snapshot[name] for name in USER_FIELDS])
+
+
+def issue(user, name='', days=None):
+    """Cria um token para ``user``; retorna ``(APIToken, chave)``.
+
+    A chave só existe neste retorno. ``days=0`` cria um token sem expiração.
+    """
+    if days is None:
+        days = getattr(settings, 'API_TOKEN_LIFETIME_DAYS', DEFAULT_LIFETIME_DAYS)
+    key = secrets.token_urlsafe(32)
+    token = APIToken.objects.create(
+        user=user,
+        name=name,
+        prefix=key[:8],
+        key_hash=hash_key(key),
+        expires_at=timezone.now() + timedelta(days=days) if days else None,
+    )
+    return token, key
+
+
+def verify(key):
+    """Usuário e id do token para ``key``, ou None se inválido, expirado ou revogado"""
+    if not key:
+        return None
+    digest = hash_key(key)
+    version = get_version()
+    cached = token_cache.get(digest, version)
+    if cached is not None:
+        token_id, snapshot = cached
+        return _user_from_snapshot(snapshot), token_id
+
+    token = APIToken.objects.select_related('user').filter(key_hash=digest).first()
+    if token is None or not token.is_valid or not token.user.is_active:
+        return None
+
+    now = timezone.now()
+    # Só nas verificações que vão ao banco: no máximo uma escrita por TTL
+    APIToken.objects.filter(pk=token.pk).update(last_used_at=now)
+    snapshot = {name: getattr(token.user, name) for name in USER_FIELDS}
+    token_cache.put(digest, version, token.pk, snapshot, token.expires_at)
+    return _user_from_snapshot(snapshot), token.pk
+
+
+def revoke(tokens):
+    """Revoga os tokens do queryset; retorna quantos foram revogados"""
+    count = tokens.filter(revoked_at__isnull=True).update(revoked_at=timezone.now())
+    if count:
+        bump_version()
+    return count
+
+
+token_cache = TokenCache()
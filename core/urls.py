@@ -27,4 +27,8 @@ urlpatterns = [
     
     # API
     path('api/status/', views.connection_status, name='connection_status'),
+    path('api/status/stream/', views.connection_status_stream, name='connection_status_stream'),
+    
+    # Observabilidade
+    path('metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
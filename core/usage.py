@@ -0,0 +1,94 @@
+"""
+Agregados de uso por dia, servidor e jogo (``DailyUsage``).
+
+Cada sessão encerrada soma seus números na linha do dia de encerramento com
+um ``UPDATE ... SET campo = campo + x`` (ou um ``INSERT`` na primeira sessão
+do dia), então relatórios leem poucas linhas já agregadas em vez de varrer
+``Connection``. ``rebuild`` recalcula um período inteiro a partir do
+histórico (comando ``rebuild_usage``).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Connection, DailyUsage
+
+
+SESSION_FIELDS = ('id', 'server_id', 'game_id', 'connected_at', 'ping_before', 'ping_after')
+
+
+def _add(day, server_id, game_id, sessions, seconds, ping_before, ping_after):
+    rollup = DailyUsage.objects.filter(day=day, server_id=server_id, game_id=game_id)
+    changes = {
+        'sessions': F('sessions') + sessions,
+        'total_seconds': F('total_seconds') + seconds,
+        'ping_before_sum': F('ping_before_sum') + ping_before,
+        'ping_after_sum': F('ping_after_sum') + ping_after,
+    }
+    if rollup.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailyUsage.objects.create(
+                day=day, server_id=server_id, game_id=game_id, sessions=sessions,
+                total_seconds=seconds, ping_before_sum=ping_before, ping_after_sum=ping_after,
+            )
+    except IntegrityError:
+        # Outra sessão criou a linha do dia ao mesmo tempo
+        rollup.update(**changes)
+
+
+def record_closed(sessions, closed_at):
+    """Soma sessões encerradas (dicts com ``SESSION_FIELDS``) nos agregados"""
+    day = timezone.localdate(closed_at)
+    for session in sessions:
+        started = session['connected_at']
+        seconds = max(0, int((closed_at - started).total_seconds())) if started else 0
+        _add(day, session['server_id'], session['game_id'], 1, seconds,
+             session['ping_before'], session['ping_after'])
+
+
+def rebuild(since=None):
+    """Recalcula os agregados a partir de ``since`` (data) ou de todo o histórico.
+
+    Sessões sem ``disconnected_at`` (abertas ou antigas) não entram.
+    Retorna o número de linhas gravadas.
+    """
+    closed = Connection.objects.filter(
+        status__in=['disconnected', 'error'],
+        disconnected_at__isnull=False,
+    )
+    if since is not None:
+        closed = closed.filter(disconnected_at__date__gte=since)
+
+    rows = (
+        closed
+        .annotate(day=TruncDate('disconnected_at'))
+        .values('day', 'server_id', 'game_id')
+        .annotate(
+            sessions=Count('id'),
+            total=Sum(ExpressionWrapper(F('disconnected_at') - F('connected_at'),
+                                        output_field=DurationField())),
+            ping_before=Sum('ping_before'),
+            ping_after=Sum('ping_after'),
+        )
+        .order_by()
+    )
+
+    with transaction.atomic():
+        stale = DailyUsage.objects.all()
+        if since is not None:
+            stale = stale.filter(day__gte=since)
+        stale.delete()
+        created = DailyUsage.objects.bulk_create([
+            DailyUsage(
+                day=row['day'], server_id=row['server_id'], game_id=row['game_id'],
+                sessions=row['sessions'],
+                total_seconds=int(row['total'].total_seconds()) if row['total'] else 0,
+                ping_before_sum=row['ping_before'] or 0,
+                ping_after_sum=row['ping_after'] or 0,
+            )
+            for row in rows
+        ], batch_size=1000)
+    return len(created)
@@ -1,23 +1,44 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Q
+from django.conf import settings
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from .models import VPNServer, Game, Connection, OptimizationProfile, UserProfile
 from .forms import CustomUserCreationForm, ProfileForm
+from .ranking import ranking_index
+from .search import search_index
+from . import geoip
+from . import capacity
+from . import sessions
+from .broker import status_broker
+from .query_budget import query_budget
+from .routers import replica_reads
+from .metrics import metrics_store, render_prometheus
+from .keyset import keyset_page, InvalidCursor
+from asgiref.sync import sync_to_async
+import asyncio
 import json
 
 
+# Stream de status: intervalo do keepalive (s) e espera antes de reconectar (ms)
+STREAM_HEARTBEAT = 15
+STREAM_RETRY_MS = 3000
+
+
+@query_budget(3)
 def home(request):
     """Página inicial"""
     if request.user.is_authenticated:
         return redirect('dashboard')
     
+    # Tudo preguiçoso: só vai ao banco se o fragmento não estiver no cache
     context = {
-        'total_servers': VPNServer.objects.filter(is_active=True).count(),
-        'total_games': Game.objects.filter(is_optimized=True).count(),
+        'total_servers': VPNServer.objects.filter(is_active=True).count,
+        'total_games': Game.objects.filter(is_optimized=True).count,
         'featured_games': Game.objects.filter(is_optimized=True)[:6],
     }
     return render(request, 'core/home.html', context)
@@ -38,55 +59,65 @@ def register(request):
     return render(request, 'registration/register.html', {'form': form})
 
 
+@query_budget(12)
 @login_required
 def dashboard(request):
     """Dashboard principal"""
     profile, created = UserProfile.objects.get_or_create(user=request.user)
     
     # Buscar conexão ativa
-    active_connection = Connection.objects.filter(
-        user=request.user, 
-        status='connected'
-    ).first()
+    active_connection = sessions.get_active(request.user)
     
-    # Servidores recomendados
-    recommended_servers = VPNServer.objects.filter(is_active=True).order_by('ping')[:5]
+    # Servidores recomendados, os mais próximos do cliente primeiro
+    client_origin = geoip.origin(request)
+    recommended_servers = ranking_index.recommended(limit=5, origin=client_origin)
     
     # Jogos favoritos
     favorite_games = profile.favorite_games.all()[:6]
     
-    # Últimas conexões
-    recent_connections = Connection.objects.filter(user=request.user)[:5]
+    # Últimas conexões, paginadas por cursor (?history=)
+    try:
+        recent_connections, history_cursor = keyset_page(
+            Connection.objects.filter(user=request.user).select_related('server', 'game'),
+            request.GET.get('history'),
+            page_size=5,
+        )
+    except InvalidCursor:
+        return redirect('dashboard')
     
     context = {
         'profile': profile,
         'active_connection': active_connection,
         'recommended_servers': recommended_servers,
+        'client_origin': client_origin,
         'favorite_games': favorite_games,
         'recent_connections': recent_connections,
+        'history_cursor': history_cursor,
     }
     return render(request, 'core/dashboard.html', context)
 
 
+@query_budget(4)
 @login_required
+@replica_reads
 def servers(request):
     """Lista de servidores VPN"""
     country = request.GET.get('country')
     search = request.GET.get('search')
     
-    servers = VPNServer.objects.filter(is_active=True)
-    
-    if country:
-        servers = servers.filter(country=country)
-    
     if search:
-        servers = servers.filter(
-            Q(name__icontains=search) | 
-            Q(city__icontains=search) | 
-            Q(country__icontains=search)
-        )
-    
-    servers = servers.order_by('ping', 'load')
+        servers = VPNServer.objects.filter(is_active=True)
+        
+        if country:
+            servers = servers.filter(country=country)
+        
+        # Busca por prefixo, sem acentos, no índice em memória (core.search)
+        servers = servers.filter(id__in=search_index.ids('server', search))
+        
+        servers = servers.order_by('ping', 'load')
+    else:
+        # Sem busca, a lista já está ordenada no índice de ranking
+        servers = ranking_index.recommended(country=country, limit=None)
     
     # Países disponíveis
     countries = VPNServer.objects.filter(is_active=True).values_list('country', flat=True).distinct()
@@ -100,7 +131,9 @@ def servers(request):
     return render(request, 'core/servers.html', context)
 
 
+@query_budget(4)
 @login_required
+@replica_reads
 def games(request):
     """Lista de jogos suportados"""
     category = request.GET.get('category')
@@ -112,7 +145,7 @@ def games(request):
         games = games.filter(category=category)
     
     if search:
-        games = games.filter(Q(name__icontains=search))
+        games = games.filter(id__in=search_index.ids('game', search))
     
     games = games.order_by('name')
     
@@ -128,27 +161,41 @@ def games(request):
     return render(request, 'core/games.html', context)
 
 
-@login_required
-def connect_server(request, server_id):
+async def _authenticated_user(request):
+    """Usuário autenticado do request, ou None (``request.user`` consulta a sessão no banco)"""
+    return await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+
+
+@query_budget(12)
+async def connect_server(request, server_id):
     """Conectar a um servidor VPN"""
+    user = await _authenticated_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    
     if request.method == 'POST':
-        server = get_object_or_404(VPNServer, id=server_id, is_active=True)
+        try:
+            server = await VPNServer.objects.aget(id=server_id, is_active=True)
+        except VPNServer.DoesNotExist:
+            raise Http404('Servidor não encontrado')
         
-        # Desconectar conexões ativas
-        Connection.objects.filter(user=request.user, status='connected').update(status='disconnected')
-        
-        # Criar nova conexão
-        connection = Connection.objects.create(
-            user=request.user,
-            server=server,
-            status='connecting',
-            ping_before=request.POST.get('ping_before', 0)
-        )
-        
-        # Simular conexão (em produção, aqui seria a lógica real de VPN)
-        connection.status = 'connected'
-        connection.ping_after = max(10, server.ping - 20)  # Simular melhoria no ping
-        connection.save()
+        try:
+            connection = await sessions.aconnect(
+                user,
+                server,
+                ping_before=request.POST.get('ping_before', 0)
+            )
+        except capacity.ServerFull:
+            alternatives = await capacity.aalternatives(server)
+            message = f'O servidor {server.name} está lotado'
+            if alternatives:
+                message += '. Tente: ' + ', '.join(alternative.name for alternative in alternatives)
+            return JsonResponse({
+                'success': False,
+                'message': message,
+                'alternatives': [{'id': alternative.id, 'name': alternative.name, 'ping': alternative.ping,
+                                  'load': alternative.load} for alternative in alternatives],
+            }, status=409)
         
         return JsonResponse({
             'success': True,
@@ -160,15 +207,15 @@ def connect_server(request, server_id):
     return JsonResponse({'success': False, 'message': 'Método não permitido'})
 
 
-@login_required
-def disconnect(request):
+@query_budget(10)
+async def disconnect(request):
     """Desconectar do servidor VPN"""
+    user = await _authenticated_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    
     if request.method == 'POST':
-        active_connections = Connection.objects.filter(user=request.user, status='connected')
-        
-        for connection in active_connections:
-            connection.status = 'disconnected'
-            connection.save()
+        await sessions.aclose_all(user)
         
         return JsonResponse({
             'success': True,
@@ -178,6 +225,7 @@ def disconnect(request):
     return JsonResponse({'success': False, 'message': 'Método não permitido'})
 
 
+@query_budget(8)
 @login_required
 def profile(request):
     """Perfil do usuário"""
@@ -199,22 +247,50 @@ def profile(request):
     return render(request, 'core/profile.html', context)
 
 
-@login_required
-def connection_status(request):
+@query_budget(3)
+async def connection_status(request):
     """API para status da conexão"""
-    active_connection = Connection.objects.filter(
-        user=request.user, 
-        status='connected'
-    ).first()
+    user = await _authenticated_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    return JsonResponse(await sessions.acurrent_status(user))
+
+
+async def connection_status_stream(request):
+    """Stream SSE do status da conexão (requer ASGI)"""
+    if not isinstance(request, ASGIRequest):
+        # Sob WSGI o stream prenderia um worker; o cliente volta ao polling
+        return HttpResponse(status=204)
     
-    if active_connection:
-        return JsonResponse({
-            'connected': True,
-            'server_name': active_connection.server.name,
-            'server_country': active_connection.server.country,
-            'server_city': active_connection.server.city,
-            'ping': active_connection.ping_after,
-            'connected_since': active_connection.connected_at.isoformat() if active_connection.connected_at else None,
-        })
-    else:
-        return JsonResponse({'connected': False})
\ No newline at end of file
+    user = await _authenticated_user(request)
+    if user is None:
+        return JsonResponse({'error': 'Autenticação necessária'}, status=401)
+    
+    async def events():
+        subscription = status_broker.subscribe(user.id)
+        try:
+            payload = await sessions.acurrent_status(user)
+            yield f'retry: {STREAM_RETRY_MS}\ndata: {json.dumps(payload)}\n\n'
+            while True:
+                try:
+                    payload = await subscription.get(timeout=STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'data: {json.dumps(payload)}\n\n'
+        finally:
+            status_broker.unsubscribe(subscription)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def metrics(request):
+    """Métricas de latência por rota no formato do Prometheus"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.META.get('HTTP_AUTHORIZATION') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    return HttpResponse(render_prometheus(*metrics_store.collect()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
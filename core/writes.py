@@ -0,0 +1,183 @@
+"""
+Fila de escrita única com lotes, para o SQLite.
+
+O SQLite aceita um escritor por vez. Com vários threads (e workers) abrindo e
+encerrando sessões ao mesmo tempo, cada ``connect`` é uma transação própria
+disputando o lock do arquivo. Com ``SQLITE_WRITE_QUEUE`` ligado (e o banco
+``default`` em SQLite), as operações marcadas com ``@queued`` não rodam no
+thread de quem chama: vão para uma fila atendida por um único thread escritor
+do processo. Ele junta o que chegar em até ``SQLITE_WRITE_BATCH_WINDOW_MS``
+(no máximo ``SQLITE_WRITE_BATCH_SIZE`` operações) e executa tudo numa só
+transação, cada operação no seu savepoint: a falha de uma (servidor lotado,
+``IntegrityError``) desfaz só a parte dela. Quem chamou espera o commit do
+lote e recebe o próprio resultado ou exceção; ``transaction.on_commit``
+continua valendo (roda depois do commit do lote).
+
+Cada operação roda no thread escritor dentro de uma cópia do contexto
+(``contextvars``) de quem a enfileirou: as consultas continuam contando no
+request que as fez (``core.query_budget``, ``Server-Timing`` e ``/metrics``)
+e o roteador de réplicas vê a escrita (``core.routers``).
+
+Em outros bancos, ou dentro de um ``atomic()`` de quem chama (a operação
+precisa enxergar e participar da transação aberta), a função roda direto.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_BATCH_WINDOW_MS = 2.0
+
+
+class Job:
+    __slots__ = ('function', 'args', 'kwargs', 'context', 'result', 'error', 'done', 'future', 'loop')
+
+    def __init__(self, function, args, kwargs, loop=None):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.context = contextvars.copy_context()
+        self.result = None
+        self.error = None
+        self.loop = loop
+        self.done = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def finish(self):
+        if self.loop is None:
+            self.done.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if self.future.done():
+            return
+        if self.error is not None:
+            self.future.set_exception(self.error)
+        else:
+            self.future.set_result(self.result)
+
+
+class WriteQueue:
+    """Thread escritor do processo e a fila de operações"""
+
+    def __init__(self, alias=DEFAULT_DB_ALIAS):
+        self.alias = alias
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.jobs = 0
+        self.largest_batch = 0
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'SQLITE_WRITE_QUEUE', False) and connections[self.alias].vendor == 'sqlite'
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'SQLITE_WRITE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+    @property
+    def window(self):
+        return getattr(settings, 'SQLITE_WRITE_BATCH_WINDOW_MS', DEFAULT_BATCH_WINDOW_MS) / 1000
+
+    def _direct(self):
+        return not self.enabled or threading.current_thread() is self._thread or \
+            connections[self.alias].in_atomic_block
+
+    def run(self, function, *args, **kwargs):
+        """Executa ``function`` no thread escritor e devolve o resultado"""
+        if self._direct():
+            return function(*args, **kwargs)
+        job = Job(function, args, kwargs)
+        self._submit(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    async def arun(self, function, *args, **kwargs):
+        """``run`` para views async: espera o lote sem ocupar um thread"""
+        if not self.enabled:
+            return await sync_to_async(function)(*args, **kwargs)
+        job = Job(function, args, kwargs, loop=asyncio.get_running_loop())
+        self._submit(job)
+        return await job.future
+
+    def _submit(self, job):
+        with self._lock:
+            # Depois de um fork (gunicorn com preload) o thread ficou no pai
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name='sqlite-writer', daemon=True)
+                self._thread.start()
+            self._queue.put(job)
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        connection = connections[self.alias]
+        try:
+            with transaction.atomic(using=self.alias):
+                for job in batch:
+                    try:
+                        # Savepoint próprio: a falha de uma operação não desfaz as outras do lote
+                        with transaction.atomic(using=self.alias):
+                            job.result = job.context.run(job.function, *job.args, **job.kwargs)
+                    except Exception as exc:
+                        job.error = exc
+        except Exception as exc:
+            # O commit do lote falhou: nenhuma operação foi gravada
+            for job in batch:
+                if job.error is None:
+                    job.result, job.error = None, exc
+        finally:
+            connection.close_if_unusable_or_obsolete()
+            self.batches += 1
+            self.jobs += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            for job in batch:
+                job.finish()
+
+
+write_queue = WriteQueue()
+
+
+def queued(function):
+    """Operação de escrita que passa pela fila quando ela está ligada"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return write_queue.run(function, *args, **kwargs)
+    return wrapper
+
+
+def aqueued(function):
+    """Variante async de uma função ``@queued`` (ou de qualquer função de escrita)"""
+    function = getattr(function, '__wrapped__', function)
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        return await write_queue.arun(function, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,11 @@
+"""
+URLs do admin, importadas só no primeiro acesso a ``/admin/`` (ver ``urls.py``).
+
+O app do admin usa ``SimpleAdminConfig``, então os ``admin.py`` dos apps não
+são importados na partida; o ``autodiscover`` acontece aqui.
+"""
+from django.contrib import admin
+
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
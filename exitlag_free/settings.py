@@ -46,7 +46,9 @@ ALLOWED_HOSTS = [
 
 # Application definition
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # Sem autodiscover na partida: os admin.py são importados no primeiro
+    # acesso a /admin/ (exitlag_free/admin_urls.py)
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -59,9 +61,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.health.HealthMiddleware',  # /healthz e /readyz, antes de todo o resto
+    'core.metrics.TimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.assets.StaticFilesMiddleware',  # WhiteNoise, também em modo async
+    'core.query_budget.QueryBudgetMiddleware',
+    'core.routers.ReplicaMiddleware',  # antes da sessão: a gravação dela conta como escrita
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,7 +80,8 @@ ROOT_URLCONF = 'exitlag_free.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates com medição do tempo de renderização (core.metrics)
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,6 +90,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.catalog_version',
             ],
         },
     },
@@ -106,6 +114,115 @@ if 'DATABASE_URL' in os.environ:
     import dj_database_url
     DATABASES['default'] = dj_database_url.parse(os.environ['DATABASE_URL'])
 
+# Réplicas de leitura (core.routers): URLs separadas por vírgula, com pesos
+# opcionais na mesma ordem (DATABASE_REPLICA_WEIGHTS=2,1)
+replica_urls = [url.strip() for url in config('DATABASE_REPLICA_URLS', default='').split(',') if url.strip()]
+replica_weights = [int(weight) for weight in config('DATABASE_REPLICA_WEIGHTS', default='').split(',') if weight]
+if replica_urls:
+    import dj_database_url
+    for index, url in enumerate(replica_urls):
+        DATABASES[f'replica{index + 1}'] = {
+            **dj_database_url.parse(url),
+            'REPLICA': {'WEIGHT': replica_weights[index] if index < len(replica_weights) else 1},
+            # Nos testes a réplica é o próprio banco de teste do primário
+            'TEST': {'MIRROR': 'default'},
+        }
+
+# Pool de conexões por processo (core.dbpool): os backends de core/backends
+# reaproveitam as conexões entre requests em vez de abrir uma por request.
+# Ligado por padrão só com DEBUG desligado (produção), como o perfil do SQLite
+DB_POOL = config('DB_POOL', default=not DEBUG, cast=bool)
+POOLED_ENGINES = {
+    'django.db.backends.sqlite3': 'core.backends.sqlite3',
+    'django.db.backends.postgresql': 'core.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2': 'core.backends.postgresql',
+}
+DB_POOL_OPTIONS = {
+    'MIN_SIZE': config('DB_POOL_MIN_SIZE', default=1, cast=int),
+    'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+    'TIMEOUT': config('DB_POOL_TIMEOUT', default=5.0, cast=float),
+    'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=1800.0, cast=float),
+    'MAX_IDLE': config('DB_POOL_MAX_IDLE', default=600.0, cast=float),
+    'PRE_PING': config('DB_POOL_PRE_PING', default=True, cast=bool),
+}
+
+# Perfil de desempenho do SQLite (core/backends/sqlite3): pragmas em cada
+# conexão nova, BEGIN IMMEDIATE e a fila de escrita em lotes (core.writes).
+# Ligado por padrão só com DEBUG desligado: o pragma journal_mode=WAL grava no
+# arquivo do banco (e cria db.sqlite3-wal/-shm) a cada conexão, inclusive em
+# comandos que só leem, como ``manage.py check`` numa cópia de desenvolvimento
+SQLITE_PERFORMANCE = config('SQLITE_PERFORMANCE', default=not DEBUG, cast=bool)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    # Negativo: em KiB (64 MiB por conexão)
+    'cache_size': -config('SQLITE_CACHE_KB', default=64 * 1024, cast=int),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int),
+}
+SQLITE_WRITE_QUEUE = config('SQLITE_WRITE_QUEUE', default=SQLITE_PERFORMANCE, cast=bool)
+SQLITE_WRITE_BATCH_SIZE = config('SQLITE_WRITE_BATCH_SIZE', default=64, cast=int)
+SQLITE_WRITE_BATCH_WINDOW_MS = config('SQLITE_WRITE_BATCH_WINDOW_MS', default=2.0, cast=float)
+
+for database in DATABASES.values():
+    engine = POOLED_ENGINES.get(database['ENGINE'], database['ENGINE'])
+    if DB_POOL and database['ENGINE'] in POOLED_ENGINES:
+        database['ENGINE'] = engine
+        database['POOL'] = DB_POOL_OPTIONS
+    if SQLITE_PERFORMANCE and engine == 'core.backends.sqlite3':
+        database['ENGINE'] = engine
+        database['PRAGMAS'] = SQLITE_PRAGMAS
+        database['TRANSACTION_MODE'] = 'IMMEDIATE'
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Atraso máximo (s) para uma réplica receber leituras, intervalo entre as
+# medições do atraso e por quanto tempo um cliente lê do primário depois de
+# escrever (maior que o atraso máximo)
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=5.0, cast=float)
+REPLICA_LAG_CHECK_INTERVAL = config('REPLICA_LAG_CHECK_INTERVAL', default=5.0, cast=float)
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=15, cast=int)
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Em memória por padrão; defina CACHE_DIR para um cache em arquivo
+# compartilhado entre os workers do gunicorn (versão do catálogo, respostas).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exitlag-free',
+    }
+}
+
+if config('CACHE_DIR', default=''):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_DIR'),
+    }
+
+# Respostas do catálogo na API (segundos)
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+# Fragmentos de template do catálogo ({% cache %}), chaveados pela versão do
+# catálogo; curto porque a ordem dos servidores também depende das conexões
+FRAGMENT_CACHE_TIMEOUT = config('FRAGMENT_CACHE_TIMEOUT', default=60, cast=int)
+
+# Orçamento de consultas por view (core.query_budget); ativo com DEBUG
+QUERY_BUDGET_ENABLED = config('QUERY_BUDGET_ENABLED', default=DEBUG, cast=bool)
+QUERY_BUDGET_RAISE = config('QUERY_BUDGET_RAISE', default=False, cast=bool)
+
+# Métricas de latência por rota (core.metrics): diretório compartilhado pelos
+# workers e token opcional exigido em /metrics (Authorization: Bearer)
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Localização do cliente pelo IP (core.geoip): CSV de faixas de IP e quantos
+# proxies confiáveis acrescentam ao X-Forwarded-For (1 no Fly.io/Render)
+GEOIP_DATABASE = config('GEOIP_DATABASE', default='')
+GEOIP_PROXY_COUNT = config('GEOIP_PROXY_COUNT', default=0, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -141,6 +258,13 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# Bundles minificados e CSS crítico gerados por `build_assets` (core.assets)
+ASSET_BUILD_DIR = BASE_DIR / 'build' / 'static'
+if ASSET_BUILD_DIR.is_dir():
+    STATICFILES_DIRS.append(ASSET_BUILD_DIR)
+# Cache-Control dos arquivos com hash no nome (immutable), em segundos
+STATIC_IMMUTABLE_MAX_AGE = config('STATIC_IMMUTABLE_MAX_AGE', default=365 * 24 * 60 * 60, cast=int)
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -153,16 +277,49 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Validade (segundos) do resultado do /readyz em cada worker
+HEALTH_READY_TTL = config('HEALTH_READY_TTL', default=2.0, cast=float)
+
+# API navegável do DRF (padrão: só com DEBUG)
+API_BROWSABLE = config('API_BROWSABLE', default=DEBUG, cast=bool)
+
+# Partida a frio (core.startup): alvo do startup_report e templates
+# compilados no processo mestre do gunicorn antes do fork
+STARTUP_TARGET_MS = config('STARTUP_TARGET_MS', default=1000, cast=int)
+STARTUP_WARM_TEMPLATES = [
+    'base.html',
+    'core/home.html',
+    'core/dashboard.html',
+    'core/servers.html',
+    'core/games.html',
+    'registration/login.html',
+]
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # A API navegável (formulários e templates) só quando habilitada
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if API_BROWSABLE else []),
+    # Criação de token com usuário e senha (APITokenViewSet.create), por IP ou usuário.
+    # A contagem fica no cache default: por worker com o LocMemCache
+    'DEFAULT_THROTTLE_RATES': {
+        'token_login': config('API_TOKEN_LOGIN_RATE', default='10/min'),
+    },
 }
 
+# Tokens da API (core.tokens): validade padrão e cache dos tokens verificados por worker
+API_TOKEN_LIFETIME_DAYS = config('API_TOKEN_LIFETIME_DAYS', default=90, cast=int)
+API_TOKEN_CACHE_SIZE = config('API_TOKEN_CACHE_SIZE', default=1024, cast=int)
+API_TOKEN_CACHE_TTL = config('API_TOKEN_CACHE_TTL', default=60, cast=int)
+
 # WhiteNoise settings
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
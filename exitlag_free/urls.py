@@ -14,13 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.startup import lazy_include
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # Equivale a path('admin/', admin.site.urls), mas o módulo (com o
+    # autodiscover dos admin.py) só é importado no primeiro acesso ao admin
+    lazy_include('admin/', 'exitlag_free.admin_urls', namespace='admin'),
     path('', include('core.urls')),
     path('api/', include('api.urls')),
 ]
@@ -0,0 +1,55 @@
+"""
+Configuração do gunicorn (lida automaticamente ao rodar ``gunicorn`` na raiz).
+
+``SERVER_MODE`` escolhe como o projeto é servido:
+
+- ``wsgi`` (padrão): workers síncronos com ``exitlag_free/wsgi.py``; cada
+  request ocupa um worker até terminar.
+- ``asgi``: workers do uvicorn com ``exitlag_free/asgi.py``; as views async
+  (status, conectar/desconectar e a API de conexões) esperam o banco e o
+  cliente sem prender o worker, então poucos workers atendem muitos requests
+  simultâneos.
+
+Com ``GUNICORN_PRELOAD`` (padrão ligado) o projeto é carregado e aquecido uma
+vez no processo mestre (``core.startup.warm``) antes do fork: cada worker
+novo (inclusive depois de escalar do zero) já nasce pronto para responder.
+"""
+import gc
+import os
+
+
+mode = os.environ.get('SERVER_MODE', 'wsgi').lower()
+
+bind = os.environ.get('GUNICORN_BIND', f'0.0.0.0:{os.environ.get("PORT", "8000")}')
+workers = int(os.environ.get('WEB_CONCURRENCY', '3'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+if mode == 'asgi':
+    wsgi_app = 'exitlag_free.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+elif mode == 'wsgi':
+    wsgi_app = 'exitlag_free.wsgi:application'
+    worker_class = 'sync'
+else:
+    raise ValueError(f'SERVER_MODE inválido: {mode!r} (use wsgi ou asgi)')
+
+
+def when_ready(server):
+    if preload_app:
+        from core.startup import warm
+
+        warm()
+        # Tira os objetos já carregados da coleta: os workers não tocam nessas
+        # páginas no gc e elas continuam compartilhadas (copy-on-write)
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Nenhuma conexão aberta no mestre pode ser herdada pelos workers
+    from django.db import connections
+    from core.dbpool import detach_inherited
+
+    # Os pools do mestre ficam de lado (sem fechar): as conexões são dele
+    detach_inherited()
+    connections.close_all()
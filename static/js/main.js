@@ -2,6 +2,7 @@
 
 // Global variables
 let connectionCheckInterval;
+let connectionEventSource;
 let isConnected = false;
 
 // Document ready
@@ -68,13 +69,43 @@ function updateConnectionUI(data) {
 }
 
 function startConnectionMonitoring() {
-    // Check connection status every 30 seconds
-    connectionCheckInterval = setInterval(checkConnectionStatus, 30000);
+    // Prefer the push stream; fall back to polling when it is unavailable
+    if (window.EventSource) {
+        connectionEventSource = new EventSource('/api/status/stream/');
+        connectionEventSource.onmessage = function(event) {
+            updateConnectionUI(JSON.parse(event.data));
+        };
+        connectionEventSource.onerror = function() {
+            // CLOSED means the server refused the stream (e.g. WSGI deployment)
+            if (connectionEventSource.readyState === EventSource.CLOSED) {
+                connectionEventSource = null;
+                startConnectionPolling(30000);
+            }
+        };
+        // The broker is per worker: changes handled by another worker never
+        // reach this stream, so keep a slow poll as a safety net
+        startConnectionPolling(120000);
+    } else {
+        startConnectionPolling(30000);
+    }
+}
+
+function startConnectionPolling(interval) {
+    // Replace a slower poll (the SSE safety net) when the stream goes away
+    if (connectionCheckInterval) {
+        clearInterval(connectionCheckInterval);
+    }
+    connectionCheckInterval = setInterval(checkConnectionStatus, interval);
 }
 
 function stopConnectionMonitoring() {
+    if (connectionEventSource) {
+        connectionEventSource.close();
+        connectionEventSource = null;
+    }
     if (connectionCheckInterval) {
         clearInterval(connectionCheckInterval);
+        connectionCheckInterval = null;
     }
 }
 